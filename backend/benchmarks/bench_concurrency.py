@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark de vazão (requisições/s) em função da concorrência
+
+Dispara requisições autenticadas contra uma API em execução com um único
+worker (`uvicorn main:app --workers 1`) e mede a vazão para níveis
+crescentes de concorrência. Com a camada de banco assíncrona a vazão deve
+crescer com a concorrência até saturar o banco; com a sessão síncrona ela
+fica estável, porque cada consulta bloqueia o event loop.
+
+Requer httpx (pip install httpx). Uso:
+    python benchmarks/bench_concurrency.py --email user@x.com --password 123456
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+async def login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    response = await client.post("/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+async def run_level(client: httpx.AsyncClient, path: str, headers: dict, concurrency: int, requests: int):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "errors": errors,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/posts/")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--levels", default="1,2,4,8,16,32,64")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=256, max_keepalive_connections=256)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        token = await login(client, args.email, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        # Aquecimento (pool de conexões e caches)
+        await run_level(client, args.path, headers, 4, 50)
+
+        print(f"📊 GET {args.path} - {args.requests} requisições por nível")
+        print(f"{'concorrência':>12} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'erros':>7}")
+        for level in (int(value) for value in args.levels.split(",")):
+            result = await run_level(client, args.path, headers, level, args.requests)
+            print(f"{level:>12} {result['rps']:>10.1f} {result['p50_ms']:>10.1f} {result['p99_ms']:>10.1f} {result['errors']:>7}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
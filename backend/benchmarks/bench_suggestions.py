@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark da pontuação das sugestões de amizade (utils/suggestions.py)
+
+Gera um grafo sintético de --users usuários com --friends amigos em média
+(mais amizades dentro de "comunidades", como numa rede real) e --follows
+seguidos por usuário, e mede o tempo por lote de --batch usuários do cálculo
+com matrizes esparsas CSR (NumPy/SciPy) e em Python puro, conferindo que os
+dois dão o mesmo resultado. Não precisa de banco de dados.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_suggestions.py --users 200000 --friends 150
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import suggestions
+from utils.suggestions import Neighborhood, score_python, score_sparse
+
+def synthetic_graph(users: int, friends: int, follows: int, community: int = 500, seed: int = 42):
+    rng = random.Random(seed)
+    adjacency = {user_id: {} for user_id in range(1, users + 1)}
+    for user_id in range(1, users + 1):
+        base = (user_id - 1) // community * community
+        for _ in range(friends // 2):
+            if rng.random() < 0.8:
+                other = base + rng.randint(1, community)
+            else:
+                other = rng.randint(1, users)
+            if other != user_id and other <= users:
+                weight = 0.5 ** (rng.random() * 365 / 30)
+                adjacency[user_id][other] = weight
+                adjacency[other][user_id] = weight
+    following = {user_id: set(rng.sample(range(1, users + 1), follows)) for user_id in range(1, users + 1)}
+    return adjacency, following
+
+def neighborhood(adjacency, following, batch):
+    graph = Neighborhood(users=batch)
+    for user_id in batch:
+        graph.excluded[user_id] = {user_id, *adjacency[user_id]}
+        graph.friends[user_id] = adjacency[user_id]
+        for friend_id in adjacency[user_id]:
+            graph.friends[friend_id] = adjacency[friend_id]
+            graph.follows[friend_id] = following[friend_id]
+    return graph
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--friends", type=int, default=150, help="amigos por usuário (média)")
+    parser.add_argument("--follows", type=int, default=20, help="seguidos por usuário")
+    parser.add_argument("--batch", type=int, default=200, help="usuários por lote")
+    parser.add_argument("--batches", type=int, default=10, help="lotes medidos")
+    parser.add_argument("--top", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"🕸️ Gerando {args.users:,} usuários com ~{args.friends} amigos...")
+    adjacency, following = synthetic_graph(args.users, args.friends, args.follows)
+
+    rng = random.Random(7)
+    sparse_times, python_times = [], []
+    for _ in range(args.batches):
+        batch = rng.sample(range(1, args.users + 1), args.batch)
+        graph = neighborhood(adjacency, following, batch)
+
+        started = time.perf_counter()
+        expected = score_python(graph, args.top)
+        python_times.append(time.perf_counter() - started)
+
+        if suggestions.sparse is None:
+            continue
+        started = time.perf_counter()
+        result = score_sparse(graph, args.top)
+        sparse_times.append(time.perf_counter() - started)
+        mismatches = sum(1 for user_id in batch if [s[0] for s in expected[user_id]] != [s[0] for s in result[user_id]])
+        if mismatches:
+            print(f"⚠️ {mismatches} usuários com ordem diferente (empates de ponto flutuante)")
+
+    per_user = 1000 / args.batch
+    print(f"🤝 Lote de {args.batch} usuários (top {args.top})")
+    print(f"   Python puro:  {statistics.median(python_times) * 1000:.0f}ms "
+          f"({statistics.median(python_times) * per_user:.2f}ms por usuário)")
+    if sparse_times:
+        print(f"   SciPy CSR:    {statistics.median(sparse_times) * 1000:.0f}ms "
+              f"({statistics.median(sparse_times) * per_user:.2f}ms por usuário)")
+        full = statistics.median(sparse_times) * args.users / args.batch
+        print(f"   reconstrução completa estimada: {full / 60:.1f} min (sem as consultas)")
+    else:
+        print("   SciPy CSR:    NumPy/SciPy não instalados")
+
+if __name__ == "__main__":
+    main()
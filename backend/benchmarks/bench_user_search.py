@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark da busca de usuários com 1M de usuários sintéticos
+
+Gera nomes brasileiros aleatórios (com acentos), constrói o índice de
+prefixo de utils/search.py e mede o tempo de construção e a latência das
+buscas digitadas letra a letra, comparando com uma varredura linear que
+equivale ao `ILIKE '%termo%'` anterior. Não precisa de banco de dados.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_user_search.py --users 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.search import UserSearchIndex, normalize, tokenize
+
+FIRST_NAMES = [
+    "João", "José", "Antônio", "Francisco", "Carlos", "Paulo", "Pedro", "Lucas", "Luís", "Marcos",
+    "Gabriel", "Rafael", "Daniel", "Marcelo", "Bruno", "Eduardo", "Felipe", "Raimundo", "Rodrigo", "Sérgio",
+    "Maria", "Ana", "Francisca", "Antônia", "Adriana", "Juliana", "Márcia", "Fernanda", "Patrícia", "Aline",
+    "Sandra", "Camila", "Amanda", "Bruna", "Jéssica", "Letícia", "Júlia", "Luciana", "Vanessa", "Mariana",
+    "Conceição", "Inês", "Cecília", "Lúcia", "Vitória", "Thaís", "Débora", "Mônica", "Flávia", "Cláudia",
+]
+LAST_NAMES = [
+    "Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+    "Ribeiro", "Carvalho", "Almeida", "Lopes", "Soares", "Fernandes", "Vieira", "Barbosa", "Rocha", "Dias",
+    "Nascimento", "Andrade", "Moreira", "Nunes", "Marques", "Machado", "Mendes", "Freitas", "Cardoso", "Ramos",
+    "Gonçalves", "Araújo", "Conceição", "Magalhães", "Simões", "Brandão", "Falcão", "Assunção", "Guimarães", "Patrício",
+]
+
+QUERIES = ["jo", "joao", "joao si", "maria c", "conceicao", "gonç", "araujo", "ines mag", "thais fal", "zz"]
+
+def synthetic_users(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    for user_id in range(1, count + 1):
+        first = rng.choice(FIRST_NAMES)
+        last = f"{rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+        username = f"{normalize(first)}{normalize(last.split()[0])}{user_id}"
+        yield user_id, first, last, username
+
+def keystrokes(query: str):
+    """'jo si' -> ['j', 'jo', 'jo ', 'jo s', 'jo si'] (skipping trailing spaces)"""
+    return [query[:i] for i in range(1, len(query) + 1) if not query[:i].endswith(" ")]
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, int(len(values) * fraction) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--friends", type=int, default=300, help="amigos do usuário que busca")
+    parser.add_argument("--scan-queries", type=int, default=5, help="buscas medidas na varredura linear")
+    args = parser.parse_args()
+
+    print(f"👥 Gerando {args.users} usuários...")
+    users = list(synthetic_users(args.users))
+
+    started = time.perf_counter()
+    index = UserSearchIndex()
+    index.build(
+        (user_id, tokenize(first, last) + (username,))
+        for user_id, first, last, username in users
+    )
+    print(f"🏗️  Índice construído em {time.perf_counter() - started:.1f}s "
+          f"({len(index._tokens)} tokens distintos)")
+
+    rng = random.Random(7)
+    friend_ids = set(rng.sample(range(2, args.users + 1), min(args.friends, args.users - 1)))
+    second_degree = {user_id: rng.randint(1, 20) for user_id in rng.sample(range(2, args.users + 1), min(5000, args.users - 1))}
+
+    index.search("a")  # aquecimento (primeira coleta do GC após a construção)
+
+    latencies = []
+    for query in QUERIES:
+        for typed in keystrokes(query):
+            started = time.perf_counter()
+            index.search(typed, limit=20, exclude_id=1, friend_ids=friend_ids, second_degree=second_degree)
+            latencies.append(time.perf_counter() - started)
+    print(f"🔎 Índice: {len(latencies)} buscas, p50 {statistics.median(latencies) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+
+    # Referência: varredura completa, como o ILIKE '%termo%' fazia no banco
+    documents = [normalize(f"{first} {last} {username}") for _, first, last, username in users]
+    scan = []
+    for query in QUERIES[:args.scan_queries]:
+        term = normalize(query)
+        started = time.perf_counter()
+        [user_id for user_id, doc in enumerate(documents, 1) if term in doc][:20]
+        scan.append(time.perf_counter() - started)
+    print(f"🐢 Varredura linear: p50 {statistics.median(scan) * 1000:.2f} ms por busca")
+
+if __name__ == "__main__":
+    main()
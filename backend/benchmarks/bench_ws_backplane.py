@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Teste de carga do backplane de WebSockets com 4 workers
+
+Sobe o mini-broker RESP (core/resp_broker.py) e N processos, cada um com o
+seu ConnectionManager ligado ao broker e --users sockets simulados. Um
+usuário extra (id 0) fica conectado em todos os workers, como alguém com
+várias abas abertas. Cada worker envia --messages notificações a usuários
+aleatórios, em sua maioria conectados a outros workers, e conta o que
+chegou aos seus sockets. No fim, compara o entregue com o esperado e mostra
+a latência de entrega.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_ws_backplane.py --workers 4 --users 250 --messages 2000
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.backplane import RespBackplane
+from core.resp_broker import RespBroker
+from core.websockets import ConnectionManager
+
+SHARED_USER = 0
+
+class FakeSocket:
+    """Only what ConnectionManager uses from a WebSocket"""
+
+    def __init__(self, received: list):
+        self.received = received
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        self.received.append(time.time() - json.loads(message)["sent_at"])
+
+def owned_users(index: int, users: int):
+    return range(index * users + 1, (index + 1) * users + 1)
+
+async def run_worker(index: int, args, url: str, ready, go, results):
+    manager = ConnectionManager(RespBackplane(url))
+    await manager.start()
+
+    received = []
+    for user_id in [SHARED_USER, *owned_users(index, args.users)]:
+        await manager.connect(FakeSocket(received), user_id)
+    ready.put(index)
+    await asyncio.to_thread(go.wait)
+
+    rng = random.Random(index)
+    total_users = args.workers * args.users
+    expected = 0
+    remote = 0
+    started = time.perf_counter()
+    for seq in range(args.messages):
+        user_id = SHARED_USER if rng.random() < args.shared_ratio else rng.randint(1, total_users)
+        expected += args.workers if user_id == SHARED_USER else 1
+        remote += user_id == SHARED_USER or (user_id - 1) // args.users != index
+        await manager.send_notification(user_id, {"sent_at": time.time(), "seq": seq})
+    send_seconds = time.perf_counter() - started
+
+    # Espera a entrega do que os outros workers ainda estão enviando
+    idle_since, last_count = time.perf_counter(), -1
+    while time.perf_counter() - idle_since < args.idle_seconds:
+        await asyncio.sleep(0.05)
+        if len(received) != last_count:
+            last_count, idle_since = len(received), time.perf_counter()
+
+    online = await manager.online_users(range(0, total_users + 2))
+    await manager.stop()
+    results.put({
+        "index": index,
+        "expected": expected,
+        "remote": remote,
+        "received": received,
+        "send_seconds": send_seconds,
+        "online": len(online),
+    })
+
+def worker_main(index: int, args, url: str, ready, go, results):
+    asyncio.run(run_worker(index, args, url, ready, go, results))
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, int(len(values) * fraction) - 1)]
+
+async def run(args):
+    broker = RespBroker()
+    server = await broker.start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    url = f"redis://127.0.0.1:{port}"
+
+    context = multiprocessing.get_context("spawn")
+    ready, results, go = context.Queue(), context.Queue(), context.Event()
+    processes = [
+        context.Process(target=worker_main, args=(index, args, url, ready, go, results))
+        for index in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        await asyncio.to_thread(ready.get)
+
+    print(f"📡 {args.workers} workers, {args.workers * args.users + 1} usuários conectados")
+    started = time.perf_counter()
+    go.set()
+    reports = [await asyncio.to_thread(results.get) for _ in processes]
+    for process in processes:
+        await asyncio.to_thread(process.join)
+    await broker.stop()
+
+    expected = sum(report["expected"] for report in reports)
+    latencies = [latency for report in reports for latency in report["received"]]
+    sent = args.workers * args.messages
+    remote = sum(report["remote"] for report in reports)
+    send_seconds = max(report["send_seconds"] for report in reports)
+
+    print(f"   enviadas:   {sent} ({remote} para usuários em outros workers)")
+    print(f"   entregues:  {len(latencies)} / {expected} esperadas")
+    print(f"   vazão:      {sent / send_seconds:,.0f} envios/s ({time.perf_counter() - started:.1f}s no total)")
+    if latencies:
+        print(f"   latência:   p50 {statistics.median(latencies) * 1000:.2f}ms  "
+              f"p99 {percentile(latencies, 0.99) * 1000:.2f}ms  max {max(latencies) * 1000:.2f}ms")
+    print(f"   presença:   {reports[0]['online']} usuários online vistos pelo worker 0")
+    if len(latencies) != expected:
+        print("❌ Entrega incompleta")
+        sys.exit(1)
+    print("✅ Todas as mensagens entregues")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=250, help="sockets por worker")
+    parser.add_argument("--messages", type=int, default=2000, help="notificações enviadas por worker")
+    parser.add_argument("--shared-ratio", type=float, default=0.05, help="fração enviada ao usuário conectado em todos")
+    parser.add_argument("--idle-seconds", type=float, default=1.0)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Backplane de WebSockets entre workers
+
+Cada worker só conhece os sockets que ele mesmo aceitou. O backplane guarda
+em qual worker está cada usuário conectado (presença) e entrega, pelo canal
+pub/sub daquele worker, as mensagens destinadas a sockets de outros workers.
+
+- InMemoryBackplane: um único processo (desenvolvimento, um worker).
+- RespBackplane: fala o protocolo do Redis (RESP) por asyncio, sem
+  dependências; funciona com um Redis real ou com o mini-broker de
+  core/resp_broker.py.
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from urllib.parse import urlparse
+
+from .config import WEBSOCKET_BACKPLANE, WEBSOCKET_BACKPLANE_URL
+
+Handler = Callable[[str], Awaitable[None]]
+ReconnectHook = Callable[[], Awaitable[None]]
+
+# Espera entre tentativas de reconectar o assinante (dobra a cada falha)
+RECONNECT_MIN_SECONDS = 0.5
+RECONNECT_MAX_SECONDS = 30.0
+
+class Backplane(ABC):
+    """Interface of a backplane: per-worker channels plus user presence"""
+
+    @abstractmethod
+    async def start(self, worker_id: str, handler: Handler, on_reconnect: Optional[ReconnectHook] = None) -> None:
+        """
+        Deliver every message published to this worker's channel (or to all
+        workers) to handler. on_reconnect runs after the subscription is
+        restored following a dropped connection.
+        """
+
+    @abstractmethod
+    async def stop(self) -> None:
+        ...
+
+    @abstractmethod
+    async def publish(self, worker_id: str, message: str) -> int:
+        """Send message to a worker; returns how many subscribers got it"""
+
+    @abstractmethod
+    async def publish_all(self, message: str) -> None:
+        """Send message to every worker (the sender included)"""
+
+    @abstractmethod
+    async def add_presence(self, user_id: int, worker_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def remove_presence(self, user_id: int, worker_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def workers_of(self, user_ids: Iterable[int]) -> Dict[int, Set[str]]:
+        """Workers holding a connection of each user (users offline are omitted)"""
+
+class InMemoryBackplane(Backplane):
+    """Process-local backplane"""
+
+    def __init__(self):
+        self._handlers: Dict[str, Handler] = {}
+        self._presence: Dict[int, Set[str]] = {}
+
+    async def start(self, worker_id: str, handler: Handler, on_reconnect: Optional[ReconnectHook] = None) -> None:
+        self._handlers[worker_id] = handler
+
+    async def stop(self) -> None:
+        self._handlers.clear()
+
+    async def publish(self, worker_id: str, message: str) -> int:
+        handler = self._handlers.get(worker_id)
+        if handler is None:
+            return 0
+        await handler(message)
+        return 1
+
+    async def publish_all(self, message: str) -> None:
+        for handler in list(self._handlers.values()):
+            await handler(message)
+
+    async def add_presence(self, user_id: int, worker_id: str) -> None:
+        self._presence.setdefault(user_id, set()).add(worker_id)
+
+    async def remove_presence(self, user_id: int, worker_id: str) -> None:
+        workers = self._presence.get(user_id)
+        if workers is not None:
+            workers.discard(worker_id)
+            if not workers:
+                del self._presence[user_id]
+
+    async def workers_of(self, user_ids: Iterable[int]) -> Dict[int, Set[str]]:
+        return {user_id: set(self._presence[user_id]) for user_id in user_ids if self._presence.get(user_id)}
+
+# --- RESP ------------------------------------------------------------------
+
+class RespError(Exception):
+    pass
+
+def encode_command(*args) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+async def read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        raise RespError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2].decode()
+    if kind == b"*":
+        count = int(rest)
+        if count < 0:
+            return None
+        return [await read_reply(reader) for _ in range(count)]
+    raise RespError(f"unexpected reply: {line!r}")
+
+class RespConnection:
+    """Minimal pipelined RESP client connection"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def execute_many(self, commands: List[tuple]) -> list:
+        """
+        Send several commands in one write and read their replies in order.
+
+        Any failure midway (connection error, error reply, cancellation) may
+        leave replies unread in the buffer, where the next command would read
+        them as its own: the connection is then discarded and the exception
+        re-raised.
+        """
+        async with self._lock:
+            try:
+                self.writer.write(b"".join(encode_command(*command) for command in commands))
+                await self.writer.drain()
+                return [await read_reply(self.reader) for _ in commands]
+            except BaseException:
+                self.discard()
+                raise
+
+    @property
+    def closed(self) -> bool:
+        return self.writer is None or self.writer.is_closing()
+
+    def discard(self):
+        """Close without waiting (safe inside a cancelled task)"""
+        if self.writer is not None:
+            self.writer.close()
+
+    async def execute(self, *args):
+        return (await self.execute_many([args]))[0]
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+
+class RespBackplane(Backplane):
+    """Backplane shared by every worker through a Redis-compatible server"""
+
+    CHANNEL_PREFIX = "ws:worker:"
+    BROADCAST_CHANNEL = "ws:broadcast"
+    PRESENCE_PREFIX = "ws:presence:"
+
+    def __init__(self, url: str = WEBSOCKET_BACKPLANE_URL):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self._commands: Optional[RespConnection] = None
+        self._subscriber: Optional[RespConnection] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._worker_id: Optional[str] = None
+
+    async def _execute_many(self, commands: List[tuple]) -> list:
+        if self._commands is None or self._commands.closed:
+            self._commands = RespConnection(self.host, self.port)
+            await self._commands.open()
+        connection = self._commands
+        try:
+            return await connection.execute_many(commands)
+        except BaseException:
+            # execute_many já descartou a conexão: reconecta no próximo comando
+            if self._commands is connection:
+                self._commands = None
+            raise
+
+    async def _execute(self, *args):
+        return (await self._execute_many([args]))[0]
+
+    async def start(self, worker_id: str, handler: Handler, on_reconnect: Optional[ReconnectHook] = None) -> None:
+        self._worker_id = worker_id
+        await self._subscribe()
+        self._listener = asyncio.create_task(self._listen(handler, on_reconnect))
+
+    async def _subscribe(self):
+        subscriber = RespConnection(self.host, self.port)
+        await subscriber.open()
+        await subscriber.execute_many([
+            ("SUBSCRIBE", self.CHANNEL_PREFIX + self._worker_id),
+            ("SUBSCRIBE", self.BROADCAST_CHANNEL),
+        ])
+        self._subscriber = subscriber
+
+    async def _listen(self, handler: Handler, on_reconnect: Optional[ReconnectHook]):
+        """
+        Read published messages forever. A dropped subscriber connection is
+        reopened (with exponential backoff) and re-SUBSCRIBEd; on_reconnect
+        then lets the worker restore what others may have cleaned up while it
+        was unreachable. Messages published in the meantime are lost, as
+        with any pub/sub.
+        """
+        delay = RECONNECT_MIN_SECONDS
+        while True:
+            try:
+                if self._subscriber is None:
+                    await self._subscribe()
+                    print("🔌 Backplane subscriber reconnected")
+                    delay = RECONNECT_MIN_SECONDS
+                    if on_reconnect is not None:
+                        await on_reconnect()
+                reply = await read_reply(self._subscriber.reader)
+            except (OSError, EOFError, RespError) as e:
+                if self._subscriber is not None:
+                    self._subscriber.discard()
+                    self._subscriber = None
+                print(f"⚠️ Backplane subscriber lost ({e}), reconnecting in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+                continue
+
+            if isinstance(reply, list) and len(reply) == 3 and reply[0] == "message":
+                try:
+                    await handler(reply[2])
+                except Exception as e:
+                    print(f"⚠️ Backplane handler failed: {e}")
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+        for connection in (self._subscriber, self._commands):
+            if connection is not None:
+                await connection.close()
+        self._listener = self._subscriber = self._commands = None
+
+    async def publish(self, worker_id: str, message: str) -> int:
+        return await self._execute("PUBLISH", self.CHANNEL_PREFIX + worker_id, message)
+
+    async def publish_all(self, message: str) -> None:
+        await self._execute("PUBLISH", self.BROADCAST_CHANNEL, message)
+
+    async def add_presence(self, user_id: int, worker_id: str) -> None:
+        await self._execute("SADD", f"{self.PRESENCE_PREFIX}{user_id}", worker_id)
+
+    async def remove_presence(self, user_id: int, worker_id: str) -> None:
+        await self._execute("SREM", f"{self.PRESENCE_PREFIX}{user_id}", worker_id)
+
+    async def workers_of(self, user_ids: Iterable[int]) -> Dict[int, Set[str]]:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        replies = await self._execute_many([("SMEMBERS", f"{self.PRESENCE_PREFIX}{user_id}") for user_id in user_ids])
+        return {user_id: set(workers) for user_id, workers in zip(user_ids, replies) if workers}
+
+def create_backplane(backend: str = WEBSOCKET_BACKPLANE) -> Backplane:
+    """Build the backplane configured by WEBSOCKET_BACKPLANE"""
+    if backend in ("", "memory"):
+        return InMemoryBackplane()
+    if backend in ("redis", "resp"):
+        return RespBackplane(WEBSOCKET_BACKPLANE_URL)
+    raise ValueError(f"Unknown websocket backplane: {backend}")
@@ -12,6 +12,16 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Cache de usuários autenticados (por processo)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+# Grafo de amizades: ids dos amigos de cada usuário em cache (array de ints)
+FRIEND_GRAPH_CACHE_SIZE = int(os.getenv("FRIEND_GRAPH_CACHE_SIZE", "100000"))
+FRIEND_GRAPH_CACHE_TTL_SECONDS = int(os.getenv("FRIEND_GRAPH_CACHE_TTL_SECONDS", "300"))
+# Bloqueios: ids que cada usuário não deve ver (bloqueados e quem o bloqueou)
+BLOCK_LIST_CACHE_SIZE = int(os.getenv("BLOCK_LIST_CACHE_SIZE", "100000"))
+BLOCK_LIST_CACHE_TTL_SECONDS = int(os.getenv("BLOCK_LIST_CACHE_TTL_SECONDS", "300"))
+
 # Configurações do banco de dados
 def get_database_url():
     """Create database URL from environment variables"""
@@ -33,6 +43,109 @@ def get_database_url():
 
     return f"mysql+pymysql://{db_user}:{encoded_password}@{db_host}:{db_port}/{db_name}"
 
+# Uploads
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+# Os arquivos são servidos em /<UPLOAD_DIR>/... (routes/media.py) e a URL sem a
+# barra inicial é o caminho no disco, por isso UPLOAD_DIR é relativo
+UPLOAD_URL_PREFIX = "/" + UPLOAD_DIR.strip("/")
+MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "100"))
+MAX_AVATAR_SIZE_MB = int(os.getenv("MAX_AVATAR_SIZE_MB", "5"))
+MAX_COVER_SIZE_MB = int(os.getenv("MAX_COVER_SIZE_MB", "10"))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Derivados de imagens (miniaturas e WebP/AVIF) gerados em processos separados
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "2"))
+IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+
+# Armazenamento por conteúdo (SHA-256) e coleta dos blobs sem referências
+MEDIA_GC_INTERVAL_SECONDS = int(os.getenv("MEDIA_GC_INTERVAL_SECONDS", "3600"))
+MEDIA_GC_GRACE_SECONDS = int(os.getenv("MEDIA_GC_GRACE_SECONDS", "86400"))
+
+# Entrega de mídia: cache em memória dos arquivos pequenos mais acessados
+# (avatares, miniaturas); 0 desativa
+MEDIA_HOT_CACHE_MB = int(os.getenv("MEDIA_HOT_CACHE_MB", "64"))
+MEDIA_HOT_CACHE_MAX_FILE_KB = int(os.getenv("MEDIA_HOT_CACHE_MAX_FILE_KB", "256"))
+
+# Pool de hashing de senhas (0 = um processo por CPU)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+# Timeline (fan-out-on-write) settings
+# TIMELINE_BACKEND: "" (disabled), "memory" or "redis". "memory", and "redis"
+# without TIMELINE_REDIS_URL, keep the timelines inside the process: they only
+# work with a single worker (WEB_CONCURRENCY, read by uvicorn/gunicorn)
+TIMELINE_BACKEND = os.getenv("TIMELINE_BACKEND", "")
+TIMELINE_REDIS_URL = os.getenv("TIMELINE_REDIS_URL", "")
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+TIMELINE_MAX_LENGTH = int(os.getenv("TIMELINE_MAX_LENGTH", "800"))
+TIMELINE_FANOUT_LIMIT = int(os.getenv("TIMELINE_FANOUT_LIMIT", "5000"))
+
+# WebSockets entre workers/hosts
+# WEBSOCKET_BACKPLANE: "memory" (um único worker) or "redis" (any Redis-compatible
+# server, e.g. python -m core.resp_broker)
+WEBSOCKET_BACKPLANE = os.getenv("WEBSOCKET_BACKPLANE", "memory")
+WEBSOCKET_BACKPLANE_URL = os.getenv("WEBSOCKET_BACKPLANE_URL", "redis://127.0.0.1:6379")
+# Fila de saída por conexão; quando um cliente lento a enche:
+# "drop_oldest", "drop_newest" or "disconnect" (fecha o socket, o cliente reconecta)
+WEBSOCKET_SEND_QUEUE_SIZE = int(os.getenv("WEBSOCKET_SEND_QUEUE_SIZE", "256"))
+WEBSOCKET_SLOW_CONSUMER_POLICY = os.getenv("WEBSOCKET_SLOW_CONSUMER_POLICY", "drop_oldest")
+
+# Notificações: eventos agregados por (destinatário, post, tipo) numa janela
+# curta e gravados em lote
+NOTIFICATION_BATCH_WINDOW_MS = int(os.getenv("NOTIFICATION_BATCH_WINDOW_MS", "500"))
+NOTIFICATION_BATCH_MAX = int(os.getenv("NOTIFICATION_BATCH_MAX", "5000"))
+NOTIFICATION_QUEUE_SIZE = int(os.getenv("NOTIFICATION_QUEUE_SIZE", "100000"))
+# Retenção: notificações lidas mais antigas que isso vão para notifications_archive
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+NOTIFICATION_ARCHIVE_BATCH_SIZE = int(os.getenv("NOTIFICATION_ARCHIVE_BATCH_SIZE", "1000"))
+NOTIFICATION_MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("NOTIFICATION_MAINTENANCE_INTERVAL_SECONDS", "3600"))
+
+# Mensagens diretas: ids reservados em blocos (a mensagem é entregue antes
+# do INSERT) e confirmações de leitura gravadas em lote
+MESSAGE_ID_BLOCK_SIZE = int(os.getenv("MESSAGE_ID_BLOCK_SIZE", "1000"))
+MESSAGE_READ_FLUSH_MS = int(os.getenv("MESSAGE_READ_FLUSH_MS", "1000"))
+
+# Presença: last_seen gravado em lote e indicador de digitação limitado por
+# (remetente, conversa)
+PRESENCE_FLUSH_INTERVAL_SECONDS = int(os.getenv("PRESENCE_FLUSH_INTERVAL_SECONDS", "30"))
+TYPING_THROTTLE_MS = int(os.getenv("TYPING_THROTTLE_MS", "3000"))
+TYPING_IDLE_TIMEOUT_MS = int(os.getenv("TYPING_IDLE_TIMEOUT_MS", "6000"))
+
+# Stories: bandeja em cache (com ETag) e arquivamento dos expirados
+STORY_TRAY_CACHE_SECONDS = int(os.getenv("STORY_TRAY_CACHE_SECONDS", "30"))
+STORY_MAX_DURATION_HOURS = int(os.getenv("STORY_MAX_DURATION_HOURS", "48"))
+STORY_ARCHIVE_BATCH_SIZE = int(os.getenv("STORY_ARCHIVE_BATCH_SIZE", "1000"))
+STORY_ARCHIVE_INTERVAL_SECONDS = int(os.getenv("STORY_ARCHIVE_INTERVAL_SECONDS", "300"))
+# Visualizações: gravadas em lote, com repetições descartadas em memória
+STORY_VIEW_FLUSH_MS = int(os.getenv("STORY_VIEW_FLUSH_MS", "2000"))
+STORY_VIEW_DEDUPE_SIZE = int(os.getenv("STORY_VIEW_DEDUPE_SIZE", "200000"))
+STORY_VIEW_MAX_PENDING = int(os.getenv("STORY_VIEW_MAX_PENDING", "50000"))
+
+# Sugestões de amizade ("pessoas que você talvez conheça"): as N melhores de
+# cada usuário ficam em friend_suggestions, recalculadas quando o grafo muda
+SUGGESTIONS_TOP_N = int(os.getenv("SUGGESTIONS_TOP_N", "50"))
+SUGGESTION_BATCH_SIZE = int(os.getenv("SUGGESTION_BATCH_SIZE", "200"))
+SUGGESTION_REFRESH_INTERVAL_SECONDS = int(os.getenv("SUGGESTION_REFRESH_INTERVAL_SECONDS", "60"))
+SUGGESTION_RECENCY_HALF_LIFE_DAYS = float(os.getenv("SUGGESTION_RECENCY_HALF_LIFE_DAYS", "30"))
+SUGGESTION_RECENCY_WEIGHT = float(os.getenv("SUGGESTION_RECENCY_WEIGHT", "0.5"))
+SUGGESTION_FOLLOW_WEIGHT = float(os.getenv("SUGGESTION_FOLLOW_WEIGHT", "0.25"))
+
+# Exclusão de posts: a rota só marca deleted_at e o job apaga os dependentes
+# (comentários, reações, compartilhamentos, notificações) em lotes curtos
+POST_PURGE_CHUNK_SIZE = int(os.getenv("POST_PURGE_CHUNK_SIZE", "1000"))
+POST_PURGE_INTERVAL_SECONDS = int(os.getenv("POST_PURGE_INTERVAL_SECONDS", "60"))
+
+# Background jobs
+COUNTER_RECONCILE_INTERVAL_SECONDS = int(os.getenv("COUNTER_RECONCILE_INTERVAL_SECONDS", "3600"))
+SEARCH_INDEX_REFRESH_SECONDS = int(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "600"))
+
+def get_async_database_url():
+    """Database URL for the async engine (aiomysql driver)"""
+    async_url = os.getenv("ASYNC_DATABASE_URL")
+    if async_url:
+        return async_url
+    return get_database_url().replace("mysql+pymysql://", "mysql+aiomysql://", 1)
+
 # CORS settings
 ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -2,8 +2,9 @@
 Configuração e conexão com banco de dados
 """
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
-from .config import get_database_url
+from .config import get_database_url, get_async_database_url
 
 # Configuração do banco
 SQLALCHEMY_DATABASE_URL = get_database_url()
@@ -24,6 +25,24 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine used by the request path, so queries never block the event loop.
+# The sync engine above remains for scripts and background batch jobs.
+async_engine = create_async_engine(
+    get_async_database_url(),
+    echo=False,
+    pool_pre_ping=True,
+    pool_recycle=300,
+    pool_size=10,
+    max_overflow=20,
+    connect_args={
+        "charset": "utf8mb4",
+    }
+)
+
+# expire_on_commit=False: an expired attribute would need an implicit (and
+# in async code, forbidden) lazy load to be read after commit
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
 class Base(DeclarativeBase):
     pass
 
@@ -34,3 +53,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Async database dependency
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
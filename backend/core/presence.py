@@ -0,0 +1,142 @@
+"""
+Presença: último acesso e indicador de digitação
+
+last_seen muda a cada requisição e a cada frame de WebSocket; gravar isso
+direto viraria uma tempestade de UPDATEs. O PresenceTracker guarda o último
+acesso em memória e grava em lote a cada PRESENCE_FLUSH_INTERVAL_SECONDS
+(um executemany por ciclo, só dos usuários que mudaram). Quem está online
+vem dos sockets abertos, registrados no backplane.
+
+O indicador de digitação chega a cada tecla. O TypingThrottle repassa no
+máximo um "digitando" por (remetente, conversa) a cada TYPING_THROTTLE_MS e
+envia sozinho o "parou de digitar" após TYPING_IDLE_TIMEOUT_MS sem eventos.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, or_, update
+
+from .config import PRESENCE_FLUSH_INTERVAL_SECONDS, TYPING_THROTTLE_MS, TYPING_IDLE_TIMEOUT_MS
+from .database import AsyncSessionLocal
+from .websockets import manager
+
+class PresenceTracker:
+    """In-memory last_seen, written to users.last_seen in periodic batches"""
+
+    def __init__(self, session_factory=AsyncSessionLocal, memory_seconds: float = PRESENCE_FLUSH_INTERVAL_SECONDS * 10):
+        self.session_factory = session_factory
+        self.memory_seconds = memory_seconds
+        self.last_seen: Dict[int, datetime] = {}
+        self._dirty: Dict[int, datetime] = {}
+
+    def touch(self, user_id: int):
+        """Record activity of user_id (no database access)"""
+        now = datetime.utcnow()
+        self.last_seen[user_id] = now
+        self._dirty[user_id] = now
+
+    def get_last_seen(self, user_id: int, stored: Optional[datetime] = None) -> Optional[datetime]:
+        """Most recent of the in-memory value and the one read from the database"""
+        seen = self.last_seen.get(user_id)
+        if seen is None or (stored is not None and stored > seen):
+            return stored
+        return seen
+
+    async def flush(self) -> int:
+        """Write the pending last_seen values in one executemany; returns the users written"""
+        if not self._dirty:
+            return 0
+        batch, self._dirty = self._dirty, {}
+
+        from models import User  # Import here to avoid circular imports
+        users = User.__table__
+        stmt = (
+            update(users)
+            .where(
+                users.c.id == bindparam("b_user"),
+                # Outro worker pode ter gravado um acesso mais recente
+                or_(users.c.last_seen.is_(None), users.c.last_seen < bindparam("b_seen"))
+            )
+            .values(last_seen=bindparam("b_seen"))
+        )
+        try:
+            async with self.session_factory() as db:
+                await db.execute(stmt, [{"b_user": user_id, "b_seen": seen} for user_id, seen in batch.items()])
+                await db.commit()
+        except Exception:
+            # Devolve o lote para a próxima tentativa sem sobrescrever acessos novos
+            for user_id, seen in batch.items():
+                self._dirty.setdefault(user_id, seen)
+            raise
+
+        # Acessos antigos saem da memória: o banco já tem o valor
+        cutoff = datetime.utcnow() - timedelta(seconds=self.memory_seconds)
+        self.last_seen = {user_id: seen for user_id, seen in self.last_seen.items() if seen >= cutoff}
+        return len(batch)
+
+class TypingThrottle:
+    """
+    Rate-limits typing indicators per (sender, conversation): the first
+    keystroke is forwarded at once, later ones at most every throttle_ms, and
+    a stop is sent when no keystroke arrives for idle_ms.
+    """
+
+    def __init__(self, throttle_ms: int = TYPING_THROTTLE_MS, idle_ms: int = TYPING_IDLE_TIMEOUT_MS):
+        self.throttle = throttle_ms / 1000
+        self.idle = idle_ms / 1000
+        # (sender, conversation) -> [recipient, last forwarded at, last keystroke at, idle timer]
+        self._state: Dict[Tuple[int, str], list] = {}
+        self.forwarded = 0
+        self.suppressed = 0
+
+    async def typing(self, sender_id: int, recipient_id: int, conversation_id: str, is_typing: bool):
+        key = (sender_id, conversation_id)
+        now = time.monotonic()
+        state = self._state.get(key)
+
+        if not is_typing:
+            if state is not None:
+                self._drop(key)
+                await self._send(sender_id, recipient_id, conversation_id, False)
+            return
+
+        if state is not None and now - state[1] < self.throttle:
+            state[2] = now
+            self.suppressed += 1
+            return
+
+        if state is None:
+            state = self._state[key] = [recipient_id, now, now, None]
+            state[3] = asyncio.get_running_loop().call_later(self.idle, self._check_idle, key)
+        state[1] = state[2] = now
+        await self._send(sender_id, recipient_id, conversation_id, True)
+
+    def _check_idle(self, key: Tuple[int, str]):
+        state = self._state.get(key)
+        if state is None:
+            return
+        remaining = state[2] + self.idle - time.monotonic()
+        if remaining > 0:
+            state[3] = asyncio.get_running_loop().call_later(remaining, self._check_idle, key)
+            return
+        self._drop(key)
+        asyncio.create_task(self._send(key[0], state[0], key[1], False))
+
+    def _drop(self, key: Tuple[int, str]):
+        state = self._state.pop(key, None)
+        if state is not None and state[3] is not None:
+            state[3].cancel()
+
+    async def _send(self, sender_id: int, recipient_id: int, conversation_id: str, is_typing: bool):
+        self.forwarded += 1
+        await manager.send_typing_indicator(recipient_id, {
+            "sender_id": sender_id,
+            "user_id": sender_id,
+            "conversation_id": conversation_id,
+            "is_typing": is_typing,
+        })
+
+presence = PresenceTracker()
+typing_throttle = TypingThrottle()
@@ -0,0 +1,117 @@
+"""
+Mini-broker compatível com o protocolo do Redis (RESP)
+
+Implementa só o que o backplane de WebSockets usa: PING, PUBLISH, SUBSCRIBE,
+UNSUBSCRIBE, SADD, SREM, SMEMBERS e DEL. Serve para rodar vários workers em
+desenvolvimento e nos testes de carga sem instalar um Redis:
+
+    python -m core.resp_broker --port 6379
+    WEBSOCKET_BACKPLANE=redis uvicorn main:app --workers 4
+"""
+import argparse
+import asyncio
+from typing import Dict, Optional, Set
+
+from .backplane import RespError, read_reply
+
+def _bulk(value: str) -> bytes:
+    data = value.encode()
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+def _array(*items: bytes) -> bytes:
+    return b"*%d\r\n" % len(items) + b"".join(items)
+
+def _integer(value: int) -> bytes:
+    return b":%d\r\n" % value
+
+class RespBroker:
+    def __init__(self):
+        self.channels: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self.sets: Dict[str, Set[str]] = {}
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 6379):
+        self.server = await asyncio.start_server(self._client, host, port)
+        return self.server
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscribed: Set[str] = set()
+        try:
+            while True:
+                try:
+                    command = await read_reply(reader)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                if not isinstance(command, list) or not command:
+                    writer.write(b"-ERR protocol error\r\n")
+                    continue
+                writer.write(self._execute(writer, subscribed, command[0].upper(), command[1:]))
+                await writer.drain()
+        except (ConnectionError, RespError):
+            pass
+        finally:
+            for channel in subscribed:
+                self.channels.get(channel, set()).discard(writer)
+            writer.close()
+
+    def _execute(self, writer: asyncio.StreamWriter, subscribed: Set[str], name: str, args: list) -> bytes:
+        if name == "PING":
+            return b"+PONG\r\n"
+        if name == "PUBLISH":
+            channel, message = args
+            payload = _array(_bulk("message"), _bulk(channel), _bulk(message))
+            receivers = 0
+            for subscriber in list(self.channels.get(channel, ())):
+                if subscriber.is_closing():
+                    self.channels[channel].discard(subscriber)
+                    continue
+                subscriber.write(payload)
+                receivers += 1
+            return _integer(receivers)
+        if name in ("SUBSCRIBE", "UNSUBSCRIBE"):
+            replies = []
+            for channel in args:
+                if name == "SUBSCRIBE":
+                    self.channels.setdefault(channel, set()).add(writer)
+                    subscribed.add(channel)
+                else:
+                    self.channels.get(channel, set()).discard(writer)
+                    subscribed.discard(channel)
+                replies.append(_array(_bulk(name.lower()), _bulk(channel), _integer(len(subscribed))))
+            return b"".join(replies)
+        if name == "SADD":
+            members = self.sets.setdefault(args[0], set())
+            before = len(members)
+            members.update(args[1:])
+            return _integer(len(members) - before)
+        if name == "SREM":
+            members = self.sets.get(args[0], set())
+            before = len(members)
+            members.difference_update(args[1:])
+            if not members:
+                self.sets.pop(args[0], None)
+            return _integer(before - len(members))
+        if name == "SMEMBERS":
+            return _array(*(_bulk(member) for member in self.sets.get(args[0], ())))
+        if name == "DEL":
+            return _integer(sum(1 for key in args if self.sets.pop(key, None) is not None))
+        return f"-ERR unknown command '{name}'\r\n".encode()
+
+async def _serve(host: str, port: int):
+    broker = RespBroker()
+    server = await broker.start(host, port)
+    print(f"📡 RESP broker listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mini RESP pub/sub broker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    asyncio.run(_serve(args.host, args.port))
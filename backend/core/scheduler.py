@@ -0,0 +1,48 @@
+"""
+Agendador de tarefas periódicas executadas em segundo plano pela API
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, List
+
+@dataclass
+class PeriodicTask:
+    name: str
+    interval_seconds: float
+    func: Callable
+
+_registered: List[PeriodicTask] = []
+_running: List[asyncio.Task] = []
+
+def register_periodic_task(name: str, interval_seconds: float, func: Callable):
+    """
+    Register a job to run every interval_seconds once the scheduler starts.
+
+    Coroutine functions run on the event loop; plain functions (typically
+    batch jobs using a sync Session) run in a worker thread.
+    """
+    _registered.append(PeriodicTask(name, interval_seconds, func))
+
+async def _run_forever(task: PeriodicTask):
+    while True:
+        await asyncio.sleep(task.interval_seconds)
+        try:
+            if asyncio.iscoroutinefunction(task.func):
+                await task.func()
+            else:
+                await asyncio.to_thread(task.func)
+        except Exception as e:
+            print(f"⚠️ Periodic task '{task.name}' failed: {e}")
+
+def start_periodic_tasks():
+    """Start every registered job on the running event loop"""
+    for task in _registered:
+        _running.append(asyncio.create_task(_run_forever(task), name=task.name))
+
+async def stop_periodic_tasks():
+    """Cancel the running jobs and wait for them to finish"""
+    for running in _running:
+        running.cancel()
+    await asyncio.gather(*_running, return_exceptions=True)
+    _running.clear()
+    _registered.clear()
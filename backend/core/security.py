@@ -5,15 +5,15 @@ from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 
 from .config import SECRET_KEY, ALGORITHM
-from .database import get_db
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .database import get_async_db
+from .passwords import pwd_context, password_pool
+from .presence import presence
+from .user_cache import load_user
 
 # OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -26,6 +26,14 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
 
+async def hash_password_async(password: str) -> str:
+    """Hash a password in the password worker pool"""
+    return await password_pool.hash(password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in the password worker pool"""
+    return await password_pool.verify(plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -37,10 +45,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get the current authenticated user"""
-    from models.user import User  # Import here to avoid circular imports
-    
+def _decode_token(token: str) -> dict:
+    """Decode a JWT access token, raising 401 when it is invalid"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -48,17 +54,50 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    if payload.get("user_id") is None and payload.get("sub") is None:
         raise credentials_exception
+    return payload
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """Get the current authenticated user"""
+    from models.user import User  # Import here to avoid circular imports
+
+    payload = _decode_token(token)
+    user_id = payload.get("user_id")
+
+    if user_id is not None:
+        user = await load_user(db, user_id)
+    else:
+        result = await db.execute(select(User).where(User.email == payload.get("sub")))
+        user = result.scalars().first()
+
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    presence.touch(user.id)
     return user
 
+async def get_current_user_id(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> int:
+    """
+    Id of the authenticated user, read straight from the token.
+
+    For routes that only need the id: no database access unless the token
+    predates the user_id claim.
+    """
+    payload = _decode_token(token)
+    user_id = payload.get("user_id")
+    if user_id is not None:
+        presence.touch(user_id)
+        return user_id
+
+    user = await get_current_user(token, db)
+    return user.id
+
 def verify_websocket_token(token: str):
     """Verify a WebSocket token"""
     from models.user import User  # Import here to avoid circular imports
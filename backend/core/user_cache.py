@@ -0,0 +1,55 @@
+"""
+Cache por processo dos usuários autenticados, indexado por user_id
+
+Guarda um snapshot das colunas de User para que a autenticação não precise
+de um SELECT por requisição. Qualquer escrita em User pelo ORM invalida a
+entrada correspondente.
+"""
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from .cache import TTLCache
+from .config import USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS
+from models.user import User
+
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+_columns = [attr.key for attr in inspect(User).column_attrs]
+
+def _snapshot(user: User) -> dict:
+    return {key: getattr(user, key) for key in _columns}
+
+async def load_user(db: AsyncSession, user_id: int) -> Optional[User]:
+    """
+    Return the user with user_id attached to db, from the cache when possible.
+
+    Cached users are merged without loading, so they behave like a row read by
+    this session: changes made by the route are flushed on commit as usual.
+    """
+    values = user_cache.get(user_id)
+    if values is not None:
+        user = User(**values)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
+    user = await db.get(User, user_id)
+    if user is not None:
+        user_cache.set(user_id, _snapshot(user))
+    return user
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    user_cache.invalidate(target.id)
+
+@event.listens_for(Session, "do_orm_execute")
+def _invalidate_on_bulk_write(orm_execute_state):
+    # Bulk UPDATE/DELETE statements bypass the mapper events and don't say
+    # which rows they touch, so drop the whole cache
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is User:
+            user_cache.clear()
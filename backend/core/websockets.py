@@ -1,34 +1,254 @@
 """
 Gerenciador de WebSockets
+
+Cada worker guarda só os sockets que aceitou. Com vários workers (ou hosts)
+o backplane (core/backplane.py) registra em quais workers cada usuário está
+conectado e leva até eles as mensagens enviadas a partir de outro worker.
+
+Cada conexão tem uma fila de saída limitada e uma task que escreve no
+socket: enviar é só enfileirar, então um cliente lento nunca atrasa os
+outros. Quando a fila de um cliente enche, WEBSOCKET_SLOW_CONSUMER_POLICY
+decide o que fazer. Mensagens com chave (ex.: indicador de digitação)
+substituem a pendente de mesma chave em vez de se acumularem.
 """
+import asyncio
 import json
-from typing import Dict, List
+import os
+import socket
+import uuid
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Set, Union
 from fastapi import WebSocket
 
+from .backplane import Backplane, InMemoryBackplane, RespError, create_backplane
+from .config import WEBSOCKET_SEND_QUEUE_SIZE, WEBSOCKET_SLOW_CONSUMER_POLICY
+
+# Código de fechamento "Try Again Later" para clientes que não acompanham
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+class ClientConnection:
+    """A socket with its bounded outbound queue and writer task"""
+
+    def __init__(self, manager: "ConnectionManager", websocket: WebSocket, user_id: int,
+                 max_queue: int = WEBSOCKET_SEND_QUEUE_SIZE, policy: str = WEBSOCKET_SLOW_CONSUMER_POLICY):
+        self.manager = manager
+        self.websocket = websocket
+        self.user_id = user_id
+        self.max_queue = max_queue
+        self.policy = policy
+        self.dropped = 0
+        self.closed = False
+        self._queue: deque = deque()
+        self._ready = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, message: str, key: Optional[str] = None):
+        """Queue message for this socket without waiting for the client"""
+        if self.closed:
+            return
+        if key is not None:
+            for index, (pending_key, _) in enumerate(self._queue):
+                if pending_key == key:
+                    self._queue[index] = (key, message)
+                    return
+
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            if self.policy == "disconnect":
+                self.closed = True
+                asyncio.create_task(self.manager.disconnect(self.websocket, self.user_id, SLOW_CONSUMER_CLOSE_CODE))
+                return
+            if self.policy == "drop_newest":
+                return
+            self._queue.popleft()
+
+        self._queue.append((key, message))
+        self._ready.set()
+
+    async def _write_loop(self):
+        try:
+            while True:
+                if not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                _, message = self._queue.popleft()
+                await self.websocket.send_text(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Socket quebrado: sai da lista (a task atual não é cancelada)
+            self.closed = True
+            await self.manager.disconnect(self.websocket, self.user_id)
+
+    async def close(self, code: Optional[int] = None):
+        self.closed = True
+        self._queue.clear()
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        if code is not None:
+            try:
+                await self.websocket.close(code=code)
+            except Exception:
+                pass
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
+    def __init__(self, backplane: Optional[Backplane] = None):
+        self.active_connections: Dict[int, List[ClientConnection]] = {}
+        self.backplane = backplane or create_backplane()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def start(self):
+        """Subscribe to this worker's channel on the backplane"""
+        try:
+            await self.backplane.start(self.worker_id, self._deliver_remote, self._restore_presence)
+        except OSError as e:
+            print(f"⚠️ WebSocket backplane unavailable ({e}), delivering to local sockets only")
+            self.backplane = InMemoryBackplane()
+            await self.backplane.start(self.worker_id, self._deliver_remote)
+
+    async def _restore_presence(self):
+        """
+        Re-register the users connected here after the backplane subscription
+        was restored: while it was down, other workers got 0 subscribers on
+        our channel and removed their presence as if we had stopped.
+        """
+        try:
+            for user_id in list(self.active_connections):
+                await self.backplane.add_presence(user_id, self.worker_id)
+        except (OSError, RespError) as e:
+            print(f"⚠️ WebSocket backplane error: {e}")
+
+    async def stop(self):
+        for user_id, connections in list(self.active_connections.items()):
+            for connection in connections:
+                await connection.close()
+            try:
+                await self.backplane.remove_presence(user_id, self.worker_id)
+            except (OSError, RespError) as e:
+                print(f"⚠️ WebSocket backplane error: {e}")
+        self.active_connections.clear()
+        await self.backplane.stop()
 
     async def connect(self, websocket: WebSocket, user_id: int):
         await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
+        first = user_id not in self.active_connections
+        self.active_connections.setdefault(user_id, []).append(ClientConnection(self, websocket, user_id))
+        if first:
+            # Sem backplane o socket ainda recebe o que sai deste worker; a
+            # presença volta com _restore_presence quando ele reconectar
+            try:
+                await self.backplane.add_presence(user_id, self.worker_id)
+            except (OSError, RespError) as e:
+                print(f"⚠️ WebSocket backplane error: {e}")
 
-    def disconnect(self, websocket: WebSocket, user_id: int):
-        if user_id in self.active_connections:
-            if websocket in self.active_connections[user_id]:
-                self.active_connections[user_id].remove(websocket)
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
+    async def disconnect(self, websocket: WebSocket, user_id: int, code: Optional[int] = None):
+        connections = self.active_connections.get(user_id)
+        if connections is None:
+            return
+        for connection in connections:
+            if connection.websocket is websocket:
+                connections.remove(connection)
+                await connection.close(code)
+                break
+        if not connections and self.active_connections.get(user_id) is connections:
+            del self.active_connections[user_id]
+            try:
+                await self.backplane.remove_presence(user_id, self.worker_id)
+            except (OSError, RespError) as e:
+                print(f"⚠️ WebSocket backplane error: {e}")
+
+    def _send_local(self, message: str, user_ids: Iterable[int], key: Optional[str] = None):
+        for user_id in user_ids:
+            for connection in self.active_connections.get(user_id, ()):
+                connection.enqueue(message, key)
+
+    async def _deliver_remote(self, envelope: str):
+        """Message published by another worker for users connected here"""
+        data = json.loads(envelope)
+        if data.get("origin") == self.worker_id:
+            return
+        if "items" in data:
+            for user_id, message in data["items"]:
+                self._send_local(message, [user_id])
+            return
+        user_ids = data.get("user_ids")
+        if user_ids is None:
+            user_ids = list(self.active_connections)
+        self._send_local(data["message"], user_ids, data.get("key"))
+
+    async def send_to_users(self, user_ids: Iterable[int], message: str, key: Optional[str] = None):
+        """
+        Deliver an already serialized message to every socket of user_ids, on
+        any worker: one presence lookup and one publish per remote worker.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        self._send_local(message, user_ids, key)
+
+        try:
+            by_worker: Dict[str, List[int]] = defaultdict(list)
+            for user_id, workers in (await self.backplane.workers_of(user_ids)).items():
+                for worker_id in workers:
+                    if worker_id != self.worker_id:
+                        by_worker[worker_id].append(user_id)
+            for worker_id, worker_users in by_worker.items():
+                envelope = json.dumps({"user_ids": worker_users, "message": message, "key": key})
+                if not await self.backplane.publish(worker_id, envelope):
+                    # Worker encerrado sem limpar a presença
+                    for user_id in worker_users:
+                        await self.backplane.remove_presence(user_id, worker_id)
+        except (OSError, RespError) as e:
+            print(f"⚠️ WebSocket backplane error: {e}")
+
+    async def send_batch(self, messages: Dict[int, str]):
+        """
+        Deliver a different message to each user (user_id -> message) with a
+        single presence lookup and one publish per remote worker.
+        """
+        for user_id, message in messages.items():
+            self._send_local(message, [user_id])
 
-    async def send_personal_message(self, message: str, user_id: int):
+        try:
+            by_worker: Dict[str, List[list]] = defaultdict(list)
+            for user_id, workers in (await self.backplane.workers_of(messages)).items():
+                for worker_id in workers:
+                    if worker_id != self.worker_id:
+                        by_worker[worker_id].append([user_id, messages[user_id]])
+            for worker_id, items in by_worker.items():
+                if not await self.backplane.publish(worker_id, json.dumps({"items": items})):
+                    for user_id, _ in items:
+                        await self.backplane.remove_presence(user_id, worker_id)
+        except (OSError, RespError) as e:
+            print(f"⚠️ WebSocket backplane error: {e}")
+
+    async def send_personal_message(self, message: str, user_id: int, key: Optional[str] = None):
+        await self.send_to_users([user_id], message, key)
+
+    async def broadcast(self, message: Union[str, dict], user_ids: Optional[Iterable[int]] = None):
+        """
+        Send one message to user_ids, or to everyone connected when omitted.
+        The JSON is serialized once for all recipients.
+        """
+        if not isinstance(message, str):
+            message = json.dumps(message)
+        if user_ids is not None:
+            await self.send_to_users(user_ids, message)
+            return
+
+        self._send_local(message, list(self.active_connections))
+        try:
+            await self.backplane.publish_all(json.dumps({"origin": self.worker_id, "user_ids": None, "message": message}))
+        except (OSError, RespError) as e:
+            print(f"⚠️ WebSocket backplane error: {e}")
+
+    async def is_online(self, user_id: int) -> bool:
         if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_text(message)
-                except:
-                    self.active_connections[user_id].remove(connection)
+            return True
+        return user_id in await self.backplane.workers_of([user_id])
+
+    async def online_users(self, user_ids: Iterable[int]) -> Set[int]:
+        """Subset of user_ids with an open socket on any worker"""
+        return set(await self.backplane.workers_of(user_ids))
 
     async def send_notification(self, user_id: int, notification: dict):
         message = json.dumps({
@@ -46,12 +266,13 @@ class ConnectionManager:
         await self.send_personal_message(message, user_id)
 
     async def send_typing_indicator(self, user_id: int, typing_data: dict):
-        """Enviar indicador de digitação"""
+        """Enviar indicador de digitação (só o estado mais recente fica na fila)"""
         message = json.dumps({
             "type": "typing",
             **typing_data
         })
-        await self.send_personal_message(message, user_id)
+        key = f"typing:{typing_data.get('conversation_id')}:{typing_data.get('user_id')}"
+        await self.send_personal_message(message, user_id, key)
 
     async def send_message_read(self, user_id: int, read_data: dict):
         """Notificar que mensagem foi lida"""
@@ -1,15 +1,20 @@
 """
 Aplicação principal FastAPI - Vibe Social Network
 """
+import asyncio
 import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 
-from core.config import ALLOWED_ORIGINS
+from core.config import ALLOWED_ORIGINS, UPLOAD_DIR, COUNTER_RECONCILE_INTERVAL_SECONDS, SEARCH_INDEX_REFRESH_SECONDS, MEDIA_GC_INTERVAL_SECONDS, NOTIFICATION_MAINTENANCE_INTERVAL_SECONDS, POST_PURGE_INTERVAL_SECONDS, PRESENCE_FLUSH_INTERVAL_SECONDS, STORY_ARCHIVE_INTERVAL_SECONDS, SUGGESTION_REFRESH_INTERVAL_SECONDS
 from core.database import engine, Base
-from routes import auth_router, posts_router, users_router, email_verification_router
+from core.scheduler import register_periodic_task, start_periodic_tasks, stop_periodic_tasks
+from core.passwords import password_pool
+from core.websockets import manager
+from core.presence import presence
+from utils.media import shutdown_media_pool
+from routes import auth_router, posts_router, users_router, email_verification_router, upload_router, media_router, notifications_router, messages_router, websocket_router, stories_router, friendships_router, friends_router, blocks_router
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -32,12 +37,52 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️ Erro ao criar tabelas: {e}")
 
+    # Jobs em segundo plano
+    from utils.counters import run_counter_reconciliation
+    register_periodic_task("reconcile-post-counters", COUNTER_RECONCILE_INTERVAL_SECONDS, run_counter_reconciliation)
+    from utils.blob_store import run_blob_gc
+    register_periodic_task("collect-media-blobs", MEDIA_GC_INTERVAL_SECONDS, run_blob_gc)
+    from utils.notification_inbox import run_notification_maintenance
+    register_periodic_task("notification-maintenance", NOTIFICATION_MAINTENANCE_INTERVAL_SECONDS, run_notification_maintenance)
+    register_periodic_task("flush-last-seen", PRESENCE_FLUSH_INTERVAL_SECONDS, presence.flush)
+    from utils.stories import run_story_archival
+    register_periodic_task("archive-expired-stories", STORY_ARCHIVE_INTERVAL_SECONDS, run_story_archival)
+    from utils.suggestions import run_suggestion_refresh
+    register_periodic_task("refresh-friend-suggestions", SUGGESTION_REFRESH_INTERVAL_SECONDS, run_suggestion_refresh)
+    from utils.post_purge import run_post_purge
+    register_periodic_task("purge-deleted-posts", POST_PURGE_INTERVAL_SECONDS, run_post_purge)
+
+    # Índice de busca de usuários: primeira carga em segundo plano e recarga
+    # periódica para incluir escritas feitas por outros workers
+    from utils.search import rebuild_search_index
+    search_build = asyncio.create_task(asyncio.to_thread(rebuild_search_index))
+    register_periodic_task("rebuild-search-index", SEARCH_INDEX_REFRESH_SECONDS, rebuild_search_index)
+    start_periodic_tasks()
+
+    # Canal deste worker no backplane de WebSockets
+    await manager.start()
+    from utils.notification_service import notification_pipeline
+    notification_pipeline.start()
+    from utils.messaging import read_receipts
+    read_receipts.start()
+    from utils.story_views import story_views
+    story_views.start()
+
     print("🌟 API pronta para uso!")
 
     yield
 
     # Shutdown
     print("🛑 Encerrando API...")
+    search_build.cancel()
+    await notification_pipeline.stop()
+    await read_receipts.stop()
+    await story_views.stop()
+    await manager.stop()
+    await stop_periodic_tasks()
+    await presence.flush()
+    password_pool.shutdown()
+    shutdown_media_pool()
 
 # Criar instância da aplicação FastAPI
 app = FastAPI(
@@ -54,22 +99,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Latest-Cursor"],
 )
 
 # Criar diretórios de upload se não existirem
-os.makedirs("uploads/stories", exist_ok=True)
-os.makedirs("uploads/posts", exist_ok=True)
-os.makedirs("uploads/profiles", exist_ok=True)
-os.makedirs("uploads/image", exist_ok=True)
+for subdir in ("stories", "posts", "profiles", "image"):
+    os.makedirs(os.path.join(UPLOAD_DIR, subdir), exist_ok=True)
 
-# Servir arquivos estáticos para uploads
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Arquivos de UPLOAD_DIR são servidos por routes/media.py (ETag, Range, cache)
 
 # Incluir rotas
 app.include_router(auth_router)
 app.include_router(posts_router)
 app.include_router(users_router)
 app.include_router(email_verification_router)
+app.include_router(upload_router)
+app.include_router(media_router)
+app.include_router(notifications_router)
+app.include_router(messages_router)
+app.include_router(websocket_router)
+app.include_router(stories_router)
+app.include_router(friendships_router)
+app.include_router(friends_router)
+app.include_router(blocks_router)
 
 @app.get("/")
 async def root():
@@ -83,7 +135,7 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy"}
+    return {"status": "healthy", "password_pool": password_pool.stats()}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Script para aplicar em bancos existentes as colunas e os índices declarados
+nos modelos
+
+`Base.metadata.create_all` só cria colunas e índices junto com tabelas novas.
+Este script compara os modelos com o banco e:
+- adiciona as colunas que faltam (ALGORITHM=INSTANT no MySQL 8);
+- cria as conversas das mensagens diretas antigas e liga cada mensagem à sua;
+- preenche o par normalizado (user_low_id, user_high_id) das amizades;
+- cria os índices que faltam com DDL online (ALGORITHM=INPLACE, LOCK=NONE,
+  sem bloquear escritas) e mostra o EXPLAIN das consultas mais frequentes
+  antes e depois, apontando quais mudaram de plano.
+
+Uso:
+    python migrate_schema.py            # aplica
+    python migrate_schema.py --dry-run  # apenas mostra o que seria feito
+"""
+import argparse
+
+from sqlalchemy import UniqueConstraint, create_engine, inspect, text
+from sqlalchemy.schema import CreateIndex
+
+from core.config import get_database_url
+from core.database import Base
+import models  # noqa: F401 - registra os modelos no metadata
+
+# Consultas representativas dos caminhos quentes da API
+HOT_QUERIES = {
+    "feed (keyset)": """
+        SELECT id FROM posts
+        WHERE created_at < NOW() OR (created_at = NOW() AND id < 1000)
+        ORDER BY created_at DESC, id DESC LIMIT 21
+    """,
+    "posts do perfil": """
+        SELECT id FROM posts WHERE author_id = 1 ORDER BY created_at DESC LIMIT 50
+    """,
+    "reação do usuário": """
+        SELECT id FROM reactions WHERE post_id = 1 AND user_id = 1
+    """,
+    "comentários do post": """
+        SELECT id FROM comments WHERE post_id = 1 AND parent_id IS NULL ORDER BY created_at, id LIMIT 21
+    """,
+    "respostas de um comentário": """
+        SELECT id FROM comments WHERE parent_id = 1 ORDER BY created_at, id LIMIT 21
+    """,
+    "posts excluídos a limpar": """
+        SELECT id FROM posts WHERE deleted_at IS NOT NULL ORDER BY deleted_at LIMIT 100
+    """,
+    "notificações de um post excluído": """
+        SELECT id FROM notifications WHERE post_id = 1 LIMIT 1000
+    """,
+    "amizade entre dois usuários": """
+        SELECT status FROM friendships WHERE user_low_id = 1 AND user_high_id = 2
+    """,
+    "amigos (lado maior do par)": """
+        SELECT user_low_id FROM friendships WHERE user_high_id = 1 AND status = 'accepted'
+    """,
+    "bloqueios do usuário": """
+        SELECT blocker_id FROM blocks WHERE blocked_id = 1
+    """,
+    "sugestões de amizade": """
+        SELECT suggested_id FROM friend_suggestions WHERE user_id = 1 ORDER BY score DESC LIMIT 70
+    """,
+    "seguidores": """
+        SELECT follower_id FROM follows WHERE followed_id = 1
+    """,
+    "notificações não lidas": """
+        SELECT COUNT(*) FROM notifications WHERE recipient_id = 1 AND is_read = 0
+    """,
+    "stories ativos": """
+        SELECT id FROM stories WHERE author_id IN (1, 2, 3) AND expires_at > NOW() AND archived = 0
+    """,
+    "stories a arquivar": """
+        SELECT id FROM stories WHERE archived = 0 AND expires_at <= NOW() ORDER BY expires_at LIMIT 1000
+    """,
+    "conversa": """
+        SELECT id FROM messages WHERE conversation_id = 1 AND created_at < NOW()
+        ORDER BY created_at DESC, id DESC LIMIT 51
+    """,
+    "lista de conversas": """
+        SELECT id FROM conversations WHERE user_low_id = 1 AND last_message_at IS NOT NULL
+        ORDER BY last_message_at DESC, id DESC LIMIT 21
+    """,
+}
+
+# Remove reações duplicadas (mantém a mais recente) antes do índice único
+DEDUPLICATE_REACTIONS = """
+    DELETE r1 FROM reactions r1
+    JOIN reactions r2
+      ON r1.post_id = r2.post_id AND r1.user_id = r2.user_id AND r1.id < r2.id
+"""
+
+# Remove visualizações repetidas de stories antes do índice único
+DEDUPLICATE_STORY_VIEWS = """
+    DELETE v1 FROM story_views v1
+    JOIN story_views v2
+      ON v1.story_id = v2.story_id AND v1.viewer_id = v2.viewer_id AND v1.id > v2.id
+"""
+
+# Uma amizade por par: fica a aceita ou, entre iguais, a mais recente
+DEDUPLICATE_FRIENDSHIPS = """
+    DELETE f1 FROM friendships f1
+    JOIN friendships f2
+      ON f1.user_low_id = f2.user_low_id AND f1.user_high_id = f2.user_high_id AND f1.id <> f2.id
+     AND ((f2.status = 'accepted' AND f1.status <> 'accepted')
+          OR ((f1.status = 'accepted') = (f2.status = 'accepted') AND f1.id < f2.id))
+"""
+
+# Bloqueios repetidos do mesmo par (fica o mais antigo)
+DEDUPLICATE_BLOCKS = """
+    DELETE b1 FROM blocks b1
+    JOIN blocks b2
+      ON b1.blocker_id = b2.blocker_id AND b1.blocked_id = b2.blocked_id AND b1.id > b2.id
+"""
+
+FILL_FRIENDSHIP_PAIRS = """
+    UPDATE friendships
+    SET user_low_id = LEAST(requester_id, addressee_id),
+        user_high_id = GREATEST(requester_id, addressee_id)
+    WHERE user_low_id IS NULL
+"""
+
+# Limpeza necessária antes de criar cada índice único
+DEDUPLICATE_BEFORE = {
+    "uq_reactions_post_user": ("reações", DEDUPLICATE_REACTIONS),
+    "uq_friendships_pair": ("amizades", DEDUPLICATE_FRIENDSHIPS),
+    "uq_story_views_story_viewer": ("visualizações de stories", DEDUPLICATE_STORY_VIEWS),
+    "uq_blocks_blocker_blocked": ("bloqueios", DEDUPLICATE_BLOCKS),
+}
+
+# Conversas a partir das mensagens antigas (mensagens diretas)
+BACKFILL_BATCH_SIZE = 10_000
+
+CREATE_CONVERSATIONS = """
+    INSERT IGNORE INTO conversations (user_low_id, user_high_id, created_at)
+    SELECT LEAST(sender_id, recipient_id), GREATEST(sender_id, recipient_id), MIN(created_at)
+    FROM messages
+    WHERE conversation_id IS NULL
+    GROUP BY LEAST(sender_id, recipient_id), GREATEST(sender_id, recipient_id)
+"""
+
+LINK_MESSAGES = """
+    UPDATE messages m
+    JOIN conversations c
+      ON c.user_low_id = LEAST(m.sender_id, m.recipient_id)
+     AND c.user_high_id = GREATEST(m.sender_id, m.recipient_id)
+    SET m.conversation_id = c.id
+    WHERE m.id >= :first_id AND m.id < :last_id AND m.conversation_id IS NULL
+"""
+
+REFRESH_CONVERSATIONS = """
+    UPDATE conversations c
+    JOIN messages m ON m.id = (SELECT MAX(id) FROM messages WHERE conversation_id = c.id)
+    SET c.last_message_id = m.id,
+        c.last_sender_id = m.sender_id,
+        c.last_message_preview = LEFT(COALESCE(m.content, ''), 200),
+        c.last_message_type = m.message_type,
+        c.last_message_at = m.created_at,
+        c.unread_low = (SELECT COUNT(*) FROM messages u
+                        WHERE u.conversation_id = c.id AND u.recipient_id = c.user_low_id AND u.is_read = 0),
+        c.unread_high = (SELECT COUNT(*) FROM messages u
+                         WHERE u.conversation_id = c.id AND u.recipient_id = c.user_high_id AND u.is_read = 0)
+    WHERE c.last_message_id IS NULL
+"""
+
+def explain_plans(conn) -> dict:
+    """Return {query name: (access type, key used)} from EXPLAIN"""
+    plans = {}
+    for name, sql in HOT_QUERIES.items():
+        try:
+            row = conn.execute(text(f"EXPLAIN {sql}")).mappings().first()
+            plans[name] = (row.get("type"), row.get("key")) if row else (None, None)
+        except Exception as e:
+            plans[name] = ("erro", str(e).splitlines()[0])
+    return plans
+
+def missing_columns(engine) -> list:
+    """ALTER TABLE statements for the model columns absent from the database"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    compiler = engine.dialect.ddl_compiler(engine.dialect, None)
+    statements = []
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                spec = compiler.get_column_specification(column)
+                statements.append((table.name, column.name, f"ALTER TABLE {table.name} ADD COLUMN {spec}"))
+
+    return statements
+
+def add_missing_columns(engine, dry_run: bool = False):
+    is_mysql = engine.dialect.name == "mysql"
+    with engine.connect() as conn:
+        for table_name, column_name, sql in missing_columns(engine):
+            if is_mysql:
+                sql += ", ALGORITHM=INSTANT"
+            print(f"📋 {table_name}.{column_name}: {sql}")
+            if dry_run:
+                continue
+            conn.execute(text(sql))
+            conn.commit()
+            print(f"✅ Coluna {table_name}.{column_name} adicionada!")
+
+def backfill_conversations(engine, dry_run: bool = False):
+    """
+    Fill conversations and messages.conversation_id for messages sent before
+    the conversations table existed. Messages are linked in id ranges of
+    BACKFILL_BATCH_SIZE, one short transaction each. MySQL only.
+    """
+    if engine.dialect.name != "mysql" or "messages" not in inspect(engine).get_table_names():
+        return
+
+    from models import Conversation
+    Conversation.__table__.create(bind=engine, checkfirst=True)
+
+    with engine.connect() as conn:
+        pending = conn.execute(text(
+            "SELECT MIN(id), MAX(id) FROM messages WHERE conversation_id IS NULL"
+        )).first()
+        if pending is None or pending[0] is None:
+            return
+
+        first_id, max_id = pending
+        print(f"📋 Conversas: mensagens {first_id}..{max_id} sem conversation_id")
+        if dry_run:
+            return
+
+        created = conn.execute(text(CREATE_CONVERSATIONS)).rowcount
+        conn.commit()
+        print(f"✅ {created} conversas criadas")
+
+        linked = 0
+        while first_id <= max_id:
+            linked += conn.execute(text(LINK_MESSAGES), {
+                "first_id": first_id, "last_id": first_id + BACKFILL_BATCH_SIZE
+            }).rowcount
+            conn.commit()
+            first_id += BACKFILL_BATCH_SIZE
+        print(f"✅ {linked} mensagens ligadas às conversas")
+
+        refreshed = conn.execute(text(REFRESH_CONVERSATIONS)).rowcount
+        conn.commit()
+        print(f"✅ Última mensagem e não lidas de {refreshed} conversas atualizadas")
+
+def backfill_friendship_pairs(engine, dry_run: bool = False):
+    """Fill the normalized (user_low_id, user_high_id) pair of existing friendships. MySQL only."""
+    if engine.dialect.name != "mysql" or "friendships" not in inspect(engine).get_table_names():
+        return
+
+    with engine.connect() as conn:
+        pending = conn.execute(text("SELECT COUNT(*) FROM friendships WHERE user_low_id IS NULL")).scalar()
+        if not pending:
+            return
+        print(f"📋 Amizades: {pending} sem o par normalizado")
+        if dry_run:
+            return
+        conn.execute(text(FILL_FRIENDSHIP_PAIRS))
+        conn.commit()
+        print(f"✅ Par normalizado de {pending} amizades preenchido")
+
+def missing_indexes(engine) -> list:
+    """Indexes (and unique constraints) declared in the models but absent from the database"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue  # create_all cria a tabela já com os índices
+
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        existing.update(constraint["name"] for constraint in inspector.get_unique_constraints(table.name))
+
+        for index in table.indexes:
+            if index.name not in existing:
+                missing.append((table.name, index.name, CreateIndex(index)))
+
+        for constraint in table.constraints:
+            if isinstance(constraint, UniqueConstraint) and constraint.name and constraint.name not in existing:
+                columns = ", ".join(column.name for column in constraint.columns)
+                ddl = f"CREATE UNIQUE INDEX {constraint.name} ON {table.name} ({columns})"
+                missing.append((table.name, constraint.name, ddl))
+
+    return missing
+
+def migrate_schema(dry_run: bool = False) -> bool:
+    """Adiciona as colunas, preenche as conversas e cria os índices que faltam"""
+    try:
+        engine = create_engine(get_database_url())
+        is_mysql = engine.dialect.name == "mysql"
+
+        print("🔍 Verificando colunas...")
+        add_missing_columns(engine, dry_run)
+        backfill_conversations(engine, dry_run)
+        backfill_friendship_pairs(engine, dry_run)
+
+        print("🔍 Verificando índices...")
+        missing = missing_indexes(engine)
+        if not missing:
+            print("✅ Todos os índices já existem!")
+            return True
+
+        with engine.connect() as conn:
+            before = explain_plans(conn) if is_mysql else {}
+
+            for table_name, index_name, ddl in missing:
+                sql = str(ddl.compile(dialect=engine.dialect)) if not isinstance(ddl, str) else ddl
+                if is_mysql:
+                    sql += " ALGORITHM=INPLACE LOCK=NONE"
+
+                print(f"📋 {table_name}.{index_name}: {sql}")
+                if dry_run:
+                    continue
+
+                if index_name in DEDUPLICATE_BEFORE and is_mysql:
+                    label, sql_dedupe = DEDUPLICATE_BEFORE[index_name]
+                    removed = conn.execute(text(sql_dedupe)).rowcount
+                    conn.commit()
+                    print(f"🧹 {removed} {label} duplicadas removidas")
+
+                conn.execute(text(sql))
+                conn.commit()
+                print(f"✅ Índice {index_name} criado!")
+
+            if dry_run or not is_mysql:
+                return True
+
+            after = explain_plans(conn)
+
+        print("\n📊 Planos de execução (tipo de acesso, índice usado):")
+        for name in HOT_QUERIES:
+            marker = "🔄" if before[name] != after[name] else "  "
+            print(f"{marker} {name}: {before[name]} -> {after[name]}")
+
+        engine.dispose()
+        print("🎉 Migração do esquema concluída!")
+
+    except Exception as e:
+        print(f"❌ Erro na migração do esquema: {e}")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aplica as colunas e os índices dos modelos em um banco existente")
+    parser.add_argument("--dry-run", action="store_true", help="apenas mostra o DDL que seria executado")
+    args = parser.parse_args()
+
+    success = migrate_schema(dry_run=args.dry_run)
+    if not success:
+        exit(1)
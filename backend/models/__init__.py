@@ -2,15 +2,16 @@
 Modelos do banco de dados
 """
 from .user import User
-from .post import Post, Reaction, Comment, Share
+from .post import Post, Reaction, Comment, CommentReaction, Share
 from .story import Story, StoryView, StoryTag, StoryOverlay
-from .friendship import Friendship, Block, Follow
-from .notification import Notification, Message, MediaFile
+from .friendship import Friendship, Block, Follow, FriendSuggestion, FriendSuggestionQueue
+from .notification import Notification, NotificationArchive, Conversation, IdSequence, Message, MediaFile, MediaBlob
 
 __all__ = [
     "User",
-    "Post", "Reaction", "Comment", "Share",
+    "Post", "Reaction", "Comment", "CommentReaction", "Share",
     "Story", "StoryView", "StoryTag", "StoryOverlay", 
-    "Friendship", "Block", "Follow",
-    "Notification", "Message", "MediaFile"
+    "Friendship", "Block", "Follow", "FriendSuggestion", "FriendSuggestionQueue",
+    "Notification", "NotificationArchive", "Conversation", "IdSequence", "Message",
+    "MediaFile", "MediaBlob"
 ]
@@ -1,7 +1,7 @@
 """
 Modelos de relacionamentos entre usuários
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from core.database import Base
@@ -13,12 +13,26 @@ class Friendship(Base):
     requester_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     addressee_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     status = Column(String(20), default="pending")  # pending, accepted, rejected
+    # Par normalizado (menor id, maior id): uma linha por par de usuários,
+    # encontrada por um único índice qualquer que seja o lado
+    user_low_id = Column(Integer)
+    user_high_id = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
     
     requester = relationship("User", foreign_keys=[requester_id])
     addressee = relationship("User", foreign_keys=[addressee_id])
 
+    __table_args__ = (
+        # Friendships are looked up from both sides
+        Index("ix_friendships_requester_addressee_status", "requester_id", "addressee_id", "status"),
+        Index("ix_friendships_addressee_requester_status", "addressee_id", "requester_id", "status"),
+        UniqueConstraint("user_low_id", "user_high_id", name="uq_friendships_pair"),
+        # Amigos de um usuário: um intervalo de índice em cada lado do par
+        Index("ix_friendships_low_status_high", "user_low_id", "status", "user_high_id"),
+        Index("ix_friendships_high_status_low", "user_high_id", "status", "user_low_id"),
+    )
+
 class Block(Base):
     __tablename__ = "blocks"
 
@@ -30,6 +44,12 @@ class Block(Base):
     blocker = relationship("User", foreign_keys=[blocker_id], backref="blocking")
     blocked = relationship("User", foreign_keys=[blocked_id], backref="blocked_by")
 
+    __table_args__ = (
+        # Lista de bloqueio de um usuário: quem ele bloqueou e quem o bloqueou
+        UniqueConstraint("blocker_id", "blocked_id", name="uq_blocks_blocker_blocked"),
+        Index("ix_blocks_blocked_blocker", "blocked_id", "blocker_id"),
+    )
+
 class Follow(Base):
     __tablename__ = "follows"
 
@@ -40,3 +60,32 @@ class Follow(Base):
 
     follower = relationship("User", foreign_keys=[follower_id], backref="following")
     followed = relationship("User", foreign_keys=[followed_id], backref="followers")
+
+    __table_args__ = (
+        Index("ix_follows_follower_followed", "follower_id", "followed_id"),
+        Index("ix_follows_followed_follower", "followed_id", "follower_id"),
+    )
+
+class FriendSuggestion(Base):
+    """Top friend suggestions of each user, precomputed by utils/suggestions.py"""
+    __tablename__ = "friend_suggestions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    suggested_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    score = Column(Float, nullable=False)
+    mutual_friends = Column(Integer, default=0)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "suggested_id", name="uq_friend_suggestions_user_suggested"),
+        Index("ix_friend_suggestions_user_score", "user_id", "score"),
+    )
+
+class FriendSuggestionQueue(Base):
+    """Users whose suggestions must be recomputed (their friendships changed)"""
+    __tablename__ = "friend_suggestion_queue"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    queued_at = Column(DateTime, default=datetime.utcnow)
@@ -1,7 +1,7 @@
 """
 Modelos de notificações e mensagens
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Index, JSON, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from core.database import Base
@@ -16,16 +16,87 @@ class Notification(Base):
     title = Column(String(200), nullable=False)
     message = Column(Text, nullable=False)
     data = Column(Text)  # JSON data
+    post_id = Column(Integer)  # post das notificações agregadas (curtidas, comentários...)
+    actor_count = Column(Integer, default=1)  # "Ana e outras 37 pessoas"
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # "<lote>:<posição>" das linhas gravadas pelo pipeline: os ids do INSERT
+    # de várias linhas são lidos de volta por ele num único SELECT
+    batch_token = Column(String(40))
     
     recipient = relationship("User", foreign_keys=[recipient_id], backref="received_notifications")
     sender = relationship("User", foreign_keys=[sender_id], backref="sent_notifications")
 
+    __table_args__ = (
+        # Inbox and unread badge of a user
+        Index("ix_notifications_recipient_read_created", "recipient_id", "is_read", "created_at"),
+        # Unread notification that new events of the same post/type are merged into
+        Index("ix_notifications_recipient_type_post", "recipient_id", "notification_type", "post_id", "is_read"),
+        # Inbox pages (keyset on created_at, id)
+        Index("ix_notifications_recipient_created_id", "recipient_id", "created_at", "id"),
+        # Retention job: old read notifications
+        Index("ix_notifications_read_created", "is_read", "created_at"),
+        # Cleanup of deleted posts
+        Index("ix_notifications_post", "post_id"),
+        # Ids of the rows of a pipeline batch
+        Index("ix_notifications_batch_token", "batch_token"),
+    )
+
+class NotificationArchive(Base):
+    """Read notifications moved out of the inbox by the retention job"""
+    __tablename__ = "notifications_archive"
+
+    id = Column(Integer, primary_key=True)  # mesmo id da notificação original
+    recipient_id = Column(Integer, nullable=False, index=True)
+    sender_id = Column(Integer)
+    notification_type = Column(String(50), nullable=False)
+    title = Column(String(200), nullable=False)
+    message = Column(Text, nullable=False)
+    data = Column(Text)
+    post_id = Column(Integer, index=True)
+    actor_count = Column(Integer, default=1)
+    is_read = Column(Boolean, default=True)
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+class Conversation(Base):
+    """
+    One row per pair of users (user_low_id < user_high_id) with the last
+    message and each side's unread count, so the chat list never scans messages.
+    """
+    __tablename__ = "conversations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_low_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_high_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    last_message_id = Column(Integer)
+    last_sender_id = Column(Integer)
+    last_message_preview = Column(String(200))
+    last_message_type = Column(String(20))
+    last_message_at = Column(DateTime)
+    unread_low = Column(Integer, default=0, nullable=False, server_default="0")  # não lidas por user_low
+    unread_high = Column(Integer, default=0, nullable=False, server_default="0")  # não lidas por user_high
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("user_low_id", "user_high_id", name="uq_conversations_pair"),
+        # Chat list of a user, from either side of the pair
+        Index("ix_conversations_low_last", "user_low_id", "last_message_at", "id"),
+        Index("ix_conversations_high_last", "user_high_id", "last_message_at", "id"),
+    )
+
+class IdSequence(Base):
+    """Blocks of ids handed out ahead of the INSERT (see utils/messaging.py)"""
+    __tablename__ = "id_sequences"
+
+    name = Column(String(50), primary_key=True)
+    next_value = Column(BigInteger, nullable=False)
+
 class Message(Base):
     __tablename__ = "messages"
 
     id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(Integer)
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     recipient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     content = Column(Text)
@@ -39,6 +110,13 @@ class Message(Base):
     sender = relationship("User", foreign_keys=[sender_id], backref="sent_messages")
     recipient = relationship("User", foreign_keys=[recipient_id], backref="received_messages")
 
+    __table_args__ = (
+        Index("ix_messages_sender_recipient_created", "sender_id", "recipient_id", "created_at"),
+        # History pages (keyset on created_at, id) and read receipts of a conversation
+        Index("ix_messages_conversation_created_id", "conversation_id", "created_at", "id"),
+        Index("ix_messages_conversation_recipient_read", "conversation_id", "recipient_id", "is_read", "id"),
+    )
+
 class MediaFile(Base):
     __tablename__ = "media_files"
 
@@ -51,5 +129,31 @@ class MediaFile(Base):
     file_type = Column(String(20))  # image, video, audio, document
     uploaded_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     upload_date = Column(DateTime, default=datetime.utcnow)
+    content_hash = Column(String(64), index=True)  # MediaBlob com o conteúdo
 
     uploader = relationship("User", backref="uploaded_files")
+
+    __table_args__ = (
+        # Lookup of the media behind a post's media_url
+        Index("ix_media_files_file_path", "file_path"),
+    )
+
+class MediaBlob(Base):
+    """Conteúdo armazenado uma única vez por SHA-256, compartilhado pelos MediaFile"""
+    __tablename__ = "media_blobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, nullable=False)
+    file_path = Column(String(500), nullable=False)  # URL pública do arquivo
+    file_size = Column(Integer)
+    mime_type = Column(String(100))
+    ref_count = Column(Integer, default=0, nullable=False)  # MediaFile que apontam para o blob
+    variants = Column(JSON)  # thumbnails/WebP gerados em segundo plano
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # última mudança de ref_count
+
+    __table_args__ = (
+        Index("ix_media_blobs_file_path", "file_path"),
+        # Garbage collector: unreferenced blobs past the grace period
+        Index("ix_media_blobs_ref_count_updated", "ref_count", "updated_at"),
+    )
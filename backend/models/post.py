@@ -1,7 +1,7 @@
 """
 Modelos relacionados a posts
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Index, UniqueConstraint, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from core.database import Base
@@ -16,6 +16,7 @@ class Post(Base):
     media_type = Column(String(50))
     media_url = Column(String(500))
     media_metadata = Column(Text)
+    media_variants = Column(JSON)  # cópia de MediaFile.variants da mídia do post
     privacy = Column(String(20), default="public")  # public, friends, private
     created_at = Column(DateTime, default=datetime.utcnow)
     reactions_count = Column(Integer, default=0)
@@ -23,9 +24,23 @@ class Post(Base):
     shares_count = Column(Integer, default=0)
     is_profile_update = Column(Boolean, default=False)
     is_cover_update = Column(Boolean, default=False)
+    # Exclusão lógica: o post some de todas as leituras na hora e um job apaga
+    # os dependentes e a linha depois (ver utils/post_purge.py)
+    deleted_at = Column(DateTime)
     
     author = relationship("User", backref="posts")
 
+    __table_args__ = (
+        # Feed keyset pagination: ORDER BY created_at DESC, id DESC
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        # Posts of a profile, newest first
+        Index("ix_posts_author_created_at", "author_id", "created_at"),
+        # Posts to update once the variants of their media are ready
+        Index("ix_posts_media_url", "media_url"),
+        # Posts excluídos à espera da limpeza
+        Index("ix_posts_deleted_at", "deleted_at"),
+    )
+
 class Reaction(Base):
     __tablename__ = "reactions"
     
@@ -39,6 +54,11 @@ class Reaction(Base):
     user = relationship("User", backref="reactions")
     post = relationship("Post", backref="reactions")
 
+    __table_args__ = (
+        # One reaction per user and post; backs the insert-or-update of reactions
+        UniqueConstraint("post_id", "user_id", name="uq_reactions_post_user"),
+    )
+
 class Comment(Base):
     __tablename__ = "comments"
     
@@ -48,11 +68,36 @@ class Comment(Base):
     author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     parent_id = Column(Integer, ForeignKey("comments.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Contadores mantidos junto com as linhas (ver utils/counters.py)
+    reactions_count = Column(Integer, default=0)
+    replies_count = Column(Integer, default=0)
     
     author = relationship("User", backref="comments")
     post = relationship("Post", backref="comments")
     parent = relationship("Comment", remote_side=[id], backref="replies")
 
+    __table_args__ = (
+        Index("ix_comments_post_created_at", "post_id", "created_at"),
+        # Comentários de primeiro nível de um post (parent_id IS NULL), em ordem
+        Index("ix_comments_post_parent_created_id", "post_id", "parent_id", "created_at", "id"),
+        # Respostas de cada comentário, em ordem
+        Index("ix_comments_parent_created_id", "parent_id", "created_at", "id"),
+    )
+
+class CommentReaction(Base):
+    __tablename__ = "comment_reactions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    comment_id = Column(Integer, ForeignKey("comments.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    reaction_type = Column(String(20), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("comment_id", "user_id", name="uq_comment_reactions_comment_user"),
+    )
+
 class Share(Base):
     __tablename__ = "shares"
     
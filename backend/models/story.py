@@ -1,7 +1,7 @@
 """
 Modelos relacionados a stories
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from core.database import Base
@@ -25,6 +25,13 @@ class Story(Base):
     
     author = relationship("User", backref="stories")
 
+    __table_args__ = (
+        # Active stories of a set of authors
+        Index("ix_stories_author_expires", "author_id", "expires_at"),
+        # Expired stories still to be archived
+        Index("ix_stories_archived_expires", "archived", "expires_at"),
+    )
+
 class StoryView(Base):
     __tablename__ = "story_views"
     
@@ -36,6 +43,13 @@ class StoryView(Base):
     story = relationship("Story", backref="views")
     viewer = relationship("User", backref="story_views")
 
+    __table_args__ = (
+        # Uma visualização por pessoa: as gravações em lote usam INSERT IGNORE
+        UniqueConstraint("story_id", "viewer_id", name="uq_story_views_story_viewer"),
+        # Lista de quem viu, mais recentes primeiro
+        Index("ix_story_views_story_viewed", "story_id", "viewed_at"),
+    )
+
 class StoryTag(Base):
     __tablename__ = "story_tags"
 
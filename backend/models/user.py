@@ -1,7 +1,7 @@
 """
 Modelo de usuário
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Date
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Date, JSON
 from datetime import datetime
 from core.database import Base
 
@@ -23,6 +23,7 @@ class User(Base):
     nickname = Column(String(50))
     bio = Column(Text)
     avatar = Column(String(500))
+    avatar_variants = Column(JSON)  # miniaturas do avatar (ver utils/media.py)
     cover_photo = Column(String(500))
     location = Column(String(100))
     website = Column(String(200))
@@ -55,4 +56,5 @@ class User(Base):
     deactivated_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     last_seen = Column(DateTime, default=datetime.utcnow)
+    unread_notifications_count = Column(Integer, default=0, nullable=False, server_default="0")
     updated_at = Column(DateTime, default=datetime.utcnow)
@@ -5,10 +5,26 @@ from .auth import router as auth_router
 from .posts import router as posts_router
 from .users import router as users_router
 from .email_verification import router as email_verification_router
+from .upload import router as upload_router
+from .media import router as media_router
+from .notifications import router as notifications_router
+from .messages import router as messages_router
+from .websocket import router as websocket_router
+from .stories import router as stories_router
+from .friendships import router as friendships_router, friends_router, blocks_router
 
 __all__ = [
     "auth_router",
     "posts_router",
     "users_router",
-    "email_verification_router"
+    "email_verification_router",
+    "upload_router",
+    "media_router",
+    "notifications_router",
+    "messages_router",
+    "websocket_router",
+    "stories_router",
+    "friendships_router",
+    "friends_router",
+    "blocks_router"
 ]
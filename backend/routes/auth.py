@@ -2,11 +2,12 @@
 Rotas de autenticação
 """
 from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 
-from core.database import get_db
-from core.security import hash_password, verify_password, create_access_token, get_current_user
+from core.database import get_async_db
+from core.security import hash_password_async, verify_password_async, create_access_token, get_current_user, get_current_user_id
 from core.config import ACCESS_TOKEN_EXPIRE_MINUTES
 from models import User
 from schemas import LoginRequest, Token, UserCreate, UserResponse
@@ -14,17 +15,15 @@ from schemas import LoginRequest, Token, UserCreate, UserResponse
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.get("/test-db")
-def test_database_connection(db: Session = Depends(get_db)):
+async def test_database_connection(db: AsyncSession = Depends(get_async_db)):
     """Test endpoint to verify database connection and schema"""
     try:
-        from sqlalchemy import text
-
         # Test basic database connection
-        result = db.execute(text("SELECT 1 as test")).fetchone()
+        result = (await db.execute(text("SELECT 1 as test"))).fetchone()
         print(f"✅ Database connection test: {result}")
 
         # Test User table access
-        user_count = db.query(User).count()
+        user_count = await db.scalar(select(func.count()).select_from(User))
         print(f"✅ User table accessible, count: {user_count}")
 
         return {
@@ -42,7 +41,7 @@ def test_database_connection(db: Session = Depends(get_db)):
         }
 
 @router.post("/register")
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     try:
         print(f"🔍 Registration attempt for email: {user.email}")
         print(f"🔍 Received data: {user.dict()}")
@@ -60,7 +59,8 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         print(f"✅ Required fields validated")
 
         # Verifica se o usuário já existe
-        db_user = db.query(User).filter(User.email == user.email).first()
+        result = await db.execute(select(User).where(User.email == user.email))
+        db_user = result.scalars().first()
         if db_user:
             print(f"❌ Email already registered: {user.email}")
             raise HTTPException(status_code=400, detail="Email already registered")
@@ -68,7 +68,7 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         print(f"✅ Email available: {user.email}")
 
         # Hash password
-        hashed_password = hash_password(user.password)
+        hashed_password = await hash_password_async(user.password)
         print(f"✅ Password hashed successfully")
 
         # Process birth date
@@ -100,8 +100,7 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
 
         # Save to database
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
 
         print(f"✅ User {db_user.id} created successfully!")
 
@@ -122,15 +121,16 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         raise
     except Exception as e:
         print(f"❌ Unexpected error: {type(e).__name__}: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Erro interno do servidor: {str(e)}")
 
 @router.post("/login", response_model=Token)
-def login(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login(login_data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     try:
-        user = db.query(User).filter(User.email == login_data.email).first()
+        result = await db.execute(select(User).where(User.email == login_data.email))
+        user = result.scalars().first()
         
-        if not user or not verify_password(login_data.password, user.password_hash):
+        if not user or not await verify_password_async(login_data.password, user.password_hash):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect username or password",
@@ -156,23 +156,23 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return current_user
 
 @router.get("/check-email")
-def check_email_exists(email: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == email).first()
-    return {"exists": user is not None}
+async def check_email_exists(email: str, db: AsyncSession = Depends(get_async_db)):
+    user_id = await db.scalar(select(User.id).where(User.email == email))
+    return {"exists": user_id is not None}
 
 @router.get("/check-username")
-def check_username_exists(username: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    user = db.query(User).filter(
+async def check_username_exists(username: str, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    user_id = await db.scalar(select(User.id).where(
         User.username == username,
-        User.id != current_user.id  # Exclude current user
-    ).first()
-    return {"exists": user is not None}
+        User.id != current_user_id  # Exclude current user
+    ))
+    return {"exists": user_id is not None}
 
 @router.get("/check-username-public")
-def check_username_exists_public(username: str, db: Session = Depends(get_db)):
+async def check_username_exists_public(username: str, db: AsyncSession = Depends(get_async_db)):
     """Public route to check username availability during registration"""
-    user = db.query(User).filter(User.username == username).first()
-    return {"exists": user is not None}
+    user_id = await db.scalar(select(User.id).where(User.username == username))
+    return {"exists": user_id is not None}
 
 @router.get("/verify-token")
 async def verify_token(current_user: User = Depends(get_current_user)):
@@ -3,13 +3,14 @@ Rotas de verificação de e-mail
 """
 from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, delete, func, select
 from datetime import datetime, timedelta
 import random
 import secrets
 from pydantic import BaseModel
 
-from core.database import get_db, Base
+from core.database import get_async_db, Base
 from models import User
 
 router = APIRouter(prefix="/email-verification", tags=["email-verification"])
@@ -108,7 +109,7 @@ def create_verification_record(user_id: int, email: str, first_name: str, db: Se
 @router.post("/send-verification")
 async def send_verification_email(
     request: SendVerificationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Enviar código de verificação por e-mail"""
     try:
@@ -119,17 +120,17 @@ async def send_verification_email(
         print(f"📧 Received verification request for user {user_id}: {email}")
 
         # Verificar se o usuário existe
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if not user:
             print(f"❌ User {user_id} not found in database")
             raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
         # Verificar limite de tentativas (anti-spam) - 5 por hora
         one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-        recent_attempts = db.query(EmailVerification).filter(
+        recent_attempts = await db.scalar(select(func.count()).select_from(EmailVerification).where(
             EmailVerification.user_id == user_id,
             EmailVerification.created_at > one_hour_ago
-        ).count()
+        ))
 
         if recent_attempts >= 5:
             print(f"❌ Too many attempts for user {user_id}")
@@ -140,10 +141,11 @@ async def send_verification_email(
 
         # Verificar cooldown (1 minuto)
         one_minute_ago = datetime.utcnow() - timedelta(minutes=1)
-        recent_attempt = db.query(EmailVerification).filter(
+        result = await db.execute(select(EmailVerification).where(
             EmailVerification.user_id == user_id,
             EmailVerification.created_at > one_minute_ago
-        ).first()
+        ))
+        recent_attempt = result.scalars().first()
 
         if recent_attempt:
             remaining_time = 60 - int((datetime.utcnow() - recent_attempt.created_at).total_seconds())
@@ -163,10 +165,10 @@ async def send_verification_email(
         print(f"📝 Generated verification code: {verification_code}")
 
         # Remover verificações antigas não utilizadas
-        db.query(EmailVerification).filter(
+        await db.execute(delete(EmailVerification).where(
             EmailVerification.user_id == user_id,
             EmailVerification.verified == False
-        ).delete()
+        ))
 
         # Salvar no banco
         db_verification = EmailVerification(
@@ -177,7 +179,7 @@ async def send_verification_email(
             expires_at=expires_at
         )
         db.add(db_verification)
-        db.commit()
+        await db.commit()
         
         print(f"✅ Verification record saved to database")
 
@@ -202,7 +204,7 @@ async def send_verification_email(
 @router.post("/verify-code")
 async def verify_code(
     request: VerifyCodeRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Verificar código de 6 dígitos"""
     try:
@@ -212,12 +214,13 @@ async def verify_code(
         print(f"🔍 Verifying code {code} for user {user_id}")
 
         # Buscar código válido
-        verification = db.query(EmailVerification).filter(
+        result = await db.execute(select(EmailVerification).where(
             EmailVerification.user_id == user_id,
             EmailVerification.verification_code == code,
             EmailVerification.verified == False,
             EmailVerification.expires_at > datetime.utcnow()
-        ).first()
+        ))
+        verification = result.scalars().first()
 
         if not verification:
             print(f"❌ Invalid or expired code for user {user_id}")
@@ -231,12 +234,12 @@ async def verify_code(
         verification.verified_at = datetime.utcnow()
 
         # Atualizar usuário como verificado
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if user:
             user.is_verified = True
             print(f"✅ User {user_id} marked as verified")
 
-        db.commit()
+        await db.commit()
 
         return {
             "success": True,
@@ -252,18 +255,19 @@ async def verify_code(
 @router.post("/verify-token")
 async def verify_token(
     request: VerifyTokenRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Verificar token do link do e-mail"""
     try:
         token = request.token
 
         # Buscar token válido
-        verification = db.query(EmailVerification).filter(
+        result = await db.execute(select(EmailVerification).where(
             EmailVerification.verification_token == token,
             EmailVerification.verified == False,
             EmailVerification.expires_at > datetime.utcnow()
-        ).first()
+        ))
+        verification = result.scalars().first()
 
         if not verification:
             raise HTTPException(
@@ -276,11 +280,11 @@ async def verify_token(
         verification.verified_at = datetime.utcnow()
 
         # Atualizar usuário como verificado
-        user = db.query(User).filter(User.id == verification.user_id).first()
+        user = await db.get(User, verification.user_id)
         if user:
             user.is_verified = True
 
-        db.commit()
+        await db.commit()
 
         return {
             "success": True,
@@ -297,11 +301,11 @@ async def verify_token(
 @router.get("/verification-status/{user_id}")
 async def get_verification_status(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Verificar status de verificação do usuário"""
     try:
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
@@ -0,0 +1,262 @@
+"""
+Rotas de amizades e bloqueios
+"""
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from core.config import SUGGESTIONS_TOP_N
+from core.database import get_async_db
+from core.security import get_current_user, get_current_user_id
+from models import Block, Friendship, FriendSuggestion, User
+from schemas import BlockCreate, FriendshipCreate
+from utils.blocks import block_list
+from utils.feed import serialize_author
+from utils.friend_graph import friend_graph, friendship_pair
+from utils.notification_service import NotificationService
+from utils.stories import invalidate_tray
+from utils.suggestions import enqueue_suggestion_refresh
+
+router = APIRouter(prefix="/friendships", tags=["friendships"])
+friends_router = APIRouter(prefix="/friends", tags=["friendships"])
+blocks_router = APIRouter(prefix="/blocks", tags=["friendships"])
+
+async def _get_pair(db: AsyncSession, a: int, b: int):
+    low, high = friendship_pair(a, b)
+    result = await db.execute(
+        select(Friendship).where(Friendship.user_low_id == low, Friendship.user_high_id == high).with_for_update()
+    )
+    return result.scalars().first()
+
+def _friendship_changed(a: int, b: int):
+    """Drop the cached state of both users (after the change is committed)"""
+    friend_graph.invalidate(a, b)
+    # A bandeja de stories de cada um inclui os amigos
+    invalidate_tray(a)
+    invalidate_tray(b)
+
+async def _accept(db: AsyncSession, friendship: Friendship, user_id: int, first_name: str) -> dict:
+    """Accept the pending request addressed to user_id"""
+    friendship.status = "accepted"
+    friendship.updated_at = datetime.utcnow()
+    requester_id = friendship.requester_id
+    await enqueue_suggestion_refresh(db, requester_id, user_id)
+    await db.commit()
+    _friendship_changed(requester_id, user_id)
+    NotificationService.send_friend_accept_notification(requester_id, user_id, first_name)
+    return {"id": friendship.id, "status": "accepted"}
+
+@router.post("/")
+async def send_friend_request(request_data: FriendshipCreate, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """Send a friend request (accepts the pending one in the other direction, if any)"""
+    addressee_id = request_data.addressee_id
+    user_id, first_name = current_user.id, current_user.first_name
+    if addressee_id == user_id:
+        raise HTTPException(status_code=400, detail="Cannot send a friend request to yourself")
+    if await db.scalar(select(User.id).where(User.id == addressee_id, User.is_active == True)) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if await block_list.is_blocked(db, user_id, addressee_id):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    now = datetime.utcnow()
+    friendship = await _get_pair(db, user_id, addressee_id)
+    if friendship is not None and friendship.status == "accepted":
+        raise HTTPException(status_code=400, detail="Already friends")
+    if friendship is not None and friendship.status == "pending":
+        if friendship.requester_id == user_id:
+            raise HTTPException(status_code=400, detail="Friend request already sent")
+        return await _accept(db, friendship, user_id, first_name)
+
+    low, high = friendship_pair(user_id, addressee_id)
+    if friendship is None:
+        friendship = Friendship(user_low_id=low, user_high_id=high, created_at=now)
+        db.add(friendship)
+    # Uma solicitação recusada antes é reaproveitada (uma linha por par)
+    friendship.requester_id = user_id
+    friendship.addressee_id = addressee_id
+    friendship.status = "pending"
+    friendship.updated_at = now
+    # Pedidos pendentes e recusados também saem das sugestões
+    await enqueue_suggestion_refresh(db, user_id, addressee_id)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # O outro enviou o pedido ao mesmo tempo e gravou a linha do par antes
+        await db.rollback()
+        friendship = await _get_pair(db, user_id, addressee_id)
+        if friendship is None:
+            raise
+        if friendship.status == "pending" and friendship.addressee_id == user_id:
+            return await _accept(db, friendship, user_id, first_name)
+        await db.commit()
+        return {"id": friendship.id, "status": friendship.status}
+
+    NotificationService.send_friend_request_notification(addressee_id, user_id, first_name)
+    return {"id": friendship.id, "status": "pending"}
+
+@router.get("/pending")
+async def get_pending_requests(current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Friend requests received by the current user"""
+    result = await db.execute(
+        select(Friendship)
+        .options(joinedload(Friendship.requester))
+        .where(Friendship.addressee_id == current_user_id, Friendship.status == "pending")
+        .order_by(Friendship.created_at.desc())
+    )
+    return [
+        {
+            "id": friendship.id,
+            "requester": {**serialize_author(friendship.requester), "bio": friendship.requester.bio},
+            "created_at": friendship.created_at,
+        }
+        for friendship in result.scalars().all()
+    ]
+
+async def _pending_request(db: AsyncSession, request_id: int, user_id: int) -> Friendship:
+    friendship = (await db.execute(select(Friendship).where(Friendship.id == request_id).with_for_update())).scalars().first()
+    if friendship is None or friendship.addressee_id != user_id or friendship.status != "pending":
+        raise HTTPException(status_code=404, detail="Friend request not found")
+    return friendship
+
+@router.put("/{request_id}/accept")
+async def accept_friend_request(request_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    friendship = await _pending_request(db, request_id, current_user.id)
+    await _accept(db, friendship, current_user.id, current_user.first_name)
+    return {"message": "Friend request accepted"}
+
+@router.put("/{request_id}/reject")
+async def reject_friend_request(request_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    friendship = await _pending_request(db, request_id, current_user_id)
+    friendship.status = "rejected"
+    friendship.updated_at = datetime.utcnow()
+    await enqueue_suggestion_refresh(db, friendship.requester_id, current_user_id)
+    await db.commit()
+    return {"message": "Friend request rejected"}
+
+@router.get("/status/{user_id}")
+async def get_friendship_status(user_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """none, pending or accepted; pending requests also say who sent them"""
+    if await friend_graph.are_friends(db, current_user_id, user_id):
+        return {"status": "accepted"}
+
+    low, high = friendship_pair(current_user_id, user_id)
+    row = (await db.execute(
+        select(Friendship.id, Friendship.status, Friendship.requester_id)
+        .where(Friendship.user_low_id == low, Friendship.user_high_id == high)
+    )).first()
+    if row is None or row.status != "pending":
+        return {"status": "none"}
+    return {"status": "pending", "request_id": row.id, "sent_by_me": row.requester_id == current_user_id}
+
+@friends_router.get("")
+async def get_friends(current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Friends of the current user"""
+    friend_ids = await friend_graph.friend_ids(db, current_user_id)
+    friends = []
+    if friend_ids:
+        result = await db.execute(
+            select(User).where(User.id.in_(list(friend_ids)), User.is_active == True).order_by(User.first_name)
+        )
+        friends = [serialize_author(user) for user in result.scalars().all()]
+    return {"friends": friends, "count": len(friend_ids)}
+
+@friends_router.get("/suggestions")
+async def get_friend_suggestions(limit: int = 20, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """People you may know, read from the precomputed friend_suggestions table"""
+    limit = max(1, min(limit, SUGGESTIONS_TOP_N))
+    # Quem virou amigo ou foi bloqueado depois do último cálculo é pulado
+    skip = set(await friend_graph.friend_ids(db, current_user_id))
+    skip.update(await block_list.hidden_ids(db, current_user_id))
+
+    result = await db.execute(
+        select(FriendSuggestion, User)
+        .join(User, User.id == FriendSuggestion.suggested_id)
+        .where(FriendSuggestion.user_id == current_user_id, User.is_active == True)
+        .order_by(FriendSuggestion.score.desc(), FriendSuggestion.suggested_id)
+        .limit(limit + len(skip))
+    )
+    suggestions = [
+        {"user": serialize_author(user), "mutual_friends": suggestion.mutual_friends or 0}
+        for suggestion, user in result.all() if user.id not in skip
+    ][:limit]
+    if suggestions:
+        return suggestions
+
+    # Ainda não calculadas: amigos de amigos do grafo em cache, e o usuário
+    # entra na fila para o próximo cálculo
+    mutual = {
+        user_id: count
+        for user_id, count in (await friend_graph.friends_of_friends(db, current_user_id, limit=limit + len(skip))).items()
+        if user_id not in skip
+    }
+    if not mutual:
+        return []
+    await enqueue_suggestion_refresh(db, current_user_id)
+    await db.commit()
+    result = await db.execute(select(User).where(User.id.in_(list(mutual)), User.is_active == True))
+    users = sorted(result.scalars().all(), key=lambda user: (-mutual[user.id], user.id))
+    return [{"user": serialize_author(user), "mutual_friends": mutual[user.id]} for user in users[:limit]]
+
+@friends_router.delete("/{user_id}")
+async def remove_friend(user_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Undo a friendship"""
+    friendship = await _get_pair(db, current_user_id, user_id)
+    if friendship is None or friendship.status != "accepted":
+        raise HTTPException(status_code=404, detail="Friendship not found")
+    await db.delete(friendship)
+    await enqueue_suggestion_refresh(db, current_user_id, user_id)
+    await db.commit()
+    _friendship_changed(current_user_id, user_id)
+    return {"message": "Friend removed"}
+
+@blocks_router.post("/")
+async def block_user(block_data: BlockCreate, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Block a user; also undoes any friendship or pending request between the two"""
+    blocked_id = block_data.blocked_id
+    if blocked_id == current_user_id:
+        raise HTTPException(status_code=400, detail="Cannot block yourself")
+    if await db.scalar(select(User.id).where(User.id == blocked_id)) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Idempotente pelo índice único (blocker_id, blocked_id)
+    await db.execute(
+        insert(Block)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+        .values(blocker_id=current_user_id, blocked_id=blocked_id, created_at=datetime.utcnow())
+    )
+    low, high = friendship_pair(current_user_id, blocked_id)
+    await db.execute(delete(Friendship).where(Friendship.user_low_id == low, Friendship.user_high_id == high))
+    await enqueue_suggestion_refresh(db, current_user_id, blocked_id)
+    await db.commit()
+
+    block_list.invalidate(current_user_id, blocked_id)
+    _friendship_changed(current_user_id, blocked_id)
+    return {"message": "User blocked"}
+
+@blocks_router.delete("/{user_id}")
+async def unblock_user(user_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    deleted = await db.execute(delete(Block).where(Block.blocker_id == current_user_id, Block.blocked_id == user_id))
+    if not deleted.rowcount:
+        raise HTTPException(status_code=404, detail="Block not found")
+    await enqueue_suggestion_refresh(db, current_user_id, user_id)
+    await db.commit()
+
+    block_list.invalidate(current_user_id, user_id)
+    _friendship_changed(current_user_id, user_id)
+    return {"message": "User unblocked"}
+
+@blocks_router.get("/")
+async def get_blocked_users(current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Users blocked by the current user"""
+    result = await db.execute(
+        select(User)
+        .join(Block, Block.blocked_id == User.id)
+        .where(Block.blocker_id == current_user_id)
+        .order_by(Block.created_at.desc())
+    )
+    return [serialize_author(user) for user in result.scalars().all()]
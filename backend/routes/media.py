@@ -0,0 +1,201 @@
+"""
+Entrega dos arquivos de UPLOAD_DIR em /<UPLOAD_DIR> (substitui o StaticFiles)
+
+- ETag forte e 304 para If-None-Match. Nos arquivos endereçados por conteúdo
+  (<UPLOAD_DIR>/blobs) a ETag vem do próprio SHA-256 da URL, então o 304 sai
+  sem tocar no disco, e a resposta é marcada como imutável por um ano.
+- Requisições Range (um intervalo, com If-Range) para busca em vídeos, com
+  envio zero-copy quando o servidor ASGI oferece a extensão zerocopysend e
+  leitura em blocos numa thread caso contrário.
+- Cache LRU em memória, limitado em bytes, para os arquivos pequenos mais
+  acessados (avatares e miniaturas).
+"""
+import asyncio
+import mimetypes
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from core.cache import ByteLRUCache
+from core.config import UPLOAD_DIR, UPLOAD_URL_PREFIX, MEDIA_HOT_CACHE_MB, MEDIA_HOT_CACHE_MAX_FILE_KB
+from utils.blob_store import BLOB_SUBDIR
+
+router = APIRouter(tags=["media"])
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+
+UPLOAD_ROOT = Path(UPLOAD_DIR).resolve()
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=86400"
+STREAM_CHUNK_SIZE = 256 * 1024
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+hot_cache = ByteLRUCache(MEDIA_HOT_CACHE_MB * 1024 * 1024)
+HOT_CACHE_MAX_FILE = MEDIA_HOT_CACHE_MAX_FILE_KB * 1024
+
+@dataclass
+class MediaInfo:
+    path: str
+    size: int
+    mtime_ns: int
+    etag: str
+    cache_control: str
+    content_type: str
+
+def _content_etag(path: str) -> Optional[str]:
+    """ETag of a content-addressed file, derived from its URL alone"""
+    parts = path.split("/")
+    if len(parts) < 4 or parts[0] != BLOB_SUBDIR:
+        return None
+    name = parts[-1]
+    stem = name.split(".")[0]
+    if len(stem) == 64:
+        return f'"{stem}"'  # blobs/ab/cd/<sha256>.ext
+    if len(parts) >= 6 and parts[-3] == "variants":
+        return f'"{parts[-2]}-{name}"'  # blobs/ab/cd/variants/<sha256>/thumb.webp
+    return None
+
+def _resolve(path: str) -> Optional[Path]:
+    # Hidden names cover the temporary .upload-*.part files
+    if not path or any(part.startswith(".") for part in path.split("/")) or path.startswith(f"{BLOB_SUBDIR}/tmp/"):
+        return None
+    target = (UPLOAD_ROOT / path).resolve()
+    if UPLOAD_ROOT not in target.parents:
+        return None
+    return target
+
+def _stat(target: Path, path: str) -> MediaInfo:
+    stat = os.stat(target)
+    if not os.path.isfile(target):
+        raise FileNotFoundError(path)
+    content_etag = _content_etag(path)
+    return MediaInfo(
+        path=str(target),
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        etag=content_etag or f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"',
+        cache_control=IMMUTABLE if content_etag else REVALIDATE,
+        content_type=mimetypes.guess_type(path)[0] or "application/octet-stream",
+    )
+
+def _etag_matches(header: str, etag: str) -> bool:
+    return any(tag.strip() in (etag, f"W/{etag}", "*") for tag in header.split(","))
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) of a single byte range, or None to ignore the header (syntax
+    not understood or several ranges: the whole file is sent).
+    Raises 416 for a range outside the file.
+    """
+    match = _RANGE.match(header.strip())
+    if not match or match.group(0) == "bytes=-":
+        return None
+    first, last = match.groups()
+    if first == "":
+        start, end = max(0, size - int(last)), size - 1
+        if int(last) == 0:
+            start = size
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+class FileRangeResponse(Response):
+    """Send bytes start..end of a file without loading it in memory"""
+
+    def __init__(self, info: MediaInfo, start: int, end: int, status_code: int, headers: dict):
+        super().__init__(status_code=status_code, headers=headers, media_type=info.content_type)
+        self.info = info
+        self.start = start
+        self.length = end - start + 1
+        self.raw_headers = [(k, v) for k, v in self.raw_headers if k != b"content-length"]
+        self.raw_headers.append((b"content-length", str(self.length).encode()))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or self.length <= 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        file = await asyncio.to_thread(open, self.info.path, "rb")
+        try:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.start,
+                    "count": self.length,
+                })
+                return
+
+            position, remaining = self.start, self.length
+            while remaining > 0:
+                chunk = await asyncio.to_thread(os.pread, file.fileno(), min(STREAM_CHUNK_SIZE, remaining), position)
+                if not chunk:
+                    break
+                position += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            await asyncio.to_thread(file.close)
+
+@router.api_route(UPLOAD_URL_PREFIX + "/{path:path}", methods=["GET", "HEAD"])
+async def serve_media(path: str, request: Request):
+    """Servir mídia enviada pelos usuários"""
+    if_none_match = request.headers.get("if-none-match")
+
+    # Conteúdo imutável: a URL já diz se a cópia do cliente está atualizada
+    content_etag = _content_etag(path)
+    if content_etag and if_none_match and _etag_matches(if_none_match, content_etag):
+        return Response(status_code=304, headers={"ETag": content_etag, "Cache-Control": IMMUTABLE})
+
+    cached = hot_cache.get(path)
+    if cached is not None and content_etag:
+        info, body = cached
+    else:
+        target = _resolve(path)
+        if target is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        try:
+            info = await asyncio.to_thread(_stat, target, path)
+        except (FileNotFoundError, NotADirectoryError):
+            raise HTTPException(status_code=404, detail="Not Found")
+        body = cached[1] if cached is not None and cached[0].etag == info.etag else None
+
+    headers = {"ETag": info.etag, "Cache-Control": info.cache_control, "Accept-Ranges": "bytes"}
+    if if_none_match and _etag_matches(if_none_match, info.etag):
+        return Response(status_code=304, headers=headers)
+
+    start, end, status_code = 0, info.size - 1, 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == info.etag):
+        byte_range = _parse_range(range_header, info.size)
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{info.size}"
+
+    if body is None and hot_cache.maxbytes and info.size <= HOT_CACHE_MAX_FILE:
+        body = await asyncio.to_thread(Path(info.path).read_bytes)
+        hot_cache.set(path, (info, body), len(body))
+
+    if body is not None:
+        content = b"" if request.method == "HEAD" else body[start:end + 1]
+        response = Response(content, status_code=status_code, headers=headers, media_type=info.content_type)
+        if request.method == "HEAD":
+            response.headers["content-length"] = str(end - start + 1)
+        return response
+
+    return FileRangeResponse(info, start, end, status_code, headers)
@@ -0,0 +1,99 @@
+"""
+Rotas de mensagens diretas
+"""
+from fastapi import APIRouter, HTTPException, Depends, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from core.database import get_async_db
+from core.security import get_current_user
+from core.user_cache import load_user
+from models import Message, User
+from schemas import MessageCreate
+from utils.feed import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from utils.messaging import get_conversation_id, get_history, list_conversations, read_receipts, send_direct_message
+
+router = APIRouter(prefix="/messages", tags=["messages"])
+
+@router.get("/conversations")
+async def get_conversations(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Chats of the current user, newest first; next page cursor in X-Next-Cursor"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    items, next_cursor = await list_conversations(db, current_user.id, cursor, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+@router.get("/conversation/{user_id}")
+async def get_conversation(
+    user_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Messages exchanged with user_id, oldest first. For older messages pass the
+    X-Next-Cursor header value as cursor.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    peer = await load_user(db, user_id)
+    if peer is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    messages, next_cursor = await get_history(db, current_user, peer, cursor, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return messages
+
+@router.post("/")
+async def send_message(
+    message_data: MessageCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Send a direct message"""
+    if message_data.recipient_id == current_user.id:
+        raise HTTPException(status_code=400, detail="Cannot send a message to yourself")
+    if not message_data.content and not message_data.media_url:
+        raise HTTPException(status_code=400, detail="Message is empty")
+    if await load_user(db, message_data.recipient_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return await send_direct_message(
+        db,
+        current_user,
+        message_data.recipient_id,
+        message_data.content,
+        message_data.message_type,
+        message_data.media_url,
+        message_data.media_metadata,
+    )
+
+@router.put("/{message_id}/read")
+async def mark_message_read(
+    message_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Mark a message, and every earlier one in its conversation, as read"""
+    message = (await db.execute(
+        select(Message.id, Message.sender_id, Message.recipient_id, Message.conversation_id, Message.created_at)
+        .where(Message.id == message_id)
+    )).first()
+    if message is None or message.recipient_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Message not found")
+
+    conversation_id = message.conversation_id or await get_conversation_id(db, message.sender_id, current_user.id)
+    if conversation_id is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    await read_receipts.mark_read(current_user.id, conversation_id, message.id, message.sender_id, message.created_at)
+    return {"message": "Message marked as read"}
@@ -0,0 +1,128 @@
+"""
+Rotas da caixa de notificações
+"""
+from fastapi import APIRouter, HTTPException, Depends, Response
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from typing import List, Optional
+
+from core.database import get_async_db
+from core.security import get_current_user_id
+from models import Notification, User
+from schemas import NotificationResponse
+from utils.feed import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor
+from utils.notification_inbox import at_or_before_cursor, bump_unread_counts, serialize_notification
+
+router = APIRouter(prefix="/notifications", tags=["notifications"])
+
+@router.get("/", response_model=List[NotificationResponse])
+async def get_notifications(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    unread_only: bool = False,
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Inbox, newest first. The next page cursor is sent in the X-Next-Cursor
+    header; the first page also sends X-Latest-Cursor, to be passed to
+    /mark-all-read so that only what the user has seen is marked.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = (
+        select(Notification)
+        .options(joinedload(Notification.sender))
+        .where(Notification.recipient_id == current_user_id)
+        .order_by(Notification.created_at.desc(), Notification.id.desc())
+        .limit(limit + 1)
+    )
+    if unread_only:
+        query = query.where(Notification.is_read == False)
+    if cursor:
+        created_at, notification_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Notification.created_at < created_at,
+            and_(Notification.created_at == created_at, Notification.id < notification_id)
+        ))
+
+    notifications = (await db.execute(query)).scalars().all()
+    if len(notifications) > limit:
+        notifications = notifications[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(notifications[-1].created_at, notifications[-1].id)
+    if not cursor and notifications:
+        response.headers["X-Latest-Cursor"] = encode_cursor(notifications[0].created_at, notifications[0].id)
+
+    return [serialize_notification(notification) for notification in notifications]
+
+@router.get("/unread-count")
+async def get_unread_count(current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Unread badge, read from the counter maintained on the user"""
+    count = await db.scalar(select(User.unread_notifications_count).where(User.id == current_user_id))
+    return {"count": max(count or 0, 0)}
+
+@router.put("/mark-all-read")
+async def mark_all_read(
+    cursor: Optional[str] = None,
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Mark as read, in a single UPDATE, every unread notification up to the cursor (all when omitted)"""
+    stmt = (
+        update(Notification)
+        .where(Notification.recipient_id == current_user_id, Notification.is_read == False)
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    )
+    if cursor:
+        stmt = stmt.where(at_or_before_cursor(cursor))
+
+    result = await db.execute(stmt)
+    if result.rowcount:
+        await bump_unread_counts(db, {current_user_id: -result.rowcount})
+    await db.commit()
+    return {"message": "Notifications marked as read", "updated": result.rowcount}
+
+@router.put("/{notification_id}/read")
+async def mark_notification_read(notification_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Mark one notification as read"""
+    result = await db.execute(
+        update(Notification)
+        .where(
+            Notification.id == notification_id,
+            Notification.recipient_id == current_user_id,
+            Notification.is_read == False
+        )
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        await bump_unread_counts(db, {current_user_id: -1})
+        await db.commit()
+        return {"message": "Notification marked as read"}
+
+    exists = await db.scalar(select(Notification.id).where(
+        Notification.id == notification_id,
+        Notification.recipient_id == current_user_id
+    ))
+    if exists is None:
+        raise HTTPException(status_code=404, detail="Notification not found")
+    return {"message": "Notification already read"}
+
+@router.delete("/{notification_id}")
+async def delete_notification(notification_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Delete a notification of the current user"""
+    notification = (await db.execute(
+        select(Notification.id, Notification.is_read)
+        .where(Notification.id == notification_id, Notification.recipient_id == current_user_id)
+        .with_for_update()
+    )).first()
+    if notification is None:
+        raise HTTPException(status_code=404, detail="Notification not found")
+
+    await db.execute(delete(Notification).where(Notification.id == notification_id))
+    if not notification.is_read:
+        await bump_unread_counts(db, {current_user_id: -1})
+    await db.commit()
+    return {"message": "Notification deleted"}
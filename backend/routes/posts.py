@@ -1,20 +1,30 @@
 """
 Rotas de posts, reações e comentários
 """
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Response, BackgroundTasks
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import List, Optional
+from datetime import datetime
 import json
 
-from core.database import get_db
-from core.security import get_current_user
-from models import User, Post, Reaction, Comment, Share
-from schemas import PostCreate, PostResponse, ReactionCreate, CommentCreate, CommentResponse, ShareCreate
+from core.database import get_async_db
+from core.security import get_current_user, get_current_user_id
+from models import User, Post, Reaction, Comment, CommentReaction, Share, MediaBlob
+from schemas import PostCreate, PostResponse, ReactionCreate, CommentReactionCreate, CommentCreate, CommentResponse, ShareCreate
+from utils.blocks import block_list, get_hidden_ids
+from utils.comments import DEFAULT_COMMENT_PAGE_SIZE, REPLIES_PER_THREAD, get_comment_page, get_replies_page, serialize_comment
+from utils.feed import DEFAULT_PAGE_SIZE, get_feed_page, serialize_post, visible_to
+from utils.timeline import fan_out_post, get_friends_feed_page
+from utils.counters import bump_comment_counter, bump_post_counter
+from utils.notification_service import notification_service
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
 @router.post("/", response_model=PostResponse)
-async def create_post(post: PostCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_post(post: PostCreate, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     # Validação e processamento do conteúdo
     content_to_save = post.content
     
@@ -40,201 +50,289 @@ async def create_post(post: PostCreate, current_user: User = Depends(get_current
         is_profile_update=post.is_profile_update,
         is_cover_update=post.is_cover_update
     )
+    if post.media_url:
+        # Variantes já geradas da mídia enviada por /upload/media (as que
+        # terminarem depois são copiadas pelo próprio job)
+        db_post.media_variants = await db.scalar(
+            select(MediaBlob.variants).where(MediaBlob.file_path == post.media_url).limit(1)
+        )
     db.add(db_post)
-    db.commit()
-    db.refresh(db_post)
+    await db.commit()
+
+    background_tasks.add_task(fan_out_post, db_post.id, db_post.author_id, db_post.privacy)
     
-    return PostResponse(
-        id=db_post.id,
-        author={
-            "id": db_post.author.id,
-            "first_name": db_post.author.first_name,
-            "last_name": db_post.author.last_name,
-            "avatar": getattr(db_post.author, 'avatar', None)
-        },
-        content=db_post.content,
-        post_type=db_post.post_type,
-        media_type=db_post.media_type,
-        media_url=db_post.media_url,
-        created_at=db_post.created_at,
-        reactions_count=db_post.reactions_count,
-        comments_count=db_post.comments_count,
-        shares_count=db_post.shares_count,
-        is_profile_update=db_post.is_profile_update,
-        is_cover_update=db_post.is_cover_update
-    )
+    set_committed_value(db_post, "author", current_user)
+    return serialize_post(db_post)
 
 @router.get("/", response_model=List[PostResponse])
-async def get_posts(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    posts = db.query(Post).order_by(Post.created_at.desc()).limit(50).all()
-    
-    return [
-        PostResponse(
-            id=post.id,
-            author={
-                "id": post.author.id,
-                "first_name": post.author.first_name,
-                "last_name": post.author.last_name,
-                "avatar": getattr(post.author, 'avatar', None)
-            },
-            content=post.content,
-            post_type=post.post_type,
-            media_type=post.media_type,
-            media_url=post.media_url,
-            created_at=post.created_at,
-            reactions_count=post.reactions_count,
-            comments_count=post.comments_count,
-            shares_count=post.shares_count,
-            is_profile_update=post.is_profile_update,
-            is_cover_update=post.is_cover_update
-        )
-        for post in posts
-    ]
+async def get_posts(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    scope: str = "all",
+    current_user_id: int = Depends(get_current_user_id),
+    hidden_ids: frozenset = Depends(get_hidden_ids),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Home feed, newest first. The next page cursor is sent in the X-Next-Cursor header.
+
+    scope=all lists every post visible to the user; scope=friends only the posts
+    of the user, their friends and the people they follow.
+    """
+    if scope == "friends":
+        posts, next_cursor = await get_friends_feed_page(db, current_user_id, cursor=cursor, limit=limit, hidden_ids=hidden_ids)
+    else:
+        posts, next_cursor = await get_feed_page(db, current_user_id, cursor=cursor, limit=limit, hidden_ids=hidden_ids)
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    return [serialize_post(post) for post in posts]
+
+async def _live_post(db: AsyncSession, post_id: int) -> Optional[Post]:
+    """The post unless it does not exist or was deleted (tombstone waiting for utils/post_purge)"""
+    post = await db.get(Post, post_id)
+    if post is None or post.deleted_at is not None:
+        return None
+    return post
+
+async def _visible_post(db: AsyncSession, post_id: int, viewer_id: int, hidden_ids: frozenset = frozenset()) -> Optional[Post]:
+    """The post if the viewer may see it: live, allowed by its privacy and not by a blocked author"""
+    post = await db.scalar(select(Post).where(Post.id == post_id, visible_to(viewer_id)))
+    if post is None or post.author_id in hidden_ids:
+        return None
+    return post
 
 @router.get("/{post_id}", response_model=PostResponse)
-async def get_post(post_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_post(post_id: int, current_user_id: int = Depends(get_current_user_id), hidden_ids: frozenset = Depends(get_hidden_ids), db: AsyncSession = Depends(get_async_db)):
     """Get individual post by ID"""
-    post = db.query(Post).filter(Post.id == post_id).first()
+    result = await db.execute(select(Post).options(joinedload(Post.author)).where(Post.id == post_id, visible_to(current_user_id)))
+    post = result.scalars().first()
 
-    if not post:
+    if not post or post.author_id in hidden_ids:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    return PostResponse(
-        id=post.id,
-        author={
-            "id": post.author.id,
-            "first_name": post.author.first_name,
-            "last_name": post.author.last_name,
-            "avatar": getattr(post.author, 'avatar', None)
-        },
-        content=post.content,
-        post_type=post.post_type,
-        media_type=post.media_type,
-        media_url=post.media_url,
-        created_at=post.created_at,
-        reactions_count=db.query(Reaction).filter(Reaction.post_id == post.id).count(),
-        comments_count=db.query(Comment).filter(Comment.post_id == post.id).count(),
-        shares_count=db.query(Share).filter(Share.post_id == post.id).count(),
-        is_profile_update=post.is_profile_update,
-        is_cover_update=post.is_cover_update
-    )
+    return serialize_post(post)
 
 @router.delete("/{post_id}")
-async def delete_post(post_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
+async def delete_post(post_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """
+    Delete a post with a single UPDATE: the tombstone hides it from every read
+    at once and the purge job removes its comments, reactions, shares,
+    notifications and media later, in small chunks
+    """
+    deleted = await db.execute(
+        update(Post)
+        .where(Post.id == post_id, Post.author_id == current_user_id, Post.deleted_at.is_(None))
+        .values(deleted_at=datetime.utcnow())
+    )
+    await db.commit()
+    if deleted.rowcount:
+        return {"message": "Post deleted successfully"}
+
+    author_id = await db.scalar(select(Post.author_id).where(Post.id == post_id, Post.deleted_at.is_(None)))
+    if author_id is None:
         raise HTTPException(status_code=404, detail="Post not found")
-    
-    if post.author_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to delete this post")
-    
-    # Delete related data
-    db.query(Reaction).filter(Reaction.post_id == post_id).delete()
-    db.query(Comment).filter(Comment.post_id == post_id).delete()
-    db.query(Share).filter(Share.post_id == post_id).delete()
-    
-    db.delete(post)
-    db.commit()
-    
-    return {"message": "Post deleted successfully"}
+    raise HTTPException(status_code=403, detail="Not authorized to delete this post")
 
 # Reactions
 @router.post("/{post_id}/reactions")
-async def create_post_reaction(post_id: int, reaction_data: ReactionCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_post_reaction(post_id: int, reaction_data: ReactionCreate, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
     """Add or update reaction to a post"""
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await _live_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    # Check if user already reacted
-    existing_reaction = db.query(Reaction).filter(
-        Reaction.post_id == post_id,
-        Reaction.user_id == current_user.id
-    ).first()
-
-    if existing_reaction:
-        # Update existing reaction
-        existing_reaction.reaction_type = reaction_data.reaction_type
-        db.commit()
-        return {"message": "Reaction updated"}
-    else:
-        # Create new reaction
-        reaction = Reaction(
-            post_id=post_id,
-            user_id=current_user.id,
-            reaction_type=reaction_data.reaction_type
-        )
-        db.add(reaction)
-        db.commit()
+    # Insert-or-update backed by the unique (post_id, user_id) index: the
+    # insert is ignored when the user already reacted to this post
+    inserted = await db.execute(
+        insert(Reaction)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+        .values(post_id=post_id, user_id=current_user_id, reaction_type=reaction_data.reaction_type)
+    )
+
+    if inserted.rowcount:
+        await bump_post_counter(db, post_id, "reactions_count", 1)
+        await db.commit()
+        notification_service.send_like_notification(post.author_id, current_user_id, post_id)
         return {"message": "Reaction added"}
 
+    # Update existing reaction
+    await db.execute(
+        update(Reaction)
+        .where(Reaction.post_id == post_id, Reaction.user_id == current_user_id)
+        .values(reaction_type=reaction_data.reaction_type, updated_at=datetime.utcnow())
+    )
+    await db.commit()
+    return {"message": "Reaction updated"}
+
 @router.delete("/{post_id}/reactions")
-async def remove_post_reaction(post_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def remove_post_reaction(post_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
     """Remove reaction from a post"""
-    reaction = db.query(Reaction).filter(
+    deleted = await db.execute(delete(Reaction).where(
         Reaction.post_id == post_id,
-        Reaction.user_id == current_user.id
-    ).first()
+        Reaction.user_id == current_user_id
+    ))
 
-    if reaction:
-        db.delete(reaction)
-        db.commit()
+    if deleted.rowcount:
+        await bump_post_counter(db, post_id, "reactions_count", -1)
+        await db.commit()
         return {"message": "Reaction removed"}
     else:
         raise HTTPException(status_code=404, detail="Reaction not found")
 
 # Comments
 @router.get("/{post_id}/comments", response_model=List[CommentResponse])
-async def get_post_comments(post_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Get comments for a specific post"""
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
+async def get_post_comments(
+    post_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_COMMENT_PAGE_SIZE,
+    replies: int = REPLIES_PER_THREAD,
+    current_user_id: int = Depends(get_current_user_id),
+    hidden_ids: frozenset = Depends(get_hidden_ids),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Top-level comments of a post, oldest first, each with its first replies.
+    The next page cursor is sent in the X-Next-Cursor header.
+    """
+    if hidden_ids and await _visible_post(db, post_id, current_user_id, hidden_ids) is None:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    comments = db.query(Comment).filter(Comment.post_id == post_id).order_by(Comment.created_at.asc()).all()
-
-    return [
-        CommentResponse(
-            id=comment.id,
-            content=comment.content,
-            author={
-                "id": comment.author.id,
-                "first_name": comment.author.first_name,
-                "last_name": comment.author.last_name,
-                "avatar": getattr(comment.author, 'avatar', None)
-            },
-            created_at=comment.created_at,
-            reactions_count=0
-        )
-        for comment in comments
-    ]
+    comments, next_cursor = await get_comment_page(db, post_id, current_user_id, cursor, limit, replies, hidden_ids)
+    # Página vazia: só então confere se o post existe e é visível
+    if not comments and not cursor and not hidden_ids and await _visible_post(db, post_id, current_user_id) is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return comments
+
+@router.get("/{post_id}/comments/{comment_id}/replies", response_model=List[CommentResponse])
+async def get_comment_replies(
+    post_id: int,
+    comment_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_COMMENT_PAGE_SIZE,
+    current_user_id: int = Depends(get_current_user_id),
+    hidden_ids: frozenset = Depends(get_hidden_ids),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Replies of a comment, oldest first (X-Next-Cursor header for the next page)"""
+    if await _visible_post(db, post_id, current_user_id, hidden_ids) is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    comment_post_id = await db.scalar(select(Comment.post_id).where(Comment.id == comment_id))
+    if comment_post_id != post_id:
+        raise HTTPException(status_code=404, detail="Comment not found")
+
+    replies, next_cursor = await get_replies_page(db, comment_id, current_user_id, cursor, limit, hidden_ids)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return replies
 
 @router.post("/{post_id}/comments", response_model=CommentResponse)
-async def create_comment(post_id: int, comment_data: CommentCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Create a comment on a post"""
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
+async def create_comment(post_id: int, comment_data: CommentCreate, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """Create a comment on a post, or a reply when parent_id is given"""
+    post = await _live_post(db, post_id)
+    if not post or await block_list.is_blocked(db, current_user.id, post.author_id):
         raise HTTPException(status_code=404, detail="Post not found")
 
+    parent_id = comment_data.parent_id
+    if parent_id is not None:
+        parent = (await db.execute(
+            select(Comment.id, Comment.post_id, Comment.parent_id).where(Comment.id == parent_id)
+        )).first()
+        if parent is None or parent.post_id != post_id:
+            raise HTTPException(status_code=404, detail="Comment not found")
+        # Threads têm um nível: responder a uma resposta responde ao comentário dela
+        parent_id = parent.parent_id or parent.id
+
     comment = Comment(
         content=comment_data.content,
         post_id=post_id,
-        author_id=current_user.id
+        author_id=current_user.id,
+        parent_id=parent_id,
+        reactions_count=0,
+        replies_count=0
     )
 
     db.add(comment)
-    db.commit()
-    db.refresh(comment)
-
-    return CommentResponse(
-        id=comment.id,
-        content=comment.content,
-        author={
-            "id": current_user.id,
-            "first_name": current_user.first_name,
-            "last_name": current_user.last_name,
-            "avatar": getattr(current_user, 'avatar', None)
-        },
-        created_at=comment.created_at,
-        reactions_count=0
+    await bump_post_counter(db, post_id, "comments_count", 1)
+    if parent_id is not None:
+        await bump_comment_counter(db, parent_id, "replies_count", 1)
+    await db.commit()
+    notification_service.send_comment_notification(
+        post.author_id, current_user.id, post_id, comment.id,
+        f"{current_user.first_name} {current_user.last_name}"
     )
+
+    set_committed_value(comment, "author", current_user)
+    return serialize_comment(comment)
+
+async def _comment_on_live_post(db: AsyncSession, post_id: int, comment_id: int) -> bool:
+    """Whether comment_id belongs to post_id and the post was not deleted"""
+    return await db.scalar(
+        select(Comment.id).join(Post, Post.id == Comment.post_id)
+        .where(Comment.id == comment_id, Comment.post_id == post_id, Post.deleted_at.is_(None))
+    ) is not None
+
+@router.post("/{post_id}/comments/{comment_id}/reactions")
+async def create_comment_reaction(post_id: int, comment_id: int, reaction_data: CommentReactionCreate, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Add or update reaction to a comment"""
+    if not await _comment_on_live_post(db, post_id, comment_id):
+        raise HTTPException(status_code=404, detail="Comment not found")
+
+    inserted = await db.execute(
+        insert(CommentReaction)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+        .values(comment_id=comment_id, user_id=current_user_id, reaction_type=reaction_data.reaction_type)
+    )
+    if inserted.rowcount:
+        await bump_comment_counter(db, comment_id, "reactions_count", 1)
+        await db.commit()
+        return {"message": "Reaction added"}
+
+    await db.execute(
+        update(CommentReaction)
+        .where(CommentReaction.comment_id == comment_id, CommentReaction.user_id == current_user_id)
+        .values(reaction_type=reaction_data.reaction_type, updated_at=datetime.utcnow())
+    )
+    await db.commit()
+    return {"message": "Reaction updated"}
+
+@router.delete("/{post_id}/comments/{comment_id}/reactions")
+async def remove_comment_reaction(post_id: int, comment_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Remove reaction from a comment"""
+    if not await _comment_on_live_post(db, post_id, comment_id):
+        raise HTTPException(status_code=404, detail="Comment not found")
+
+    deleted = await db.execute(delete(CommentReaction).where(
+        CommentReaction.comment_id == comment_id,
+        CommentReaction.user_id == current_user_id
+    ))
+    if not deleted.rowcount:
+        raise HTTPException(status_code=404, detail="Reaction not found")
+    await bump_comment_counter(db, comment_id, "reactions_count", -1)
+    await db.commit()
+    return {"message": "Reaction removed"}
+
+# Shares
+@router.post("/{post_id}/shares")
+async def share_post(post_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Share a post"""
+    post = await _live_post(db, post_id)
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    share = Share(post_id=post_id, user_id=current_user_id)
+    db.add(share)
+    await bump_post_counter(db, post_id, "shares_count", 1)
+    await db.commit()
+    notification_service.send_share_notification(post.author_id, current_user_id, post_id)
+
+    return {"message": "Post shared"}
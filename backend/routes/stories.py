@@ -0,0 +1,142 @@
+"""
+Rotas de stories
+"""
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import STORY_MAX_DURATION_HOURS
+from core.database import get_async_db
+from core.security import get_current_user, get_current_user_id
+from models import Story, StoryOverlay, StoryTag, StoryView, User
+from schemas import StoryCreate
+from utils.blocks import block_list
+from utils.feed import serialize_author
+from utils.friend_graph import friend_graph
+from utils.stories import (
+    cached_tray, get_story_meta, invalidate_tray, load_stories, load_tray, serialize_story, stories_etag,
+    story_meta_cache
+)
+from utils.story_views import list_viewers, story_views
+
+router = APIRouter(prefix="/stories", tags=["stories"])
+
+# O cliente sempre revalida; com a ETag igual a resposta é um 304 sem corpo
+REVALIDATE = "private, no-cache"
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    return header is not None and any(tag.strip() in (etag, f"W/{etag}", "*") for tag in header.split(","))
+
+def _stories_response(request: Request, etag: str, stories: List[dict]) -> Response:
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(jsonable_encoder(stories), headers=headers)
+
+@router.get("/")
+async def get_stories_tray(request: Request, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Active stories of the current user and their friends, grouped by author"""
+    cached = cached_tray(current_user_id)
+    if cached is not None and _etag_matches(request, cached[0]):
+        return _stories_response(request, *cached)
+
+    etag, stories = await load_tray(db, current_user_id)
+    return _stories_response(request, etag, stories)
+
+@router.get("/user/{user_id}")
+async def get_user_stories(user_id: int, request: Request, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Active stories of one user"""
+    if user_id != current_user_id:
+        visibility = await db.scalar(select(User.story_visibility).where(User.id == user_id, User.is_active == True))
+        if visibility is None or await block_list.is_blocked(db, current_user_id, user_id):
+            raise HTTPException(status_code=404, detail="User not found")
+        if visibility != "public":
+            if visibility == "private" or not await friend_graph.are_friends(db, current_user_id, user_id):
+                return _stories_response(request, stories_etag([]), [])
+
+    etag, stories, _ = await load_stories(db, [user_id])
+    return _stories_response(request, etag, stories)
+
+@router.post("/")
+async def create_story(story_data: StoryCreate, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """Publish a story"""
+    if not story_data.content and not story_data.media_url:
+        raise HTTPException(status_code=400, detail="Story is empty")
+
+    duration_hours = max(1, min(story_data.duration_hours, STORY_MAX_DURATION_HOURS))
+    now = datetime.utcnow()
+    story = Story(
+        author=current_user,
+        content=story_data.content,
+        media_type=story_data.media_type,
+        media_url=story_data.media_url,
+        background_color=story_data.background_color,
+        duration_hours=duration_hours,
+        max_duration_seconds=story_data.max_duration_seconds,
+        created_at=now,
+        expires_at=now + timedelta(hours=duration_hours),
+        views_count=0,
+    )
+    db.add(story)
+    await db.commit()
+    invalidate_tray(current_user.id)
+    return serialize_story(story)
+
+@router.delete("/{story_id}")
+async def delete_story(story_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Delete a story of the current user"""
+    author_id = await db.scalar(select(Story.author_id).where(Story.id == story_id))
+    if author_id is None:
+        raise HTTPException(status_code=404, detail="Story not found")
+    if author_id != current_user_id:
+        raise HTTPException(status_code=403, detail="Not allowed to delete this story")
+
+    for model in (StoryView, StoryTag, StoryOverlay):
+        await db.execute(delete(model).where(model.story_id == story_id))
+    await db.execute(delete(Story).where(Story.id == story_id))
+    await db.commit()
+    story_views.discard(story_id)
+    story_meta_cache.invalidate(story_id)
+    invalidate_tray(current_user_id)
+    return {"message": "Story deleted"}
+
+@router.post("/{story_id}/view")
+async def view_story(story_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Register a view; written in the next batch of the view recorder"""
+    meta = await get_story_meta(db, story_id)
+    if meta is None or await block_list.is_blocked(db, current_user_id, meta[0]):
+        raise HTTPException(status_code=404, detail="Story not found")
+
+    author_id, expires_at = meta
+    if author_id != current_user_id and (expires_at is None or expires_at > datetime.utcnow()):
+        story_views.record(story_id, current_user_id)
+    return {"message": "View recorded"}
+
+@router.get("/{story_id}/viewers")
+async def get_story_viewers(story_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Who viewed a story of the current user, newest first"""
+    story = (await db.execute(select(Story.author_id, Story.views_count).where(Story.id == story_id))).first()
+    if story is None:
+        raise HTTPException(status_code=404, detail="Story not found")
+    if story.author_id != current_user_id:
+        raise HTTPException(status_code=403, detail="Only the author can see the viewers")
+
+    viewers = await list_viewers(db, story_views, story_id)
+    users = {}
+    if viewers:
+        result = await db.execute(select(User).where(User.id.in_([viewer_id for viewer_id, _ in viewers])))
+        users = {user.id: user for user in result.scalars().all()}
+
+    return {
+        "views_count": (story.views_count or 0) + len(story_views.pending_viewers(story_id)),
+        "viewers": [
+            {"user": serialize_author(users[viewer_id]), "viewed_at": viewed_at}
+            for viewer_id, viewed_at in viewers if viewer_id in users
+        ]
+    }
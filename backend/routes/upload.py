@@ -0,0 +1,40 @@
+"""
+Rotas de upload de mídia
+"""
+from fastapi import APIRouter, Depends, UploadFile, File, BackgroundTasks
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database import get_async_db
+from core.security import get_current_user_id
+from schemas import MediaUploadResponse
+from utils.blob_store import store_blob, media_file_record
+from utils.files import validate_media_file
+from utils.media import generate_media_variants
+
+router = APIRouter(prefix="/upload", tags=["upload"])
+
+@router.post("/media", response_model=MediaUploadResponse)
+async def upload_media(background_tasks: BackgroundTasks, file: UploadFile = File(...), current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """Upload de mídia para posts, stories e mensagens"""
+    file_type = validate_media_file(file)
+
+    blob = await store_blob(db, file)
+    media = media_file_record(blob, file, current_user_id, file_type)
+    db.add(media)
+    await db.commit()
+
+    if file_type == "image" and not blob.variants:
+        background_tasks.add_task(generate_media_variants, blob.content_hash)
+
+    return MediaUploadResponse(
+        id=media.id,
+        filename=media.filename,
+        # O frontend usa file_path como URL da mídia
+        file_path=media.file_path,
+        file_type=media.file_type,
+        file_size=media.file_size,
+        mime_type=media.mime_type,
+        upload_date=media.upload_date,
+        url=media.file_path,
+        variants=blob.variants
+    )
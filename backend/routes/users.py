@@ -1,31 +1,69 @@
 """
 Rotas de usuários e perfis
 """
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
-from sqlalchemy.orm import Session
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, BackgroundTasks
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from typing import List
-import os
-import uuid
-from pathlib import Path
 
-from core.database import get_db
-from core.security import get_current_user
-from models import User, Post, Friendship
-from schemas import UserResponse, PostResponse
+from core.config import MAX_AVATAR_SIZE_MB, MAX_COVER_SIZE_MB
+from core.database import get_async_db
+from core.presence import presence
+from core.security import get_current_user, get_current_user_id
+from core.websockets import manager
+from models import User, Post
+from schemas import UserResponse, PostResponse, PrivacySettings
+from utils.blocks import exclude_hidden, get_hidden_ids
+from utils.feed import serialize_post, visible_to
+from utils.friend_graph import friend_graph
+from utils.search import search_index
+from utils.stories import invalidate_author_trays
+from utils.blob_store import media_file_record, release_media_url, store_blob
+from utils.files import validate_image_file
+from utils.media import generate_media_variants
+from utils.timeline import fan_out_post
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.get("/")
-async def search_users(search: str = "", current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def search_users(search: str = "", current_user_id: int = Depends(get_current_user_id), hidden_ids: frozenset = Depends(get_hidden_ids), db: AsyncSession = Depends(get_async_db)):
     if not search.strip():
         return []
-    
-    users = db.query(User).filter(
-        User.is_active == True,
-        User.id != current_user.id,
-        (User.first_name.ilike(f"%{search}%") | User.last_name.ilike(f"%{search}%") | User.email.ilike(f"%{search}%"))
-    ).limit(20).all()
-    
+
+    if "@" in search:
+        # Email: prefix range over the unique index on users.email
+        query = select(User).where(
+            User.is_active == True,
+            User.id != current_user_id,
+            User.email.startswith(search.strip().lower(), autoescape=True)
+        ).limit(20)
+        users = (await db.execute(exclude_hidden(query, User.id, hidden_ids))).scalars().all()
+    elif search_index.ready:
+        friend_ids = set(await friend_graph.friend_ids(db, current_user_id))
+        second_degree = await friend_graph.friends_of_friends(db, current_user_id, limit=5000)
+        # CPU e o lock do índice: fora do event loop
+        ids = await asyncio.to_thread(
+            search_index.search, search, limit=20, exclude_id=current_user_id, exclude_ids=hidden_ids,
+            friend_ids=friend_ids, second_degree=second_degree
+        )
+        found = {}
+        if ids:
+            result = await db.execute(select(User).where(User.id.in_(ids), User.is_active == True))
+            found = {user.id: user for user in result.scalars().all()}
+        users = [found[user_id] for user_id in ids if user_id in found]
+    else:
+        # Índice ainda sendo construído
+        query = select(User).where(
+            User.is_active == True,
+            User.id != current_user_id,
+            (User.first_name.ilike(f"%{search}%") | User.last_name.ilike(f"%{search}%") | User.email.ilike(f"%{search}%"))
+        ).limit(20)
+        result = await db.execute(exclude_hidden(query, User.id, hidden_ids))
+        users = result.scalars().all()
+
     return [
         {
             "id": user.id,
@@ -37,9 +75,34 @@ async def search_users(search: str = "", current_user: User = Depends(get_curren
         for user in users
     ]
 
+@router.get("/me/friends/online")
+async def get_online_friends(current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    """
+    Friends connected right now: the cached friend ids, one backplane
+    round-trip for their presence and one query for the online ones.
+    """
+    friend_ids = await friend_graph.friend_ids(db, current_user_id)
+    online = await manager.online_users(friend_ids)
+    if not online:
+        return []
+
+    result = await db.execute(select(User).where(User.id.in_(online), User.is_active == True))
+    return [
+        {
+            "id": user.id,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "avatar": getattr(user, 'avatar', None),
+            "last_seen": presence.get_last_seen(user.id, user.last_seen),
+            "is_online": True
+        }
+        for user in result.scalars().all()
+    ]
+
 @router.get("/{user_id}")
-async def get_user_by_id(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+async def get_user_by_id(user_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(User.id == user_id, User.is_active == True))
+    user = result.scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -55,29 +118,21 @@ async def get_user_by_id(user_id: int, current_user: User = Depends(get_current_
     }
 
 @router.get("/{user_id}/profile")
-async def get_user_profile(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_user_profile(user_id: int, current_user_id: int = Depends(get_current_user_id), hidden_ids: frozenset = Depends(get_hidden_ids), db: AsyncSession = Depends(get_async_db)):
     """Obter perfil completo do usuário com configurações de privacidade"""
-    user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
-    if not user:
+    result = await db.execute(select(User).where(User.id == user_id, User.is_active == True))
+    user = result.scalars().first()
+    if not user or user_id in hidden_ids:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Verificar se são amigos para mostrar informações privadas
-    friendship = db.query(Friendship).filter(
-        ((Friendship.requester_id == current_user.id) & (Friendship.addressee_id == user_id)) |
-        ((Friendship.requester_id == user_id) & (Friendship.addressee_id == current_user.id)),
-        Friendship.status == "accepted"
-    ).first()
-
-    is_friend = friendship is not None
-    is_own_profile = current_user.id == user_id
+    is_friend = await friend_graph.are_friends(db, current_user_id, user_id)
+    is_own_profile = current_user_id == user_id
 
     # Calcular estatísticas
-    friends_count = db.query(Friendship).filter(
-        ((Friendship.requester_id == user_id) | (Friendship.addressee_id == user_id)),
-        Friendship.status == "accepted"
-    ).count()
+    friends_count = await friend_graph.friends_count(db, user_id)
 
-    posts_count = db.query(Post).filter(Post.author_id == user_id).count()
+    posts_count = await db.scalar(select(func.count()).select_from(Post).where(Post.author_id == user_id, Post.deleted_at.is_(None)))
 
     # Determinar visibilidade das informações com base nas configurações de privacidade
     def can_see_field(field_visibility):
@@ -125,95 +180,42 @@ async def get_user_profile(user_id: int, current_user: User = Depends(get_curren
     return response_data
 
 @router.get("/{user_id}/posts", response_model=List[PostResponse])
-async def get_user_posts(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    posts = db.query(Post).filter(
+async def get_user_posts(user_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(Post).options(joinedload(Post.author)).where(
         Post.author_id == user_id,
-        Post.post_type == "post"
-    ).order_by(Post.created_at.desc()).limit(50).all()
+        Post.post_type == "post",
+        visible_to(current_user_id)
+    ).order_by(Post.created_at.desc()).limit(50))
+    posts = result.scalars().all()
     
-    return [
-        PostResponse(
-            id=post.id,
-            author={
-                "id": post.author.id,
-                "first_name": post.author.first_name,
-                "last_name": post.author.last_name,
-                "avatar": getattr(post.author, 'avatar', None)
-            },
-            content=post.content,
-            post_type=post.post_type,
-            media_type=post.media_type,
-            media_url=post.media_url,
-            created_at=post.created_at,
-            reactions_count=0,
-            comments_count=0,
-            shares_count=0,
-            is_profile_update=post.is_profile_update,
-            is_cover_update=post.is_cover_update
-        )
-        for post in posts
-    ]
+    return [serialize_post(post) for post in posts]
 
 @router.get("/{user_id}/testimonials", response_model=List[PostResponse])
-async def get_user_testimonials(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    testimonials = db.query(Post).filter(
+async def get_user_testimonials(user_id: int, current_user_id: int = Depends(get_current_user_id), db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(Post).options(joinedload(Post.author)).where(
         Post.author_id == user_id,
-        Post.post_type == "testimonial"
-    ).order_by(Post.created_at.desc()).limit(50).all()
+        Post.post_type == "testimonial",
+        visible_to(current_user_id)
+    ).order_by(Post.created_at.desc()).limit(50))
+    testimonials = result.scalars().all()
     
-    return [
-        PostResponse(
-            id=post.id,
-            author={
-                "id": post.author.id,
-                "first_name": post.author.first_name,
-                "last_name": post.author.last_name,
-                "avatar": getattr(post.author, 'avatar', None)
-            },
-            content=post.content,
-            post_type=post.post_type,
-            media_type=post.media_type,
-            media_url=post.media_url,
-            created_at=post.created_at,
-            reactions_count=0,
-            comments_count=0,
-            shares_count=0,
-            is_profile_update=post.is_profile_update,
-            is_cover_update=post.is_cover_update
-        )
-        for post in testimonials
-    ]
+    return [serialize_post(post) for post in testimonials]
 
 @router.post("/me/avatar")
-async def upload_user_avatar(file: UploadFile = File(...), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def upload_user_avatar(background_tasks: BackgroundTasks, file: UploadFile = File(...), current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Upload e definir avatar do usuário"""
     
-    # Validar se é imagem
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
-
-    # Validar tamanho (5MB max para avatar)
-    if file.size and file.size > 5 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Image too large (max 5MB)")
-
     try:
-        # Criar diretório se não existe
-        upload_dir = Path("uploads") / "image"
-        upload_dir.mkdir(parents=True, exist_ok=True)
-
-        # Gerar nome único
-        file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-        unique_filename = f"avatar_{current_user.id}_{uuid.uuid4()}{file_extension}"
-        file_path = upload_dir / unique_filename
-
-        # Salvar arquivo
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Grava o conteúdo uma única vez (reenvios da mesma foto só geram metadados)
+        validate_image_file(file, MAX_AVATAR_SIZE_MB)
+        blob = await store_blob(db, file, MAX_AVATAR_SIZE_MB)
+        avatar_url = blob.file_path
+        db.add(media_file_record(blob, file, current_user.id, "image"))
 
         # Atualizar avatar do usuário
-        avatar_url = f"/uploads/image/{unique_filename}"
+        previous_avatar = current_user.avatar
         current_user.avatar = avatar_url
+        current_user.avatar_variants = blob.variants
 
         # Criar post automático sobre a atualização da foto de perfil
         from models.post import Post
@@ -223,49 +225,42 @@ async def upload_user_avatar(file: UploadFile = File(...), current_user: User =
             post_type="post",
             media_type="photo",
             media_url=avatar_url,
+            media_variants=blob.variants,
             privacy="public",
             is_profile_update=True
         )
         db.add(profile_post)
-        db.commit()
+        # A foto anterior perde a referência do avatar (continua nos posts que a mostram)
+        await db.flush()
+        await release_media_url(db, previous_avatar, current_user.id)
+        await db.commit()
+        background_tasks.add_task(fan_out_post, profile_post.id, current_user.id, profile_post.privacy)
+        if not blob.variants:
+            background_tasks.add_task(generate_media_variants, blob.content_hash, current_user.id)
 
         return {
             "message": "Avatar updated successfully",
             "avatar_url": avatar_url,
             "post_created": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to upload avatar: {str(e)}")
 
 @router.post("/me/cover")
-async def upload_user_cover_photo(file: UploadFile = File(...), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def upload_user_cover_photo(background_tasks: BackgroundTasks, file: UploadFile = File(...), current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Upload e definir foto de capa do usuário"""
     
-    # Validar se é imagem
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
-
-    # Validar tamanho (10MB max para capa)
-    if file.size and file.size > 10 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Image too large (max 10MB)")
-
     try:
-        # Criar diretório se não existe
-        upload_dir = Path("uploads") / "image"
-        upload_dir.mkdir(parents=True, exist_ok=True)
-
-        # Gerar nome único
-        file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-        unique_filename = f"cover_{current_user.id}_{uuid.uuid4()}{file_extension}"
-        file_path = upload_dir / unique_filename
-
-        # Salvar arquivo
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Grava o conteúdo uma única vez (reenvios da mesma foto só geram metadados)
+        validate_image_file(file, MAX_COVER_SIZE_MB)
+        blob = await store_blob(db, file, MAX_COVER_SIZE_MB)
+        cover_url = blob.file_path
+        db.add(media_file_record(blob, file, current_user.id, "image"))
 
         # Atualizar foto de capa do usuário
-        cover_url = f"/uploads/image/{unique_filename}"
+        previous_cover = current_user.cover_photo
         current_user.cover_photo = cover_url
 
         # Criar post automático sobre a atualização da foto de capa
@@ -276,16 +271,46 @@ async def upload_user_cover_photo(file: UploadFile = File(...), current_user: Us
             post_type="post",
             media_type="photo",
             media_url=cover_url,
+            media_variants=blob.variants,
             privacy="public",
             is_cover_update=True
         )
         db.add(cover_post)
-        db.commit()
+        await db.flush()
+        await release_media_url(db, previous_cover, current_user.id)
+        await db.commit()
+        background_tasks.add_task(fan_out_post, cover_post.id, current_user.id, cover_post.privacy)
+        if not blob.variants:
+            background_tasks.add_task(generate_media_variants, blob.content_hash)
 
         return {
             "message": "Cover photo updated successfully",
             "cover_photo_url": cover_url,
             "post_created": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to upload cover photo: {str(e)}")
+
+VISIBILITY_OPTIONS = {"public", "friends", "private"}
+FRIEND_REQUEST_OPTIONS = {"everyone", "friends_of_friends", "none"}
+
+@router.put("/me/privacy")
+async def update_privacy_settings(settings: PrivacySettings, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """Atualizar as configurações de privacidade (só os campos enviados)"""
+    changes = settings.model_dump(exclude_none=True)
+    for field, value in changes.items():
+        allowed = FRIEND_REQUEST_OPTIONS if field == "friend_request_privacy" else VISIBILITY_OPTIONS
+        if value not in allowed:
+            raise HTTPException(status_code=400, detail=f"Invalid value for {field}")
+
+    story_visibility_changed = changes.get("story_visibility", current_user.story_visibility) != current_user.story_visibility
+    for field, value in changes.items():
+        setattr(current_user, field, value)
+    await db.commit()
+
+    # A bandeja dos amigos pode mostrar (ou esconder) os stories dele
+    if story_visibility_changed:
+        await invalidate_author_trays(db, current_user.id)
+    return {"message": "Privacy settings updated", **changes}
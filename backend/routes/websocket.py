@@ -0,0 +1,87 @@
+"""
+WebSocket de tempo real: mensagens, digitação e confirmações de leitura
+"""
+import json
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from sqlalchemy import select
+
+from core.database import AsyncSessionLocal
+from core.presence import presence, typing_throttle
+from core.security import _decode_token
+from core.user_cache import load_user
+from core.websockets import manager
+from models import Message
+from utils.messaging import get_conversation_id, read_receipts, send_direct_message, user_pair
+
+router = APIRouter(tags=["websocket"])
+
+def _token_user_id(token: str):
+    try:
+        return _decode_token(token).get("user_id")
+    except HTTPException:
+        return None
+
+async def _handle_frame(user_id: int, data: dict):
+    frame_type = data.get("type")
+
+    if frame_type == "ping":
+        await manager.send_personal_message(json.dumps({"type": "pong"}), user_id)
+
+    elif frame_type == "typing":
+        recipient_id = data.get("recipient_id")
+        if recipient_id:
+            conversation_id = "-".join(map(str, user_pair(user_id, int(recipient_id))))
+            await typing_throttle.typing(user_id, int(recipient_id), conversation_id, bool(data.get("is_typing")))
+
+    elif frame_type == "message_read":
+        async with AsyncSessionLocal() as db:
+            message = (await db.execute(
+                select(Message.id, Message.sender_id, Message.recipient_id, Message.conversation_id, Message.created_at)
+                .where(Message.id == data.get("message_id"))
+            )).first()
+            if message is None or message.recipient_id != user_id:
+                return
+            conversation_id = message.conversation_id or await get_conversation_id(db, message.sender_id, user_id)
+        if conversation_id is not None:
+            await read_receipts.mark_read(user_id, conversation_id, message.id, message.sender_id, message.created_at)
+
+    elif frame_type == "message":
+        recipient_id = data.get("recipient_id")
+        if not recipient_id or int(recipient_id) == user_id or not (data.get("content") or data.get("media_url")):
+            return
+        async with AsyncSessionLocal() as db:
+            sender = await load_user(db, user_id)
+            if sender is None or await load_user(db, int(recipient_id)) is None:
+                return
+            await send_direct_message(
+                db, sender, int(recipient_id), data.get("content"),
+                data.get("message_type") or "text", data.get("media_url")
+            )
+
+@router.websocket("/ws/{user_id}")
+async def websocket_endpoint(websocket: WebSocket, user_id: int, token: str = ""):
+    if _token_user_id(token) != user_id:
+        await websocket.close(code=1008)
+        return
+
+    await manager.connect(websocket, user_id)
+    presence.touch(user_id)
+    try:
+        while True:
+            text = await websocket.receive_text()
+            presence.touch(user_id)
+            try:
+                data = json.loads(text)
+            except ValueError:
+                continue
+            if isinstance(data, dict):
+                try:
+                    await _handle_frame(user_id, data)
+                except (TypeError, ValueError):
+                    continue
+    except WebSocketDisconnect:
+        pass
+    finally:
+        presence.touch(user_id)
+        await manager.disconnect(websocket, user_id)
@@ -7,7 +7,7 @@ from .user import (
     PrivacySettings, NotificationSettings
 )
 from .post import (
-    PostCreate, PostResponse, ReactionCreate, 
+    PostCreate, PostResponse, ReactionCreate, CommentReactionCreate,
     CommentCreate, CommentResponse, ShareCreate
 )
 from .story import (
@@ -27,7 +27,7 @@ __all__ = [
     "UserBase", "UserCreate", "UserResponse", "UserProfileUpdate",
     "PrivacySettings", "NotificationSettings",
     # Post
-    "PostCreate", "PostResponse", "ReactionCreate", 
+    "PostCreate", "PostResponse", "ReactionCreate", "CommentReactionCreate", 
     "CommentCreate", "CommentResponse", "ShareCreate",
     # Story
     "StoryCreate", "StoryResponse", "StoryTagCreate",
@@ -39,10 +39,13 @@ class MessageResponse(BaseModel):
 # Notification schemas
 class NotificationResponse(BaseModel):
     id: int
+    type: str
     notification_type: str
     title: str
     message: str
-    data: Optional[str] = None
+    data: Optional[Dict[str, Any]] = None
+    post_id: Optional[int] = None
+    actor_count: int = 1
     is_read: bool
     created_at: datetime
     sender: Optional[Dict[str, Any]] = None
@@ -59,6 +62,8 @@ class MediaUploadResponse(BaseModel):
     file_size: int
     mime_type: str
     upload_date: datetime
+    url: Optional[str] = None
+    variants: Optional[Dict[str, Any]] = None
 
     class Config:
         from_attributes = True
@@ -22,6 +22,7 @@ class PostResponse(BaseModel):
     post_type: str
     media_type: Optional[str] = None
     media_url: Optional[str] = None
+    media_variants: Optional[Dict[str, Any]] = None
     created_at: datetime
     reactions_count: int
     comments_count: int
@@ -36,6 +37,9 @@ class ReactionCreate(BaseModel):
     post_id: int
     reaction_type: str
 
+class CommentReactionCreate(BaseModel):
+    reaction_type: str
+
 class CommentCreate(BaseModel):
     content: str
     post_id: int
@@ -46,7 +50,9 @@ class CommentResponse(BaseModel):
     content: str
     author: Dict[str, Any]
     created_at: datetime
+    parent_id: Optional[int] = None
     reactions_count: int = 0
+    replies_count: int = 0
     replies: List['CommentResponse'] = []
     
     class Config:
@@ -0,0 +1,48 @@
+"""
+Testes do backend: python -m pytest tests, a partir de backend/ (requer pytest
+e aiosqlite, além do requirements.txt)
+
+Rodam sobre um SQLite descartável por teste, sem MySQL: cada teste é
+síncrono e executa o seu cenário assíncrono com run_db.
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import Base  # noqa: E402
+from models import User  # noqa: E402
+
+@pytest.fixture
+def run_db(tmp_path):
+    """run_db(scenario): run the coroutine function scenario(session_factory) on a fresh database"""
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    def run(scenario):
+        async def main():
+            async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+            try:
+                return await scenario(async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False))
+            finally:
+                await async_engine.dispose()
+        return asyncio.run(main())
+
+    return run
+
+async def make_users(db, count: int):
+    """count users named U1..Un, committed"""
+    users = [
+        User(first_name=f"U{i}", last_name="Test", email=f"u{i}@example.com", password_hash="x")
+        for i in range(1, count + 1)
+    ]
+    db.add_all(users)
+    await db.commit()
+    return users
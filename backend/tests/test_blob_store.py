@@ -0,0 +1,90 @@
+"""
+Blobs de mídia: um arquivo por conteúdo, contagem de referências e coletor
+
+Os caminhos dos blobs são relativos ao diretório de trabalho, por isso cada
+teste roda dentro do seu tmp_path.
+"""
+import io
+from pathlib import Path
+
+from fastapi import UploadFile
+from sqlalchemy import select
+from starlette.datastructures import Headers
+
+from conftest import make_users
+from models import MediaBlob, MediaFile
+from utils.blob_store import (
+    BLOB_DIR, collect_unreferenced_blobs, media_file_record, release_media_url, store_blob,
+)
+
+def upload(content: bytes, filename: str = "photo.jpg") -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename=filename, headers=Headers({"content-type": "image/jpeg"}))
+
+async def add_upload(db, user, content: bytes) -> MediaFile:
+    file = upload(content)
+    blob = await store_blob(db, file)
+    media = media_file_record(blob, file, user.id, "image")
+    db.add(media)
+    await db.commit()
+    return media
+
+async def ref_count(db, content_hash: str):
+    return await db.scalar(select(MediaBlob.ref_count).where(MediaBlob.content_hash == content_hash))
+
+def collect(db):
+    return db.run_sync(lambda session: collect_unreferenced_blobs(session, grace_seconds=0))
+
+def test_duplicate_uploads_share_one_blob_until_the_last_reference(run_db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def scenario(Session):
+        async with Session() as db:
+            alice, bob = await make_users(db, 2)
+            first = await add_upload(db, alice, b"same pixels")
+            second = await add_upload(db, bob, b"same pixels")
+            # O coletor desfaz transações e expira os objetos: guarda os valores
+            url, content_hash, alice_id, bob_id = first.file_path, first.content_hash, alice.id, bob.id
+            assert second.file_path == url
+            assert await ref_count(db, content_hash) == 2
+            path = Path(url.lstrip("/"))
+            assert path.read_bytes() == b"same pixels"
+            assert [p for p in path.parent.iterdir() if p.is_file()] == [path]
+
+            await release_media_url(db, url, alice_id)
+            await db.commit()
+            assert await ref_count(db, content_hash) == 1
+            assert await collect(db) == 0
+            assert path.exists()
+
+            await release_media_url(db, url, bob_id)
+            await db.commit()
+            assert await ref_count(db, content_hash) == 0
+            assert await collect(db) == 1
+            assert not path.exists()
+            assert await ref_count(db, content_hash) is None
+
+    run_db(scenario)
+
+def test_collector_recounts_drifted_blobs_and_removes_orphan_files(run_db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def scenario(Session):
+        async with Session() as db:
+            (alice,) = await make_users(db, 1)
+            media = await add_upload(db, alice, b"still referenced")
+            url, content_hash = media.file_path, media.content_hash
+            blob = await db.scalar(select(MediaBlob).where(MediaBlob.content_hash == content_hash))
+            blob.ref_count = 0
+            await db.commit()
+
+            # Arquivo de um upload cuja transação foi desfeita: sem linha
+            orphan = BLOB_DIR / "ab" / "cd" / ("ab" + "cd" * 31 + ".jpg")
+            orphan.parent.mkdir(parents=True)
+            orphan.write_bytes(b"rolled back")
+
+            assert await collect(db) == 1
+            assert not orphan.exists()
+            assert Path(url.lstrip("/")).exists()
+            assert await ref_count(db, content_hash) == 1
+
+    run_db(scenario)
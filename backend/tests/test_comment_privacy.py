@@ -0,0 +1,82 @@
+"""
+Comentários seguem o post: quem não vê o post recebe 404 também nas listas
+de comentários e de respostas, e reações só mudam em comentários do post
+da URL enquanto ele existe
+"""
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import func, select
+
+from conftest import make_users
+from models import Comment, CommentReaction, Friendship, Post
+from routes.posts import get_comment_replies, get_post_comments, remove_comment_reaction
+
+def test_friends_only_post_hides_its_comments_from_strangers(run_db):
+    async def scenario(Session):
+        async with Session() as db:
+            author, friend, stranger = await make_users(db, 3)
+            db.add(Friendship(requester_id=author.id, addressee_id=friend.id, status="accepted",
+                              user_low_id=min(author.id, friend.id), user_high_id=max(author.id, friend.id)))
+            post = Post(author_id=author.id, content="só amigos", privacy="friends")
+            db.add(post)
+            await db.commit()
+            comment = Comment(post_id=post.id, author_id=friend.id, content="c", replies_count=1)
+            db.add(comment)
+            await db.commit()
+            db.add(Comment(post_id=post.id, author_id=author.id, parent_id=comment.id, content="r"))
+            await db.commit()
+
+            def comments_of(viewer):
+                return get_post_comments(post.id, Response(), cursor=None, limit=20, replies=3,
+                                         current_user_id=viewer.id, hidden_ids=frozenset(), db=db)
+
+            def replies_of(viewer):
+                return get_comment_replies(post.id, comment.id, Response(), cursor=None, limit=20,
+                                           current_user_id=viewer.id, hidden_ids=frozenset(), db=db)
+
+            (top,) = await comments_of(friend)
+            assert (top.id, [reply.content for reply in top.replies]) == (comment.id, ["r"])
+            assert [reply.content for reply in await replies_of(friend)] == ["r"]
+
+            for read in (comments_of, replies_of):
+                with pytest.raises(HTTPException) as error:
+                    await read(stranger)
+                assert error.value.status_code == 404
+
+    run_db(scenario)
+
+def test_comment_reaction_is_removed_only_through_its_live_post(run_db):
+    async def scenario(Session):
+        async with Session() as db:
+            author, reader = await make_users(db, 2)
+            post, other = Post(author_id=author.id, content="p"), Post(author_id=author.id, content="o")
+            db.add_all([post, other])
+            await db.commit()
+            comment = Comment(post_id=post.id, author_id=reader.id, content="c", reactions_count=1)
+            db.add(comment)
+            await db.commit()
+            db.add(CommentReaction(comment_id=comment.id, user_id=reader.id, reaction_type="like"))
+            await db.commit()
+
+            async def reactions():
+                return await db.scalar(select(func.count()).select_from(CommentReaction))
+
+            # Pela URL de outro post, ou com o post excluído: 404 e nada muda
+            with pytest.raises(HTTPException) as error:
+                await remove_comment_reaction(other.id, comment.id, current_user_id=reader.id, db=db)
+            assert (error.value.status_code, await reactions()) == (404, 1)
+
+            post.deleted_at = datetime.utcnow()
+            await db.commit()
+            with pytest.raises(HTTPException) as error:
+                await remove_comment_reaction(post.id, comment.id, current_user_id=reader.id, db=db)
+            assert (error.value.status_code, await reactions()) == (404, 1)
+
+            post.deleted_at = None
+            await db.commit()
+            await remove_comment_reaction(post.id, comment.id, current_user_id=reader.id, db=db)
+            assert await reactions() == 0
+
+    run_db(scenario)
@@ -0,0 +1,118 @@
+"""
+Paginação por cursor (keyset): feed, comentários e caixa de notificações
+
+Os cenários criam várias linhas com o mesmo created_at: o desempate por id
+é o que impede que uma página repita ou pule linhas.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException, Response
+
+from conftest import make_users
+from models import Comment, Notification, Post
+from routes.notifications import get_notifications
+from utils.comments import get_comment_page, get_replies_page
+from utils.feed import decode_cursor, encode_cursor, get_feed_page
+
+BASE = datetime(2024, 5, 1, 12, 0, 0, 123456)
+# Quatro linhas empatadas no mesmo instante, entre uma mais nova e duas mais antigas
+TIMES = [BASE + timedelta(seconds=1), BASE, BASE, BASE, BASE, BASE - timedelta(seconds=1), BASE - timedelta(seconds=2)]
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(BASE, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (BASE, 42)
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", "bm9waXBl"])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+def test_feed_pages_newest_first_without_gaps(run_db):
+    async def scenario(Session):
+        async with Session() as db:
+            (author,) = await make_users(db, 1)
+            posts = [Post(author_id=author.id, content=f"p{i}", privacy="public", created_at=at) for i, at in enumerate(TIMES)]
+            db.add_all(posts)
+            await db.commit()
+            expected = [post.id for post in sorted(posts, key=lambda post: (post.created_at, post.id), reverse=True)]
+
+            seen, cursor, pages = [], None, 0
+            while True:
+                page, cursor = await get_feed_page(db, author.id, cursor=cursor, limit=3)
+                seen += [post.id for post in page]
+                pages += 1
+                if cursor is None:
+                    break
+            return expected, seen, pages
+
+    expected, seen, pages = run_db(scenario)
+    assert seen == expected
+    assert pages == 3
+
+def test_comments_and_replies_page_oldest_first(run_db):
+    async def scenario(Session):
+        async with Session() as db:
+            (author,) = await make_users(db, 1)
+            post = Post(author_id=author.id, content="p", privacy="public", created_at=BASE)
+            db.add(post)
+            await db.commit()
+            comments = [Comment(post_id=post.id, author_id=author.id, content=f"c{i}", created_at=at) for i, at in enumerate(TIMES)]
+            db.add_all(comments)
+            await db.commit()
+            replies = [
+                Comment(post_id=post.id, author_id=author.id, parent_id=comments[0].id, content=f"r{i}", created_at=at)
+                for i, at in enumerate(TIMES)
+            ]
+            db.add_all(replies)
+            await db.commit()
+
+            def oldest_first(rows):
+                return [row.id for row in sorted(rows, key=lambda row: (row.created_at, row.id))]
+
+            async def walk(fetch):
+                seen, cursor = [], None
+                while True:
+                    page, cursor = await fetch(cursor)
+                    seen += [comment.id for comment in page]
+                    if cursor is None:
+                        return seen
+
+            top = await walk(lambda cursor: get_comment_page(db, post.id, author.id, cursor, limit=2, replies_per_thread=0))
+            thread = await walk(lambda cursor: get_replies_page(db, comments[0].id, author.id, cursor, limit=2))
+            return oldest_first(comments), top, oldest_first(replies), thread
+
+    expected_top, top, expected_thread, thread = run_db(scenario)
+    assert top == expected_top
+    assert thread == expected_thread
+
+def test_notification_inbox_pages_and_latest_cursor(run_db):
+    async def scenario(Session):
+        async with Session() as db:
+            recipient, sender = await make_users(db, 2)
+            notifications = [
+                Notification(recipient_id=recipient.id, sender_id=sender.id, notification_type="like",
+                             title="t", message=f"n{i}", created_at=at)
+                for i, at in enumerate(TIMES)
+            ]
+            db.add_all(notifications)
+            await db.commit()
+            expected = [n.id for n in sorted(notifications, key=lambda n: (n.created_at, n.id), reverse=True)]
+            newest = notifications[0]
+
+            seen, cursor, latest = [], None, None
+            while True:
+                response = Response()
+                page = await get_notifications(response, cursor=cursor, limit=3, unread_only=False,
+                                               current_user_id=recipient.id, db=db)
+                seen += [item["id"] for item in page]
+                latest = latest or response.headers.get("x-latest-cursor")
+                cursor = response.headers.get("x-next-cursor")
+                if cursor is None:
+                    return expected, seen, latest, (newest.created_at, newest.id)
+
+    expected, seen, latest, newest = run_db(scenario)
+    assert seen == expected
+    assert decode_cursor(latest) == newest
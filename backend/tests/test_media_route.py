@@ -0,0 +1,100 @@
+"""
+Entrega de mídia: ETag/304, Range e If-Range, com e sem o cache em memória
+"""
+import hashlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import routes.media as media
+from core.cache import ByteLRUCache
+from core.config import UPLOAD_URL_PREFIX
+
+CONTENT = bytes(range(256)) * 4
+
+@pytest.fixture(params=["streamed", "hot_cache"])
+def client(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(media, "UPLOAD_ROOT", tmp_path.resolve())
+    monkeypatch.setattr(media, "hot_cache", ByteLRUCache(1024 * 1024 if request.param == "hot_cache" else 0))
+    app = FastAPI()
+    app.include_router(media.router)
+    return TestClient(app)
+
+def put(root, path: str, content: bytes = CONTENT) -> str:
+    target = root / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_bytes(content)
+    return f"{UPLOAD_URL_PREFIX}/{path}"
+
+def test_blob_etag_comes_from_the_url_and_is_immutable(client, tmp_path):
+    sha = hashlib.sha256(CONTENT).hexdigest()
+    url = put(tmp_path, f"blobs/{sha[:2]}/{sha[2:4]}/{sha}.jpg")
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == f'"{sha}"'
+    assert response.headers["cache-control"] == media.IMMUTABLE
+    assert response.headers["content-type"] == "image/jpeg"
+
+    # O 304 não depende do disco: nem o arquivo é consultado
+    (tmp_path / url.removeprefix(UPLOAD_URL_PREFIX + "/")).unlink()
+    revalidated = client.get(url, headers={"If-None-Match": f'"{sha}"'})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+
+def test_other_files_revalidate_by_size_and_mtime(client, tmp_path):
+    url = put(tmp_path, "avatars/a.png")
+    etag = client.get(url).headers["etag"]
+    assert client.get(url, headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+
+    put(tmp_path, "avatars/a.png", CONTENT + b"changed")
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.headers["cache-control"] == media.REVALIDATE
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=10-19", 10, 19),
+    ("bytes=1000-", 1000, 1023),
+    ("bytes=-24", 1000, 1023),
+    ("bytes=1020-5000", 1020, 1023),
+])
+def test_single_range(client, tmp_path, header, start, end):
+    url = put(tmp_path, "videos/v.mp4")
+    response = client.get(url, headers={"Range": header})
+    assert response.status_code == 206
+    assert response.content == CONTENT[start:end + 1]
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(CONTENT)}"
+    assert response.headers["content-length"] == str(end - start + 1)
+
+def test_unsatisfiable_ignored_and_stale_ranges(client, tmp_path):
+    url = put(tmp_path, "videos/v.mp4")
+    outside = client.get(url, headers={"Range": "bytes=5000-"})
+    assert outside.status_code == 416
+    assert outside.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+    # Vários intervalos: o arquivo inteiro
+    several = client.get(url, headers={"Range": "bytes=0-1,5-6"})
+    assert (several.status_code, several.content) == (200, CONTENT)
+
+    etag = several.headers["etag"]
+    fresh = client.get(url, headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert (fresh.status_code, fresh.content) == (206, CONTENT[:10])
+    stale = client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+    assert (stale.status_code, stale.content) == (200, CONTENT)
+
+def test_head_sends_headers_only(client, tmp_path):
+    url = put(tmp_path, "videos/v.mp4")
+    response = client.head(url, headers={"Range": "bytes=0-99"})
+    assert response.status_code == 206
+    assert response.content == b""
+    assert response.headers["content-length"] == "100"
+
+@pytest.mark.parametrize("path", ["blobs/tmp/.upload-x.part", "avatars/.hidden", "%2e%2e/outside.txt", "missing.png"])
+def test_hidden_temporary_and_outside_paths_are_404(client, tmp_path, path):
+    put(tmp_path, "blobs/tmp/.upload-x.part")
+    put(tmp_path, "avatars/.hidden")
+    (tmp_path.parent / "outside.txt").write_bytes(b"secret")
+    assert client.get(f"{UPLOAD_URL_PREFIX}/{path}").status_code == 404
@@ -0,0 +1,105 @@
+"""
+Notificações agregadas: cada frame entregue leva o id da linha gravada
+
+Um lote insere uma linha por grupo (recipient, post, tipo) ou funde o grupo
+na notificação não lida que já existe; uma notificação lida nunca é fundida.
+"""
+import json
+
+from sqlalchemy import select, update
+
+from conftest import make_users
+from models import Notification, Post, User
+import utils.notification_service as notification_service
+from utils.notification_service import NotificationEvent, NotificationPipeline
+
+class RecordingConnections:
+    """Stand-in for the ConnectionManager: keeps the frames sent to each user"""
+
+    def __init__(self):
+        self.frames = {}
+
+    async def send_batch(self, messages):
+        for user_id, message in messages.items():
+            frame = json.loads(message)
+            items = frame["notifications"] if frame["type"] == "notifications" else [frame]
+            self.frames.setdefault(user_id, []).extend(items)
+
+def like(recipient, sender, post):
+    return NotificationEvent(recipient.id, sender.id, "like", post_id=post.id)
+
+def test_frames_carry_the_ids_of_the_rows_written(run_db, monkeypatch):
+    # Duas linhas por INSERT: o lote de três novas usa dois
+    monkeypatch.setattr(notification_service, "INSERT_CHUNK_SIZE", 2)
+
+    async def scenario(Session):
+        async with Session() as db:
+            alice, bob, carol, dave = await make_users(db, 4)
+            first, second = Post(author_id=alice.id, content="a"), Post(author_id=bob.id, content="b")
+            db.add_all([first, second])
+            await db.commit()
+
+        connections = RecordingConnections()
+        pipeline = NotificationPipeline(session_factory=Session, connections=connections)
+        await pipeline.flush([
+            like(alice, bob, first),
+            like(alice, carol, first),
+            NotificationEvent(alice.id, dave.id, "comment", post_id=first.id),
+            like(bob, alice, second),
+            like(alice, alice, first),  # self-notification: dropped
+        ])
+
+        async with Session() as db:
+            rows = {n.id: n for n in (await db.execute(select(Notification))).scalars()}
+        return pipeline, connections.frames, rows, (alice.id, bob.id)
+
+    pipeline, frames, rows, (alice_id, bob_id) = run_db(scenario)
+    assert pipeline.inserted == 3 and pipeline.merged == 0
+    assert sorted(frames) == [alice_id, bob_id]
+    delivered = [(user_id, item) for user_id, items in frames.items() for item in items]
+    assert sorted(item["id"] for _, item in delivered) == sorted(rows)
+    for user_id, item in delivered:
+        row = rows[item["id"]]
+        assert (row.recipient_id, row.notification_type, row.actor_count) == (user_id, item["type"], item["actor_count"])
+    likes = [item for item in frames[alice_id] if item["type"] == "like"]
+    assert [item["actor_count"] for item in likes] == [2]
+
+def test_merges_only_into_unread_notifications(run_db):
+    async def scenario(Session):
+        async with Session() as db:
+            alice, bob, carol, dave = await make_users(db, 4)
+            post = Post(author_id=alice.id, content="a")
+            db.add(post)
+            await db.commit()
+
+        connections = RecordingConnections()
+        pipeline = NotificationPipeline(session_factory=Session, connections=connections)
+        await pipeline.flush([like(alice, bob, post)])
+        (first_frame,) = connections.frames[alice.id]
+
+        # Ainda não lida: a curtida de carol entra na mesma linha
+        await pipeline.flush([like(alice, carol, post)])
+        merged_frame = connections.frames[alice.id][-1]
+
+        # Lida: a curtida de dave abre uma linha nova e a lida não muda
+        async with Session() as db:
+            await db.execute(update(Notification).values(is_read=True))
+            await db.execute(update(User).where(User.id == alice.id).values(unread_notifications_count=0))
+            await db.commit()
+        await pipeline.flush([like(alice, dave, post)])
+        fresh_frame = connections.frames[alice.id][-1]
+
+        async with Session() as db:
+            rows = {n.id: n for n in (await db.execute(select(Notification))).scalars()}
+            unread = await db.scalar(select(User.unread_notifications_count).where(User.id == alice.id))
+        return pipeline, first_frame, merged_frame, fresh_frame, rows, unread
+
+    pipeline, first_frame, merged_frame, fresh_frame, rows, unread = run_db(scenario)
+    assert merged_frame["id"] == first_frame["id"]
+    assert merged_frame["actor_count"] == 2
+    assert fresh_frame["id"] != first_frame["id"]
+    assert fresh_frame["actor_count"] == 1
+    assert rows[first_frame["id"]].is_read and rows[first_frame["id"]].actor_count == 2
+    assert not rows[fresh_frame["id"]].is_read
+    assert (pipeline.inserted, pipeline.merged) == (2, 1)
+    assert unread == 1
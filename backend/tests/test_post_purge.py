@@ -0,0 +1,109 @@
+"""
+Limpeza dos posts excluídos: a ordem dos DELETEs respeita as chaves
+estrangeiras (ligadas no SQLite aqui) e uma execução interrompida é
+retomada pela seguinte
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, func, select
+
+import utils.post_purge as post_purge
+from conftest import make_users
+from models import Comment, CommentReaction, Notification, NotificationArchive, Post, Reaction, Share, User
+from utils.post_purge import purge_deleted_posts
+
+DEPENDENTS = (CommentReaction, Comment, Reaction, Share, Notification, NotificationArchive)
+
+def enforce_foreign_keys(Session):
+    def on_connect(connection, _):
+        connection.execute("PRAGMA foreign_keys=ON")
+    event.listen(Session.kw["bind"].sync_engine, "connect", on_connect)
+
+async def deleted_post_with_dependents(db):
+    author, reader = await make_users(db, 2)
+    post, kept = Post(author_id=author.id, content="viral"), Post(author_id=author.id, content="fica")
+    db.add_all([post, kept])
+    await db.commit()
+
+    comments = [Comment(post_id=post.id, author_id=reader.id, content=f"c{i}") for i in range(3)]
+    db.add_all(comments + [Comment(post_id=kept.id, author_id=reader.id, content="outro")])
+    await db.commit()
+    replies = [Comment(post_id=post.id, author_id=author.id, parent_id=comments[i % 3].id, content=f"r{i}") for i in range(4)]
+    db.add_all(replies)
+    await db.commit()
+    db.add_all(
+        [CommentReaction(comment_id=comment.id, user_id=author.id, reaction_type="like") for comment in comments + replies]
+        + [Reaction(post_id=post.id, user_id=reader.id, reaction_type="love"),
+           Share(post_id=post.id, user_id=reader.id),
+           NotificationArchive(id=10_000, recipient_id=author.id, notification_type="like", title="t", message="m", post_id=post.id)]
+        + [Notification(recipient_id=author.id, sender_id=reader.id, notification_type=kind, title="t", message="m",
+                        post_id=post.id, is_read=is_read)
+           for kind, is_read in [("like", False), ("comment", False), ("share", True)]]
+    )
+    author.unread_notifications_count = 2
+    post.deleted_at = datetime.utcnow()
+    await db.commit()
+    return post.id, kept.id, author.id
+
+async def remaining(db, post_id: int):
+    counts = {}
+    for model in DEPENDENTS:
+        column = Comment.post_id if model is CommentReaction else model.post_id
+        query = select(func.count()).select_from(model)
+        if model is CommentReaction:
+            query = query.join(Comment, Comment.id == CommentReaction.comment_id)
+        counts[model.__name__] = await db.scalar(query.where(column == post_id))
+    counts["Post"] = await db.scalar(select(func.count()).select_from(Post).where(Post.id == post_id))
+    return counts
+
+@pytest.fixture(autouse=True)
+def timeline_removals(monkeypatch):
+    monkeypatch.setattr(post_purge, "PURGE_PAUSE_SECONDS", 0)
+    removed = []
+    monkeypatch.setattr(post_purge, "remove_from_timelines", lambda post_id, author_id: removed.append(post_id))
+    return removed
+
+def test_purge_removes_dependents_in_foreign_key_order(run_db, timeline_removals):
+    async def scenario(Session):
+        enforce_foreign_keys(Session)
+        async with Session() as db:
+            post_id, kept_id, author_id = await deleted_post_with_dependents(db)
+            assert await purge_deleted_posts(db, chunk_size=2) == 1
+            left = await remaining(db, post_id)
+            kept = await remaining(db, kept_id)
+            unread = await db.scalar(select(User.unread_notifications_count).where(User.id == author_id))
+            return post_id, left, kept, unread
+
+    post_id, left, kept, unread = run_db(scenario)
+    assert set(left.values()) == {0}
+    assert (kept["Post"], kept["Comment"]) == (1, 1)
+    assert unread == 0
+    assert timeline_removals == [post_id]
+
+def test_interrupted_purge_resumes_on_the_next_run(run_db, monkeypatch):
+    async def scenario(Session):
+        enforce_foreign_keys(Session)
+        async with Session() as db:
+            post_id, _, _ = await deleted_post_with_dependents(db)
+
+            real = post_purge._delete_notifications
+
+            async def crash(*args):
+                raise RuntimeError("worker stopped")
+
+            monkeypatch.setattr(post_purge, "_delete_notifications", crash)
+            with pytest.raises(RuntimeError):
+                await purge_deleted_posts(db, chunk_size=2)
+            await db.rollback()
+            partial = await remaining(db, post_id)
+
+            monkeypatch.setattr(post_purge, "_delete_notifications", real)
+            assert await purge_deleted_posts(db, chunk_size=2) == 1
+            return partial, await remaining(db, post_id)
+
+    partial, left = run_db(scenario)
+    # Os passos anteriores às notificações já estavam gravados
+    assert (partial["Comment"], partial["Reaction"], partial["Share"]) == (0, 0, 0)
+    assert (partial["Notification"], partial["Post"]) == (3, 1)
+    assert set(left.values()) == {0}
@@ -0,0 +1,74 @@
+"""
+Presença: gravação em lote do last_seen e limite do indicador de digitação
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+import core.presence as presence_module
+from conftest import make_users
+from core.presence import PresenceTracker, TypingThrottle
+from models import User
+
+class RecordingManager:
+    def __init__(self):
+        self.sent = []
+
+    async def send_typing_indicator(self, user_id: int, typing_data: dict):
+        self.sent.append((user_id, typing_data["conversation_id"], typing_data["is_typing"]))
+
+def test_typing_is_throttled_and_stops_by_itself(monkeypatch):
+    manager = RecordingManager()
+    monkeypatch.setattr(presence_module, "manager", manager)
+
+    async def scenario():
+        throttle = TypingThrottle(throttle_ms=100, idle_ms=200)
+        for _ in range(6):
+            await throttle.typing(1, 2, "c1", True)
+        assert manager.sent == [(2, "c1", True)]
+        assert throttle.suppressed == 5
+
+        # Passado o intervalo, a próxima tecla é repassada de novo
+        await asyncio.sleep(0.15)
+        await throttle.typing(1, 2, "c1", True)
+        assert manager.sent == [(2, "c1", True), (2, "c1", True)]
+
+        # Sem teclas por idle_ms, o "parou" sai sozinho, uma vez
+        await asyncio.sleep(0.5)
+        assert manager.sent[2:] == [(2, "c1", False)]
+
+        # Parada explícita: enviada na hora e o timer não manda outra
+        await throttle.typing(1, 2, "c2", True)
+        await throttle.typing(1, 2, "c2", False)
+        await asyncio.sleep(0.3)
+        return throttle
+
+    throttle = asyncio.run(scenario())
+    assert manager.sent[3:] == [(2, "c2", True), (2, "c2", False)]
+    assert throttle._state == {}
+
+def test_presence_flush_only_moves_last_seen_forward(run_db):
+    async def scenario(Session):
+        async with Session() as db:
+            early, late = await make_users(db, 2)
+            # Outro worker já gravou um acesso mais novo para late
+            future = datetime.utcnow() + timedelta(hours=1)
+            await db.execute(update(User).where(User.id == late.id).values(last_seen=future))
+            await db.commit()
+
+        tracker = PresenceTracker(session_factory=Session)
+        tracker.touch(early.id)
+        tracker.touch(late.id)
+        touched = tracker.last_seen[early.id]
+        assert await tracker.flush() == 2
+        assert await tracker.flush() == 0
+
+        async with Session() as db:
+            rows = dict((await db.execute(select(User.id, User.last_seen))).all())
+        return rows, (early.id, touched), (late.id, future), tracker
+
+    rows, (early_id, touched), (late_id, future), tracker = run_db(scenario)
+    assert rows[early_id] == touched
+    assert rows[late_id] == future
+    assert tracker.get_last_seen(late_id, stored=future) == future
@@ -0,0 +1,29 @@
+"""
+Confirmações de leitura em lote: um flush que falha devolve o lote sem
+desfazer leituras mais novas que chegaram nesse meio tempo
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.messaging import ReadReceiptBuffer
+
+BASE = datetime(2024, 5, 1, 12, 0, 0)
+
+def test_failed_flush_keeps_the_newest_read_per_conversation():
+    buffer = ReadReceiptBuffer()
+    older, newer = (BASE, 10), (BASE + timedelta(seconds=5), 12)
+
+    def unavailable():
+        # Enquanto o lote era gravado chegaram uma leitura mais nova e uma atrasada
+        buffer.pending[(1, 100)] = newer
+        buffer.pending[(2, 100)] = (BASE - timedelta(seconds=5), 9)
+        raise ConnectionError("database unavailable")
+
+    buffer.session_factory = unavailable
+    buffer.pending = {(1, 100): older, (2, 100): older, (3, 200): newer}
+    with pytest.raises(ConnectionError):
+        asyncio.run(buffer.flush())
+
+    assert buffer.pending == {(1, 100): newer, (2, 100): older, (3, 200): newer}
@@ -0,0 +1,53 @@
+"""
+Índice de busca de usuários: ordenação, limite de candidatos e atualização no commit
+"""
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import utils.search as search
+from core.database import Base
+from models import User
+from utils.search import UserSearchIndex, tokenize
+
+def build(names):
+    index = UserSearchIndex()
+    index.build((user_id, tokenize(*name.split())) for user_id, name in names.items())
+    return index
+
+def test_friends_rank_first_and_every_term_must_match():
+    index = build({1: "Ana Souza", 2: "Ana Silva", 3: "Anabela Souza", 4: "Bruno Souza", 5: "Ana Souza Lima"})
+    assert index.search("ana sou", friend_ids={3}) == [3, 1, 5]
+    assert index.search("ana sou", second_degree={5: 4, 1: 1}) == [5, 1, 3]
+    assert index.search("ana sou", exclude_id=1, exclude_ids={5}) == [3]
+    assert index.search("conceição") == []
+
+def test_candidates_from_the_index_are_capped(monkeypatch):
+    monkeypatch.setattr(search, "MAX_CANDIDATES", 10)
+    index = build({user_id: f"Maria Santos{user_id}" for user_id in range(1, 101)})
+    assert len(index.search("maria", limit=50)) == 10
+    # Amigos entram sempre, mesmo além do limite
+    assert 99 in index.search("maria", limit=50, friend_ids={99})
+
+def test_index_follows_commits_not_rollbacks(tmp_path, monkeypatch):
+    index = UserSearchIndex()
+    monkeypatch.setattr(search, "search_index", index)
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    with Session() as db:
+        db.add(User(first_name="Ghost", last_name="Rollback", email="g@example.com", password_hash="x"))
+        db.flush()
+        db.rollback()
+        db.add(User(first_name="Joana", last_name="Commit", email="j@example.com", password_hash="x"))
+        db.flush()
+        assert index.search("joana") == []
+        db.commit()
+    assert index.search("ghost") == []
+    (joana,) = index.search("joana")
+
+    with Session() as db:
+        db.get(User, joana).is_active = False
+        db.commit()
+    assert index.search("joana") == []
+    engine.dispose()
@@ -0,0 +1,72 @@
+"""
+Visualizações de stories com gravação atrasada: deduplicação, contador e
+nova tentativa depois de uma falha
+"""
+import pytest
+from sqlalchemy import func, select
+
+import utils.story_views as story_views_module
+from conftest import make_users
+from models import Story, StoryView
+from utils.story_views import StoryViewRecorder, list_viewers
+
+async def views_of(db, story_id: int):
+    count = await db.scalar(select(Story.views_count).where(Story.id == story_id))
+    rows = await db.scalar(select(func.count()).select_from(StoryView).where(StoryView.story_id == story_id))
+    return count, rows
+
+def test_views_are_deduplicated_and_counted_once(run_db, monkeypatch):
+    # Duas linhas por INSERT: os três viewers do story usam dois
+    monkeypatch.setattr(story_views_module, "INSERT_CHUNK_SIZE", 2)
+
+    async def scenario(Session):
+        async with Session() as db:
+            author, *viewers = await make_users(db, 4)
+            story = Story(author_id=author.id, content="s", views_count=0)
+            db.add(story)
+            await db.commit()
+
+            recorder = StoryViewRecorder(session_factory=Session)
+            assert [recorder.record(story.id, viewer.id) for viewer in viewers] == [True, True, True]
+            assert not recorder.record(story.id, viewers[0].id)
+            assert recorder.duplicates == 1
+
+            # Antes da gravação, o autor já vê quem viu
+            assert {viewer_id for viewer_id, _ in await list_viewers(db, recorder, story.id)} == {v.id for v in viewers}
+            assert await views_of(db, story.id) == (0, 0)
+
+            assert await recorder.flush() == 3
+            assert await views_of(db, story.id) == (3, 3)
+
+            # Outro worker (sem a memória deste) repete uma visualização já gravada
+            other = StoryViewRecorder(session_factory=Session)
+            other.record(story.id, viewers[0].id)
+            assert await other.flush() == 0
+            assert await views_of(db, story.id) == (3, 3)
+
+    run_db(scenario)
+
+def test_failed_flush_keeps_the_views_for_the_next_one(run_db):
+    def unavailable():
+        raise ConnectionError("database unavailable")
+
+    async def scenario(Session):
+        async with Session() as db:
+            author, viewer = await make_users(db, 2)
+            story = Story(author_id=author.id, content="s", views_count=0)
+            db.add(story)
+            await db.commit()
+
+            recorder = StoryViewRecorder(session_factory=unavailable)
+            recorder.record(story.id, viewer.id)
+            with pytest.raises(ConnectionError):
+                await recorder.flush()
+            assert recorder.pending_count == 1
+            assert viewer.id in recorder.pending_viewers(story.id)
+
+            recorder.session_factory = Session
+            assert await recorder.flush() == 1
+            assert recorder.pending_count == 0
+            assert await views_of(db, story.id) == (1, 1)
+
+    run_db(scenario)
@@ -0,0 +1,102 @@
+"""
+Fila de saída de cada WebSocket: políticas para clientes lentos
+
+O socket falso só escreve quando liberado, então a fila enche como a de um
+cliente que não lê.
+"""
+import asyncio
+
+import pytest
+
+from core.backplane import InMemoryBackplane, RespError
+from core.websockets import SLOW_CONSUMER_CLOSE_CODE, ClientConnection, ConnectionManager
+
+class StalledSocket:
+    def __init__(self):
+        self.sent = []
+        self.released = asyncio.Event()
+        self.close_code = None
+
+    async def send_text(self, message: str):
+        await self.released.wait()
+        self.sent.append(message)
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int):
+        self.close_code = code
+
+class RecordingManager:
+    def __init__(self):
+        self.disconnects = []
+
+    async def disconnect(self, websocket, user_id, code=None):
+        self.disconnects.append((user_id, code))
+        await self.connection.close(code)
+
+def run_connection(policy: str, messages, max_queue: int = 3):
+    """Queue messages on a stalled socket, then let it drain; returns (connection, socket, manager)"""
+    async def scenario():
+        socket, manager = StalledSocket(), RecordingManager()
+        connection = ClientConnection(manager, socket, user_id=7, max_queue=max_queue, policy=policy)
+        manager.connection = connection
+        for message, key in messages:
+            connection.enqueue(message, key)
+        await asyncio.sleep(0)
+        socket.released.set()
+        for _ in range(20):
+            await asyncio.sleep(0)
+        await connection.close()
+        return connection, socket, manager
+    return asyncio.run(scenario())
+
+def plain(*messages):
+    return [(message, None) for message in messages]
+
+def test_drop_oldest_keeps_the_latest_messages():
+    connection, socket, _ = run_connection("drop_oldest", plain("m0", "m1", "m2", "m3", "m4"))
+    assert socket.sent == ["m2", "m3", "m4"]
+    assert connection.dropped == 2
+
+def test_drop_newest_keeps_the_queued_messages():
+    connection, socket, _ = run_connection("drop_newest", plain("m0", "m1", "m2", "m3", "m4"))
+    assert socket.sent == ["m0", "m1", "m2"]
+    assert connection.dropped == 2
+
+def test_disconnect_closes_the_slow_socket():
+    connection, socket, manager = run_connection("disconnect", plain("m0", "m1", "m2", "m3", "m4"))
+    assert manager.disconnects == [(7, SLOW_CONSUMER_CLOSE_CODE)]
+    assert socket.close_code == SLOW_CONSUMER_CLOSE_CODE
+    assert connection.closed
+    assert socket.sent == []
+
+@pytest.mark.parametrize("policy", ["drop_oldest", "drop_newest", "disconnect"])
+def test_keyed_message_replaces_the_pending_one(policy):
+    messages = [("typing:on", "typing"), ("hello", None), ("typing:off", "typing")]
+    connection, socket, _ = run_connection(policy, messages)
+    assert socket.sent == ["typing:off", "hello"]
+    assert connection.dropped == 0
+
+class FailingBackplane(InMemoryBackplane):
+    async def add_presence(self, user_id: int, worker_id: str) -> None:
+        raise RespError("LOADING")
+
+    async def remove_presence(self, user_id: int, worker_id: str) -> None:
+        raise ConnectionResetError("backplane gone")
+
+def test_backplane_errors_do_not_break_connect_and_disconnect():
+    async def scenario():
+        manager, socket = ConnectionManager(FailingBackplane()), StalledSocket()
+        socket.released.set()
+        await manager.connect(socket, 7)
+        registered = [connection.websocket for connection in manager.active_connections[7]]
+        await manager.send_personal_message("hello", 7)
+        await asyncio.sleep(0)
+        await manager.disconnect(socket, 7)
+        return registered, socket, manager.active_connections
+
+    registered, socket, active = asyncio.run(scenario())
+    assert registered == [socket]
+    assert socket.sent == ["hello"]
+    assert active == {}
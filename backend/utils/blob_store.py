@@ -0,0 +1,243 @@
+"""
+Armazenamento de mídia endereçado por conteúdo (SHA-256)
+
+Cada conteúdo distinto é gravado uma única vez em
+
+    uploads/blobs/<h[0:2]>/<h[2:4]>/<sha256><extensão>
+
+e descrito por um MediaBlob. Cada upload continua gerando o seu MediaFile
+(dono, nome original), que aponta para o blob por content_hash e conta uma
+referência em MediaBlob.ref_count. Reenviar uma foto já armazenada vira só
+uma inserção de metadados: o arquivo temporário é descartado e os derivados
+já gerados são reaproveitados.
+
+Blobs sem referências há mais de MEDIA_GC_GRACE_SECONDS são removidos (linha,
+arquivo e derivados) pelo coletor periódico. O arquivo de um blob novo é
+gravado antes do commit de quem o enviou; se essa transação for desfeita, o
+arquivo fica sem linha e o mesmo coletor o apaga depois do mesmo prazo.
+"""
+import asyncio
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import exists, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.config import UPLOAD_DIR, UPLOAD_URL_PREFIX, MAX_FILE_SIZE_MB, MEDIA_GC_GRACE_SECONDS
+from core.database import SessionLocal
+from models import MediaBlob, MediaFile, Post, User
+from utils.files import file_extension, persist, stream_to_temp
+from utils.media import variants_dir
+
+BLOB_SUBDIR = "blobs"
+BLOB_DIR = Path(UPLOAD_DIR) / BLOB_SUBDIR
+TEMP_DIR = BLOB_DIR / "tmp"
+
+def blob_url(content_hash: str, extension: str) -> str:
+    return f"{UPLOAD_URL_PREFIX}/{BLOB_SUBDIR}/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension.lower()}"
+
+def _remove(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+async def store_blob(db: AsyncSession, file: UploadFile, max_size_mb: int = MAX_FILE_SIZE_MB) -> MediaBlob:
+    """
+    Stream an upload into the blob store and take a reference on its blob.
+
+    The reference is taken in the caller's transaction, which must commit it
+    together with the MediaFile that owns it. Until then the blob row stays
+    locked, so the garbage collector can't remove the file being reused. The
+    file of a new blob is written before that commit, so the URL works as
+    soon as the row is visible; if the caller rolls back instead, the file is
+    left without a row and collect_orphan_files removes it.
+    """
+    temp = await stream_to_temp(file, TEMP_DIR, max_size_mb)
+    try:
+        now = datetime.utcnow()
+        inserted = await db.execute(
+            insert(MediaBlob)
+            .prefix_with("IGNORE", dialect="mysql")
+            .prefix_with("OR IGNORE", dialect="sqlite")
+            .values(
+                content_hash=temp.sha256,
+                file_path=blob_url(temp.sha256, file_extension(file)),
+                file_size=temp.size,
+                mime_type=file.content_type,
+                ref_count=1,
+                created_at=now,
+                updated_at=now
+            )
+        )
+        if not inserted.rowcount:
+            await db.execute(
+                update(MediaBlob)
+                .where(MediaBlob.content_hash == temp.sha256)
+                .values(ref_count=MediaBlob.ref_count + 1, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+
+        blob = await db.scalar(select(MediaBlob).where(MediaBlob.content_hash == temp.sha256))
+        blob_path = Path(blob.file_path.lstrip("/"))
+        if inserted.rowcount or not await asyncio.to_thread(blob_path.exists):
+            await asyncio.to_thread(persist, temp.path, blob_path)
+        else:
+            # Duplicate: metadata only, the content is already on disk
+            await asyncio.to_thread(_remove, temp.path)
+        return blob
+    except HTTPException:
+        await asyncio.to_thread(_remove, temp.path)
+        raise
+    except Exception as e:
+        await asyncio.to_thread(_remove, temp.path)
+        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+
+def media_file_record(blob: MediaBlob, file: UploadFile, user_id: int, file_type: str) -> MediaFile:
+    """MediaFile row for an upload stored as blob (file_path is its public URL)"""
+    return MediaFile(
+        filename=Path(blob.file_path).name,
+        original_filename=file.filename,
+        file_path=blob.file_path,
+        file_size=blob.file_size,
+        mime_type=file.content_type,
+        file_type=file_type,
+        uploaded_by=user_id,
+        content_hash=blob.content_hash
+    )
+
+async def release_blob(db: AsyncSession, content_hash: str):
+    """Drop one reference on a blob (in the caller's transaction)"""
+    await db.execute(
+        update(MediaBlob)
+        .where(MediaBlob.content_hash == content_hash, MediaBlob.ref_count > 0)
+        .values(ref_count=MediaBlob.ref_count - 1, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+async def release_media_url(db: AsyncSession, url: str, owner_id: int, dropped_post_id: Optional[int] = None):
+    """
+    Release the upload of owner_id served at url, unless it is still shown
+    by a post (other than dropped_post_id) or is the owner's avatar/cover.
+    Runs in the caller's transaction, after its own changes are flushed.
+    """
+    if not url:
+        return
+
+    other_posts = [Post.media_url == url]
+    if dropped_post_id is not None:
+        other_posts.append(Post.id != dropped_post_id)
+    still_used = await db.scalar(select(or_(
+        exists().where(*other_posts),
+        exists().where(User.id == owner_id, or_(User.avatar == url, User.cover_photo == url))
+    )))
+    if still_used:
+        return
+
+    media = await db.scalar(
+        select(MediaFile).where(MediaFile.file_path == url, MediaFile.uploaded_by == owner_id).limit(1)
+    )
+    if media is not None:
+        await db.delete(media)
+        if media.content_hash:
+            await release_blob(db, media.content_hash)
+
+async def release_post_media(db: AsyncSession, post: Post):
+    """Release the upload behind the media of a post being deleted"""
+    await release_media_url(db, post.media_url, post.author_id, dropped_post_id=post.id)
+
+def collect_unreferenced_blobs(db: Session, grace_seconds: int = MEDIA_GC_GRACE_SECONDS, batch_size: int = 100) -> int:
+    """
+    Delete the blobs without references for longer than grace_seconds, with
+    their files and variants. Returns the number of blobs removed.
+
+    Each candidate is locked and its references recounted before deletion,
+    so a drifted ref_count or a concurrent upload never loses a file.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    removed = 0
+    last_id = 0
+    while True:
+        ids = db.execute(
+            select(MediaBlob.id)
+            .where(MediaBlob.ref_count == 0, MediaBlob.updated_at < cutoff, MediaBlob.id > last_id)
+            .order_by(MediaBlob.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        for blob_id in ids:
+            blob = db.execute(
+                select(MediaBlob)
+                .where(MediaBlob.id == blob_id, MediaBlob.ref_count == 0, MediaBlob.updated_at < cutoff)
+                .with_for_update()
+            ).scalar()
+            if blob is None:
+                db.rollback()
+                continue
+
+            references = db.scalar(select(func.count()).where(MediaFile.content_hash == blob.content_hash))
+            if references:
+                blob.ref_count = references
+                db.commit()
+                continue
+
+            _remove(blob.file_path.lstrip("/"))
+            shutil.rmtree(variants_dir(blob.file_path), ignore_errors=True)
+            db.delete(blob)
+            db.commit()
+            removed += 1
+
+    # Temporários de uploads interrompidos
+    if TEMP_DIR.exists():
+        for temp in TEMP_DIR.iterdir():
+            if temp.stat().st_mtime < time.time() - grace_seconds:
+                _remove(str(temp))
+
+    return removed + collect_orphan_files(db, grace_seconds)
+
+def collect_orphan_files(db: Session, grace_seconds: int = MEDIA_GC_GRACE_SECONDS) -> int:
+    """
+    Delete the blob files older than grace_seconds that have no MediaBlob
+    row (uploads whose transaction was rolled back), with their variants.
+    Returns the number of files removed.
+    """
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    # Um diretório <h[0:2]>/<h[2:4]> por vez: uma consulta para os seus arquivos
+    for directory in BLOB_DIR.glob("??/??"):
+        files = {
+            "/" + path.as_posix(): path
+            for path in directory.iterdir()
+            if path.is_file() and path.stat().st_mtime < cutoff
+        }
+        if not files:
+            continue
+        known = set(db.execute(
+            select(MediaBlob.file_path).where(MediaBlob.file_path.in_(list(files)))
+        ).scalars().all())
+        db.rollback()
+        for url, path in files.items():
+            if url not in known:
+                _remove(str(path))
+                shutil.rmtree(variants_dir(url), ignore_errors=True)
+                removed += 1
+    return removed
+
+def run_blob_gc():
+    """Background job entry point"""
+    db = SessionLocal()
+    try:
+        removed = collect_unreferenced_blobs(db)
+        if removed:
+            print(f"🧹 Removed {removed} unreferenced media blobs")
+    finally:
+        db.close()
@@ -0,0 +1,143 @@
+"""
+Comentários em threads: comentários de primeiro nível paginados por cursor
+e as primeiras respostas de cada um
+
+Uma página custa no máximo duas consultas, qualquer que seja o tamanho do
+post:
+- os comentários de primeiro nível pelo índice (post_id, parent_id,
+  created_at, id), com os autores no mesmo JOIN;
+- as primeiras respostas de todas as threads da página numa única consulta
+  com ROW_NUMBER() OVER (PARTITION BY parent_id ...), pelo índice
+  (parent_id, created_at, id), também com os autores. Ela é pulada quando o
+  contador replies_count diz que nenhum comentário da página tem respostas.
+As duas consultas passam pelo JOIN com o post e pelo mesmo visible_to do
+feed: quem não pode ver o post não vê os seus comentários, e comentários de
+posts excluídos (deleted_at) somem junto com o post, antes mesmo de
+utils/post_purge.py apagá-los.
+
+Os contadores (reactions_count, replies_count) são mantidos junto com as
+linhas; o cliente usa replies_count para saber se há mais respostas a buscar.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from models import Comment, Post
+from schemas import CommentResponse
+from utils.blocks import exclude_hidden
+from utils.feed import decode_cursor, encode_cursor, serialize_author, visible_to
+
+DEFAULT_COMMENT_PAGE_SIZE = 20
+MAX_COMMENT_PAGE_SIZE = 50
+# Respostas mostradas abaixo de cada comentário da página
+REPLIES_PER_THREAD = 3
+MAX_REPLIES_PER_THREAD = 10
+
+def serialize_comment(comment: Comment, replies: Iterable[Comment] = ()) -> CommentResponse:
+    """CommentResponse of a comment whose author (and replies' authors) are already loaded"""
+    return CommentResponse(
+        id=comment.id,
+        content=comment.content,
+        author=serialize_author(comment.author),
+        created_at=comment.created_at,
+        parent_id=comment.parent_id,
+        reactions_count=comment.reactions_count or 0,
+        replies_count=comment.replies_count or 0,
+        replies=[serialize_comment(reply) for reply in replies],
+    )
+
+def after_cursor(cursor: Optional[str]):
+    """Keyset predicate for the comments strictly newer than the cursor (pages go oldest first)"""
+    if not cursor:
+        return None
+    created_at, comment_id = decode_cursor(cursor)
+    return or_(
+        Comment.created_at > created_at,
+        and_(Comment.created_at == created_at, Comment.id > comment_id)
+    )
+
+async def _page(db: AsyncSession, query, cursor: Optional[str], limit: int) -> Tuple[List[Comment], Optional[str]]:
+    query = query.options(joinedload(Comment.author)).order_by(Comment.created_at, Comment.id).limit(limit + 1)
+    keyset = after_cursor(cursor)
+    if keyset is not None:
+        query = query.where(keyset)
+
+    comments = list((await db.execute(query)).scalars().all())
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_cursor(comments[-1].created_at, comments[-1].id)
+    return comments, next_cursor
+
+async def first_replies(db: AsyncSession, parent_ids: List[int], per_thread: int,
+                        hidden_ids: Iterable[int] = ()) -> Dict[int, List[Comment]]:
+    """The first per_thread replies of each parent, in one windowed query"""
+    position = func.row_number().over(
+        partition_by=Comment.parent_id,
+        order_by=(Comment.created_at, Comment.id)
+    ).label("position")
+    # Os bloqueados saem antes da numeração: cada thread ainda mostra per_thread respostas
+    ranked = exclude_hidden(
+        select(Comment.id, position).where(Comment.parent_id.in_(parent_ids)),
+        Comment.author_id, hidden_ids
+    ).subquery()
+
+    result = await db.execute(
+        select(Comment)
+        .options(joinedload(Comment.author))
+        .join(ranked, ranked.c.id == Comment.id)
+        .where(ranked.c.position <= per_thread)
+        .order_by(Comment.parent_id, Comment.created_at, Comment.id)
+    )
+    replies: Dict[int, List[Comment]] = {}
+    for reply in result.scalars().all():
+        replies.setdefault(reply.parent_id, []).append(reply)
+    return replies
+
+async def get_comment_page(
+    db: AsyncSession,
+    post_id: int,
+    viewer_id: int,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_COMMENT_PAGE_SIZE,
+    replies_per_thread: int = REPLIES_PER_THREAD,
+    hidden_ids: Iterable[int] = ()
+) -> Tuple[List[CommentResponse], Optional[str]]:
+    """
+    One page of top-level comments of a post the viewer may see, each with its
+    first replies, and the next cursor
+    """
+    limit = max(1, min(limit, MAX_COMMENT_PAGE_SIZE))
+    replies_per_thread = max(0, min(replies_per_thread, MAX_REPLIES_PER_THREAD))
+
+    query = (
+        select(Comment).join(Post, Post.id == Comment.post_id)
+        .where(Comment.post_id == post_id, Comment.parent_id.is_(None), visible_to(viewer_id))
+    )
+    comments, next_cursor = await _page(db, exclude_hidden(query, Comment.author_id, hidden_ids), cursor, limit)
+
+    threads = [comment.id for comment in comments if comment.replies_count]
+    replies = {}
+    if threads and replies_per_thread:
+        replies = await first_replies(db, threads, replies_per_thread, hidden_ids)
+
+    return [serialize_comment(comment, replies.get(comment.id, ())) for comment in comments], next_cursor
+
+async def get_replies_page(
+    db: AsyncSession,
+    parent_id: int,
+    viewer_id: int,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_COMMENT_PAGE_SIZE,
+    hidden_ids: Iterable[int] = ()
+) -> Tuple[List[CommentResponse], Optional[str]]:
+    """One page of the replies of a comment on a post the viewer may see, oldest first"""
+    limit = max(1, min(limit, MAX_COMMENT_PAGE_SIZE))
+    query = (
+        select(Comment).join(Post, Post.id == Comment.post_id)
+        .where(Comment.parent_id == parent_id, visible_to(viewer_id))
+    )
+    replies, next_cursor = await _page(db, exclude_hidden(query, Comment.author_id, hidden_ids), cursor, limit)
+    return [serialize_comment(reply) for reply in replies], next_cursor
@@ -0,0 +1,127 @@
+"""
+Contadores desnormalizados dos posts (reações, comentários e compartilhamentos)
+e dos comentários (reações e respostas)
+
+Os contadores são atualizados com UPDATE atômico na mesma transação que cria
+ou remove a linha dependente; um job de reconciliação corrige eventuais
+divergências em lotes, com as linhas do lote travadas (SELECT ... FOR UPDATE)
+para não perder incrementos concorrentes. Não dá para recontar num único
+UPDATE correlacionado: replies_count lê a própria tabela comments, o que o
+MySQL não permite num UPDATE.
+"""
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+
+from core.database import SessionLocal
+from models import Post, Reaction, Comment, CommentReaction, Share
+
+RECONCILE_BATCH_SIZE = 500
+
+# Counter column -> (dependent model) used to recount it
+POST_COUNTERS = {
+    "reactions_count": Reaction,
+    "comments_count": Comment,
+    "shares_count": Share,
+}
+
+async def bump_post_counter(db: AsyncSession, post_id: int, counter: str, delta: int = 1):
+    """
+    Atomically add delta to a counter of a post.
+
+    Runs as `UPDATE posts SET x = x + delta` inside the caller's transaction,
+    so it commits (or rolls back) together with the row that caused it.
+    Decrements never take a counter below zero.
+    """
+    await _bump_counter(db, Post, post_id, counter, delta)
+
+async def bump_comment_counter(db: AsyncSession, comment_id: int, counter: str, delta: int = 1):
+    """Same as bump_post_counter for reactions_count / replies_count of a comment"""
+    await _bump_counter(db, Comment, comment_id, counter, delta)
+
+async def _bump_counter(db: AsyncSession, model, row_id: int, counter: str, delta: int):
+    column = getattr(model, counter)
+    stmt = (
+        update(model)
+        .where(model.id == row_id)
+        .values({column: func.coalesce(column, 0) + delta})
+        .execution_options(synchronize_session=False)
+    )
+    if delta < 0:
+        stmt = stmt.where(column >= -delta)
+    await db.execute(stmt)
+
+def reconcile_post_counters(db: Session, batch_size: int = RECONCILE_BATCH_SIZE) -> int:
+    """
+    Recount every post counter in batches of batch_size posts and repair the
+    rows that drifted. Each batch is its own short transaction.
+
+    Returns the number of posts repaired.
+    """
+    recounts = {
+        counter: select(func.count()).where(model.post_id == Post.id).scalar_subquery()
+        for counter, model in POST_COUNTERS.items()
+    }
+    return _reconcile(db, Post, recounts, batch_size)
+
+def reconcile_comment_counters(db: Session, batch_size: int = RECONCILE_BATCH_SIZE) -> int:
+    """Same as reconcile_post_counters for the counters of the comments"""
+    reply = aliased(Comment)
+    recounts = {
+        "reactions_count": select(func.count()).where(CommentReaction.comment_id == Comment.id).scalar_subquery(),
+        "replies_count": select(func.count()).select_from(reply).where(reply.parent_id == Comment.id).scalar_subquery(),
+    }
+    return _reconcile(db, Comment, recounts, batch_size)
+
+def _reconcile(db: Session, model, recounts: dict, batch_size: int) -> int:
+    stored = [getattr(model, counter) for counter in recounts]
+    actual_columns = [recount.label(counter) for counter, recount in recounts.items()]
+
+    repaired = 0
+    last_id = 0
+    while True:
+        # Trava as linhas do lote antes de recontar: um bump concorrente
+        # espera o commit do lote em vez de ser sobrescrito pelo valor
+        # absoluto (e a recontagem, feita depois da trava, já vê as linhas
+        # dependentes de quem fez commit antes)
+        ids = db.execute(
+            select(model.id)
+            .where(model.id > last_id)
+            .order_by(model.id)
+            .limit(batch_size)
+            .with_for_update()
+        ).scalars().all()
+        if not ids:
+            db.commit()
+            break
+        last_id = ids[-1]
+
+        rows = db.execute(
+            select(model.id, *stored, *actual_columns).where(model.id.between(ids[0], last_id))
+        ).all()
+        size = len(recounts)
+        fixes = []
+        for row in rows:
+            current, actual = row[1:1 + size], row[1 + size:]
+            if tuple(current) != tuple(actual):
+                fixes.append({"id": row[0], **dict(zip(recounts, actual))})
+
+        if fixes:
+            db.execute(update(model), fixes)
+            repaired += len(fixes)
+        db.commit()
+
+    return repaired
+
+def run_counter_reconciliation():
+    """Background job entry point"""
+    db = SessionLocal()
+    try:
+        repaired = reconcile_post_counters(db)
+        if repaired:
+            print(f"🔧 Repaired counters of {repaired} posts")
+        repaired = reconcile_comment_counters(db)
+        if repaired:
+            print(f"🔧 Repaired counters of {repaired} comments")
+    finally:
+        db.close()
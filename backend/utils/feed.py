@@ -0,0 +1,136 @@
+"""
+Motor do feed: paginação por cursor (keyset) e carregamento dos autores em lote
+"""
+import base64
+import binascii
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from models import Post, Friendship
+from schemas import PostResponse
+from utils.media import variant_url
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+
+def encode_cursor(created_at: datetime, post_id: int) -> str:
+    """Encode the (created_at, id) keyset position of a post as an opaque cursor"""
+    raw = f"{created_at.isoformat()}|{post_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, post_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(post_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def friend_ids_select(user_id: int):
+    """Select returning the ids of the accepted friends of a user"""
+    return union(
+        select(Friendship.user_high_id).where(
+            Friendship.user_low_id == user_id,
+            Friendship.status == "accepted"
+        ),
+        select(Friendship.user_low_id).where(
+            Friendship.user_high_id == user_id,
+            Friendship.status == "accepted"
+        )
+    )
+
+def visible_to(viewer_id: int):
+    """Filter for the posts a viewer may see according to Post.privacy (never deleted ones)"""
+    return and_(
+        Post.deleted_at.is_(None),
+        or_(
+            Post.author_id == viewer_id,
+            Post.privacy == "public",
+            and_(
+                Post.privacy == "friends",
+                Post.author_id.in_(friend_ids_select(viewer_id))
+            )
+        )
+    )
+
+def before_cursor(cursor: Optional[str]):
+    """Keyset predicate for the rows strictly older than the cursor"""
+    if not cursor:
+        return None
+    created_at, post_id = decode_cursor(cursor)
+    return or_(
+        Post.created_at < created_at,
+        and_(Post.created_at == created_at, Post.id < post_id)
+    )
+
+async def get_feed_page(
+    db: AsyncSession,
+    viewer_id: int,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    hidden_ids: Iterable[int] = ()
+) -> Tuple[List[Post], Optional[str]]:
+    """
+    Return one page of the home feed and the cursor of the next page.
+
+    Authors are joined in the same query, so a page costs a single round trip
+    whatever its size. Posts of hidden_ids (blocked users) are left out.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    query = (
+        select(Post)
+        .options(joinedload(Post.author))
+        .where(visible_to(viewer_id))
+        .order_by(Post.created_at.desc(), Post.id.desc())
+        .limit(limit + 1)
+    )
+    keyset = before_cursor(cursor)
+    if keyset is not None:
+        query = query.where(keyset)
+    if hidden_ids:
+        query = query.where(Post.author_id.not_in(sorted(hidden_ids)))
+
+    posts = list((await db.execute(query)).scalars().all())
+
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        next_cursor = encode_cursor(posts[-1].created_at, posts[-1].id)
+
+    return posts, next_cursor
+
+def serialize_author(user) -> dict:
+    """Compact author representation embedded in posts and comments"""
+    avatar = getattr(user, 'avatar', None)
+    return {
+        "id": user.id,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        # Cards and comments show the avatar small: use the thumbnail when ready
+        "avatar": variant_url(user.avatar_variants, "thumb") or avatar
+    }
+
+def serialize_post(post: Post) -> PostResponse:
+    """Build the PostResponse of a post whose author is already loaded"""
+    return PostResponse(
+        id=post.id,
+        author=serialize_author(post.author),
+        content=post.content,
+        post_type=post.post_type,
+        media_type=post.media_type,
+        media_url=variant_url(post.media_variants, "medium") or post.media_url,
+        media_variants={**post.media_variants, "original": post.media_url} if post.media_variants else None,
+        created_at=post.created_at,
+        reactions_count=post.reactions_count or 0,
+        comments_count=post.comments_count or 0,
+        shares_count=post.shares_count or 0,
+        is_profile_update=post.is_profile_update,
+        is_cover_update=post.is_cover_update
+    )
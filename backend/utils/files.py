@@ -1,19 +1,36 @@
 """
 File handling utilities
+
+Uploads are streamed to disk in UPLOAD_CHUNK_SIZE chunks: the size limit is
+enforced on the bytes actually received (file.size comes from the client),
+the sha256 is computed on the fly, and disk writes run in a worker thread so
+a large upload never blocks the event loop. The file is written to a
+temporary name and renamed into place, so readers never see a partial file.
 """
+import asyncio
+import hashlib
 import os
+import tempfile
 import uuid
+from dataclasses import dataclass
 from pathlib import Path
 from fastapi import HTTPException, UploadFile
-from core.config import UPLOAD_DIR, MAX_FILE_SIZE_MB, MAX_AVATAR_SIZE_MB, MAX_COVER_SIZE_MB
+from core.config import UPLOAD_DIR, UPLOAD_URL_PREFIX, MAX_FILE_SIZE_MB, UPLOAD_CHUNK_SIZE
+
+@dataclass
+class StoredFile:
+    path: str
+    url: str
+    size: int
+    sha256: str
 
 def validate_image_file(file: UploadFile, max_size_mb: int = MAX_FILE_SIZE_MB):
     """Validate uploaded image file"""
     # Validate content type
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
-    
-    # Validate file size
+
+    # Early rejection only; the limit is enforced while streaming
     if file.size and file.size > max_size_mb * 1024 * 1024:
         raise HTTPException(status_code=400, detail=f"Image too large (max {max_size_mb}MB)")
 
@@ -35,79 +52,106 @@ def validate_media_file(file: UploadFile):
     if not file_type:
         raise HTTPException(status_code=400, detail="File type not supported")
 
-    # Validate size (100MB max)
-    if file.size > MAX_FILE_SIZE_MB * 1024 * 1024:
+    # Early rejection only; the limit is enforced while streaming
+    if file.size and file.size > MAX_FILE_SIZE_MB * 1024 * 1024:
         raise HTTPException(status_code=400, detail=f"File too large (max {MAX_FILE_SIZE_MB}MB)")
-    
-    return file_type
 
-async def save_uploaded_file(file: UploadFile, file_type: str, prefix: str = "file") -> tuple[str, str]:
-    """Save uploaded file and return (file_path, file_url)"""
-    # Create directory if it doesn't exist
-    upload_dir = Path(UPLOAD_DIR) / file_type
-    upload_dir.mkdir(parents=True, exist_ok=True)
+    return file_type
 
-    # Generate unique filename
-    file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"{prefix}_{uuid.uuid4()}{file_extension}"
-    file_path = upload_dir / unique_filename
+def _write_chunk(fd: int, hasher, chunk: bytes):
+    # hashlib and os.write release the GIL for large buffers
+    hasher.update(chunk)
+    view = memoryview(chunk)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+def persist(temp_path: str, final_path: Path):
+    """fsync a finished temporary file and atomically move it into place"""
+    fd = os.open(temp_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(temp_path, final_path)
 
-    # Save file
+def _discard(fd: int, temp_path: str):
+    try:
+        os.close(fd)
+    except OSError:
+        pass
     try:
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        os.unlink(temp_path)
+    except FileNotFoundError:
+        pass
+
+async def stream_to_temp(file: UploadFile, directory: Path, max_size_mb: int = MAX_FILE_SIZE_MB) -> StoredFile:
+    """
+    Stream an upload to a temporary file in directory (same filesystem as its
+    final place, so it can be renamed atomically). The caller moves it with
+    persist() or removes it.
+
+    Raises 413 as soon as more than max_size_mb has been received.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    max_bytes = max_size_mb * 1024 * 1024
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(status_code=413, detail=f"File too large (max {max_size_mb}MB)")
+            await asyncio.to_thread(_write_chunk, fd, hasher, chunk)
+
+        await asyncio.to_thread(os.close, fd)
+    except HTTPException:
+        await asyncio.to_thread(_discard, fd, temp_path)
+        raise
     except Exception as e:
+        await asyncio.to_thread(_discard, fd, temp_path)
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
 
-    # Return paths
-    return str(file_path), f"/{UPLOAD_DIR}/{file_type}/{unique_filename}"
-
-async def save_avatar(file: UploadFile, user_id: int) -> str:
-    """Save avatar file and return URL"""
-    validate_image_file(file, MAX_AVATAR_SIZE_MB)
-    
-    upload_dir = Path(UPLOAD_DIR) / "image"
-    upload_dir.mkdir(parents=True, exist_ok=True)
-
-    file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"avatar_{user_id}_{uuid.uuid4()}{file_extension}"
-    file_path = upload_dir / unique_filename
-
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    return StoredFile(path=temp_path, url="", size=size, sha256=hasher.hexdigest())
 
-    return f"/{UPLOAD_DIR}/image/{unique_filename}"
+async def stream_upload(file: UploadFile, subdir: str, filename: str, max_size_mb: int = MAX_FILE_SIZE_MB) -> StoredFile:
+    """Stream an upload to UPLOAD_DIR/subdir/filename and return what was stored"""
+    upload_dir = Path(UPLOAD_DIR) / subdir
+    final_path = upload_dir / filename
 
-async def save_cover_photo(file: UploadFile, user_id: int) -> str:
-    """Save cover photo and return URL"""
-    validate_image_file(file, MAX_COVER_SIZE_MB)
-    
-    upload_dir = Path(UPLOAD_DIR) / "image"
-    upload_dir.mkdir(parents=True, exist_ok=True)
+    stored = await stream_to_temp(file, upload_dir, max_size_mb)
+    await asyncio.to_thread(persist, stored.path, final_path)
+    stored.path = str(final_path)
+    stored.url = f"{UPLOAD_URL_PREFIX}/{subdir}/{filename}"
+    return stored
 
-    file_extension = Path(file.filename).suffix if file.filename else ".jpg"
-    unique_filename = f"cover_{user_id}_{uuid.uuid4()}{file_extension}"
-    file_path = upload_dir / unique_filename
+def file_extension(file: UploadFile, default: str = ".jpg") -> str:
+    return Path(file.filename).suffix if file.filename else default
 
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
-
-    return f"/{UPLOAD_DIR}/image/{unique_filename}"
+async def save_uploaded_file(file: UploadFile, file_type: str, prefix: str = "file") -> tuple[str, str]:
+    """Save uploaded file and return (file_path, file_url)"""
+    unique_filename = f"{prefix}_{uuid.uuid4()}{file_extension(file)}"
+    stored = await stream_upload(file, file_type, unique_filename)
+    return stored.path, stored.url
 
 def ensure_upload_directories():
     """Ensure all upload directories exist"""
     directories = [
         f"{UPLOAD_DIR}/stories",
-        f"{UPLOAD_DIR}/posts", 
+        f"{UPLOAD_DIR}/posts",
         f"{UPLOAD_DIR}/profiles",
         f"{UPLOAD_DIR}/image",
         f"{UPLOAD_DIR}/video",
         f"{UPLOAD_DIR}/audio",
-        f"{UPLOAD_DIR}/document"
+        f"{UPLOAD_DIR}/document",
+        f"{UPLOAD_DIR}/blobs"
     ]
-    
+
     for directory in directories:
         os.makedirs(directory, exist_ok=True)
@@ -0,0 +1,121 @@
+"""
+Grafo de amizades
+
+Os ids dos amigos (aceitos) de cada usuário ficam em cache como um
+array('i') ordenado: 4 bytes por amigo. A partir dele:
+- friends_count é o tamanho do array (O(1));
+- are_friends é uma busca binária no array já carregado de um dos dois, ou
+  uma consulta pelo índice único (user_low_id, user_high_id);
+- amigos em comum e amigos de amigos percorrem só os arrays envolvidos, O(k),
+  com os que faltam carregados numa única consulta.
+
+O cache é invalidado quando uma amizade é aceita ou desfeita; em outros
+workers a mudança aparece em até FRIEND_GRAPH_CACHE_TTL_SECONDS.
+"""
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.cache import TTLCache
+from core.config import FRIEND_GRAPH_CACHE_SIZE, FRIEND_GRAPH_CACHE_TTL_SECONDS
+from models import Friendship
+
+def friendship_pair(a: int, b: int) -> Tuple[int, int]:
+    """Normalized (user_low_id, user_high_id) of a pair of users"""
+    return (a, b) if a < b else (b, a)
+
+def _contains(ids: array, value: int) -> bool:
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+def _adjacency_select(user_ids: Iterable[int]):
+    """(user_id, friend_id) of the accepted friendships of user_ids, one index range per side"""
+    user_ids = list(user_ids)
+    return union_all(
+        select(Friendship.user_low_id, Friendship.user_high_id).where(
+            Friendship.user_low_id.in_(user_ids), Friendship.status == "accepted"
+        ),
+        select(Friendship.user_high_id, Friendship.user_low_id).where(
+            Friendship.user_high_id.in_(user_ids), Friendship.status == "accepted"
+        ),
+    )
+
+class FriendGraph:
+    def __init__(self, maxsize: int = FRIEND_GRAPH_CACHE_SIZE, ttl_seconds: float = FRIEND_GRAPH_CACHE_TTL_SECONDS):
+        self.cache = TTLCache(maxsize, ttl_seconds)
+
+    async def load_many(self, db: AsyncSession, user_ids: Iterable[int]) -> Dict[int, array]:
+        """Friend id arrays of user_ids; the ones not cached are loaded in one query"""
+        found: Dict[int, array] = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            ids = self.cache.get(user_id)
+            if ids is None:
+                missing.append(user_id)
+            else:
+                found[user_id] = ids
+
+        for start in range(0, len(missing), 1000):
+            chunk = missing[start:start + 1000]
+            loaded: Dict[int, list] = {user_id: [] for user_id in chunk}
+            for user_id, friend_id in await db.execute(_adjacency_select(chunk)):
+                loaded[user_id].append(friend_id)
+            for user_id, friend_ids in loaded.items():
+                ids = array("i", sorted(set(friend_ids)))
+                self.cache.set(user_id, ids)
+                found[user_id] = ids
+        return found
+
+    async def friend_ids(self, db: AsyncSession, user_id: int) -> array:
+        """Sorted ids of the accepted friends of user_id"""
+        ids = self.cache.get(user_id)
+        if ids is None:
+            ids = (await self.load_many(db, [user_id]))[user_id]
+        return ids
+
+    async def friends_count(self, db: AsyncSession, user_id: int) -> int:
+        return len(await self.friend_ids(db, user_id))
+
+    async def are_friends(self, db: AsyncSession, a: int, b: int) -> bool:
+        for user_id, other in ((a, b), (b, a)):
+            ids = self.cache.get(user_id)
+            if ids is not None:
+                return _contains(ids, other)
+
+        low, high = friendship_pair(a, b)
+        status = await db.scalar(select(Friendship.status).where(
+            Friendship.user_low_id == low, Friendship.user_high_id == high
+        ))
+        return status == "accepted"
+
+    async def mutual_count(self, db: AsyncSession, a: int, b: int) -> int:
+        adjacency = await self.load_many(db, [a, b])
+        return len(set(adjacency[a]).intersection(adjacency[b]))
+
+    async def mutual_counts(self, db: AsyncSession, user_id: int, others: Iterable[int]) -> Dict[int, int]:
+        """Mutual friends of user_id with each of others"""
+        others = list(others)
+        adjacency = await self.load_many(db, [user_id, *others])
+        mine = set(adjacency[user_id])
+        return {other: len(mine.intersection(adjacency[other])) for other in others}
+
+    async def friends_of_friends(self, db: AsyncSession, user_id: int, limit: Optional[int] = None) -> Dict[int, int]:
+        """Friends of friends (not already friends) -> number of mutual friends, most mutual first"""
+        friend_ids = await self.friend_ids(db, user_id)
+        friends = set(friend_ids)
+        mutual: Dict[int, int] = {}
+        for ids in (await self.load_many(db, friend_ids)).values():
+            for other in ids:
+                if other != user_id and other not in friends:
+                    mutual[other] = mutual.get(other, 0) + 1
+        ranked = sorted(mutual.items(), key=lambda item: (-item[1], item[0]))
+        return dict(ranked[:limit] if limit else ranked)
+
+    def invalidate(self, *user_ids: int):
+        for user_id in user_ids:
+            self.cache.invalidate(user_id)
+
+friend_graph = FriendGraph()
@@ -0,0 +1,145 @@
+"""
+Derivados de imagens: miniaturas e versões WebP/AVIF em tamanhos fixos
+
+Depois do upload, a imagem original é processada em um pool de processos
+(Pillow consome CPU e seguraria o GIL) e os derivados ficam ao lado dela:
+
+    /uploads/blobs/ab/cd/<sha256>.png
+    /uploads/blobs/ab/cd/variants/<sha256>/thumb.webp   (160x160, recortada)
+    /uploads/blobs/ab/cd/variants/<sha256>/small.webp   (até 480px)
+    /uploads/blobs/ab/cd/variants/<sha256>/medium.webp  (até 1080px)
+
+Os derivados pertencem ao conteúdo: ficam em MediaBlob.variants (um reenvio
+da mesma foto os reaproveita) e são copiados para os posts que usam a mídia
+(Post.media_variants) e para o avatar do usuário (User.avatar_variants), assim
+os serializers escolhem a versão adequada sem consultas extras.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import select, update
+
+from core.config import MEDIA_WORKERS, IMAGE_VARIANT_QUALITY
+from core.database import AsyncSessionLocal
+from models import MediaBlob, Post, User
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow ausente: as imagens são servidas só no original
+    Image = None
+
+# name -> (max side in px, square crop)
+IMAGE_VARIANTS = {
+    "thumb": (160, True),
+    "small": (480, False),
+    "medium": (1080, False),
+}
+
+def variants_dir(url: str) -> Path:
+    """Disk directory holding the variants of the media served at url"""
+    original = Path(url.lstrip("/"))
+    return original.parent / "variants" / original.stem
+
+def variant_url(variants: Optional[dict], name: str) -> Optional[str]:
+    """URL of the WebP variant name, or None when it doesn't exist (yet)"""
+    if not variants or name not in variants:
+        return None
+    return variants[name]["url"]
+
+def _save_atomic(image, path: Path, format: str, quality: int):
+    temp_path = path.with_suffix(path.suffix + ".part")
+    image.save(temp_path, format=format, quality=quality)
+    os.replace(temp_path, path)
+
+def _render_variants(url: str, quality: int) -> dict:
+    """Runs in a worker process: write every variant of url and describe them"""
+    output_dir = variants_dir(url)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    base_url = "/" + output_dir.as_posix()
+    with_avif = features.check("avif") if hasattr(features, "check") else False
+
+    variants = {}
+    with Image.open(url.lstrip("/")) as source:
+        animated = getattr(source, "n_frames", 1) > 1
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+        for name, (size, square) in IMAGE_VARIANTS.items():
+            if animated and not square:
+                continue  # GIFs animados: só a miniatura (primeiro quadro)
+            if square:
+                resized = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            else:
+                resized = image.copy()
+                resized.thumbnail((size, size), Image.LANCZOS)
+
+            _save_atomic(resized, output_dir / f"{name}.webp", "WEBP", quality)
+            variant = {
+                "url": f"{base_url}/{name}.webp",
+                "width": resized.width,
+                "height": resized.height,
+            }
+            if with_avif:
+                _save_atomic(resized, output_dir / f"{name}.avif", "AVIF", quality)
+                variant["avif"] = f"{base_url}/{name}.avif"
+            variants[name] = variant
+
+    return variants
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=MEDIA_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+def shutdown_media_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def generate_media_variants(content_hash: str, avatar_user_id: Optional[int] = None):
+    """
+    Background task: render the variants of an uploaded image (unless this
+    content already has them) and record them on the blob, the posts showing
+    it and, for avatars, on the user.
+    """
+    if Image is None:
+        return
+
+    async with AsyncSessionLocal() as db:
+        blob = await db.scalar(select(MediaBlob).where(MediaBlob.content_hash == content_hash))
+        if blob is None or not (blob.mime_type or "").startswith("image/"):
+            return
+
+        url = blob.file_path
+        variants = blob.variants
+        if not variants:
+            try:
+                loop = asyncio.get_running_loop()
+                variants = await loop.run_in_executor(_get_executor(), _render_variants, url, IMAGE_VARIANT_QUALITY)
+            except Exception as e:
+                print(f"⚠️ Could not generate variants for {url}: {e}")
+                return
+            blob.variants = variants
+
+        await db.execute(
+            update(Post)
+            .where(Post.media_url == url)
+            .values(media_variants=variants)
+            .execution_options(synchronize_session=False)
+        )
+        if avatar_user_id is not None:
+            user = await db.get(User, avatar_user_id)
+            if user is not None and user.avatar == url:
+                user.avatar_variants = variants
+        await db.commit()
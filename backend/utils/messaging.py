@@ -0,0 +1,393 @@
+"""
+Mensagens diretas
+
+- conversations guarda uma linha por par de usuários com a última mensagem e
+  as não lidas de cada lado: a lista de conversas é uma leitura por índice,
+  sem GROUP BY sobre messages.
+- O histórico é paginado por (created_at, id) (keyset) dentro da conversa.
+- Envio: o id da mensagem vem de um bloco reservado de antemão (hi/lo), então
+  o frame de WebSocket sai antes de qualquer acesso ao banco; a gravação vem
+  logo depois, numa única transação. Cada worker tem o seu bloco, então o id
+  não segue a ordem de envio entre workers: ordem, páginas e leituras usam
+  sempre (created_at, id), nunca só o id.
+- Confirmações de leitura ficam num buffer que guarda só a mensagem mais nova
+  lida por (leitor, conversa) e é gravado em lote a cada MESSAGE_READ_FLUSH_MS.
+"""
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, case, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.cache import TTLCache
+from core.config import MESSAGE_ID_BLOCK_SIZE, MESSAGE_READ_FLUSH_MS
+from core.database import AsyncSessionLocal
+from core.websockets import manager
+from models import Conversation, IdSequence, Message, User
+from utils.feed import encode_cursor, decode_cursor, serialize_author
+
+PREVIEW_LENGTH = 200
+
+def user_pair(a: int, b: int) -> Tuple[int, int]:
+    return (a, b) if a < b else (b, a)
+
+class IdAllocator:
+    """
+    Hands out ids reserved in blocks of block_size from id_sequences: one
+    database round-trip per block instead of one per row. Ids of a block left
+    unused when the process stops are simply skipped.
+    """
+
+    def __init__(self, name: str, column, block_size: int = MESSAGE_ID_BLOCK_SIZE, session_factory=AsyncSessionLocal):
+        self.name = name
+        self.column = column
+        self.block_size = block_size
+        self.session_factory = session_factory
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def next_id(self) -> int:
+        if self._next >= self._end:
+            async with self._lock:
+                if self._next >= self._end:
+                    self._next, self._end = await self._reserve()
+        value = self._next
+        self._next += 1
+        return value
+
+    async def _reserve(self) -> Tuple[int, int]:
+        async with self.session_factory() as db:
+            query = select(IdSequence).where(IdSequence.name == self.name).with_for_update()
+            sequence = await db.scalar(query)
+            if sequence is None:
+                # Primeiro uso: continua depois das linhas já existentes
+                start = (await db.scalar(select(func.max(self.column))) or 0) + 1
+                await db.execute(
+                    insert(IdSequence).prefix_with("IGNORE", dialect="mysql").values(name=self.name, next_value=start)
+                )
+                sequence = await db.scalar(query)
+            start = sequence.next_value
+            sequence.next_value = start + self.block_size
+            await db.commit()
+        return start, start + self.block_size
+
+message_ids = IdAllocator("messages", Message.id)
+
+# (user_low_id, user_high_id) -> conversation id
+conversation_ids = TTLCache(maxsize=100_000, ttl_seconds=3600)
+
+async def get_conversation_id(db: AsyncSession, user_a: int, user_b: int, create: bool = False) -> Optional[int]:
+    pair = user_pair(user_a, user_b)
+    conversation_id = conversation_ids.get(pair)
+    if conversation_id is not None:
+        return conversation_id
+
+    query = select(Conversation.id).where(Conversation.user_low_id == pair[0], Conversation.user_high_id == pair[1])
+    conversation_id = await db.scalar(query)
+    if conversation_id is None and create:
+        await db.execute(
+            insert(Conversation)
+            .prefix_with("IGNORE", dialect="mysql")
+            .values(user_low_id=pair[0], user_high_id=pair[1], created_at=datetime.utcnow())
+        )
+        conversation_id = await db.scalar(query)
+    if conversation_id is not None:
+        conversation_ids.set(pair, conversation_id)
+    return conversation_id
+
+def message_payload(message_id: int, sender: dict, recipient_id: int, content: Optional[str], message_type: str,
+                    media_url: Optional[str], created_at: datetime, is_read: bool = False,
+                    conversation_id: Optional[int] = None) -> dict:
+    return {
+        "id": message_id,
+        "conversation_id": conversation_id,
+        "sender": sender,
+        "recipient_id": recipient_id,
+        "content": content,
+        "message_type": message_type,
+        "media_url": media_url,
+        "is_read": is_read,
+        "created_at": created_at.isoformat(),
+    }
+
+async def persist_message(db: AsyncSession, message_id: int, sender_id: int, recipient_id: int, content: Optional[str],
+                          message_type: str, media_url: Optional[str], media_metadata: Optional[str],
+                          created_at: datetime) -> int:
+    """Insert the message and update its conversation in one transaction; returns the conversation id"""
+    conversation_id = await get_conversation_id(db, sender_id, recipient_id, create=True)
+    low, _ = user_pair(sender_id, recipient_id)
+    unread = Conversation.unread_high if recipient_id != low else Conversation.unread_low
+    preview = (content or "")[:PREVIEW_LENGTH]
+
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values({unread: unread + 1})
+        .execution_options(synchronize_session=False)
+    )
+    # Outro worker pode gravar uma mensagem mais nova antes desta: a última
+    # mensagem da conversa só anda para frente
+    await db.execute(
+        update(Conversation)
+        .where(
+            Conversation.id == conversation_id,
+            or_(Conversation.last_message_at.is_(None), Conversation.last_message_at <= created_at)
+        )
+        .values({
+            Conversation.last_message_id: message_id,
+            Conversation.last_sender_id: sender_id,
+            Conversation.last_message_preview: preview,
+            Conversation.last_message_type: message_type,
+            Conversation.last_message_at: created_at,
+        })
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(insert(Message).values(
+        id=message_id,
+        conversation_id=conversation_id,
+        sender_id=sender_id,
+        recipient_id=recipient_id,
+        content=content,
+        message_type=message_type,
+        media_url=media_url,
+        media_metadata=media_metadata,
+        is_read=False,
+        created_at=created_at,
+        updated_at=created_at,
+    ))
+    await db.commit()
+    return conversation_id
+
+async def send_direct_message(db: AsyncSession, sender: User, recipient_id: int, content: Optional[str],
+                              message_type: str = "text", media_url: Optional[str] = None,
+                              media_metadata: Optional[str] = None) -> dict:
+    """
+    Deliver a message over WebSockets, then store it. Returns its payload.
+
+    The id comes from a reserved block and the sender from the request, so the
+    recipient gets the frame without waiting for the database.
+    """
+    message_id = await message_ids.next_id()
+    created_at = datetime.utcnow()
+    payload = message_payload(message_id, serialize_author(sender), recipient_id, content, message_type, media_url,
+                              created_at, conversation_id=conversation_ids.get(user_pair(sender.id, recipient_id)))
+    await manager.send_message(recipient_id, payload)
+
+    payload["conversation_id"] = await persist_message(
+        db, message_id, sender.id, recipient_id, content, message_type, media_url, media_metadata, created_at
+    )
+    return payload
+
+def _side(conversation: Conversation, user_id: int) -> str:
+    return "low" if conversation.user_low_id == user_id else "high"
+
+async def list_conversations(db: AsyncSession, user_id: int, cursor: Optional[str] = None,
+                             limit: int = 20) -> Tuple[List[dict], Optional[str]]:
+    """Chats of a user, most recent first, and the cursor of the next page"""
+    def side_query(column):
+        query = (
+            select(Conversation)
+            .where(column == user_id, Conversation.last_message_at.isnot(None))
+            .order_by(Conversation.last_message_at.desc(), Conversation.id.desc())
+            .limit(limit + 1)
+        )
+        if cursor:
+            last_at, conversation_id = decode_cursor(cursor)
+            query = query.where(or_(
+                Conversation.last_message_at < last_at,
+                and_(Conversation.last_message_at == last_at, Conversation.id < conversation_id)
+            ))
+        return query
+
+    # Duas varreduras curtas de índice (o usuário pode estar em qualquer lado do par)
+    conversations = [
+        *(await db.execute(side_query(Conversation.user_low_id))).scalars(),
+        *(await db.execute(side_query(Conversation.user_high_id))).scalars(),
+    ]
+    conversations.sort(key=lambda c: (c.last_message_at, c.id), reverse=True)
+    next_cursor = None
+    if len(conversations) > limit:
+        conversations = conversations[:limit]
+        next_cursor = encode_cursor(conversations[-1].last_message_at, conversations[-1].id)
+
+    peer_ids = [c.user_high_id if _side(c, user_id) == "low" else c.user_low_id for c in conversations]
+    peers = {}
+    if peer_ids:
+        peers = {user.id: user for user in (await db.execute(select(User).where(User.id.in_(peer_ids)))).scalars()}
+
+    items = []
+    for conversation, peer_id in zip(conversations, peer_ids):
+        peer = peers.get(peer_id)
+        if peer is None:
+            continue
+        mine = _side(conversation, user_id)
+        my_unread = conversation.unread_low if mine == "low" else conversation.unread_high
+        peer_unread = conversation.unread_high if mine == "low" else conversation.unread_low
+        is_own = conversation.last_sender_id == user_id
+        items.append({
+            "id": conversation.id,
+            "user": serialize_author(peer),
+            "last_message": {
+                "id": conversation.last_message_id,
+                "content": conversation.last_message_preview,
+                "message_type": conversation.last_message_type,
+                "created_at": conversation.last_message_at,
+                # Última mensagem é sempre a mais nova: lida se o destinatário não tem pendentes
+                "is_read": (peer_unread or 0) == 0 if is_own else (my_unread or 0) == 0,
+                "is_own": is_own,
+            },
+            "unread_count": my_unread or 0,
+        })
+    return items, next_cursor
+
+def before_message(cursor: str):
+    """Keyset predicate for the messages strictly older than the cursor"""
+    created_at, message_id = decode_cursor(cursor)
+    return or_(
+        Message.created_at < created_at,
+        and_(Message.created_at == created_at, Message.id < message_id)
+    )
+
+def at_or_before_message(created_at_param, id_param):
+    """Messages up to (created_at, id), inclusive: the ones a read receipt covers"""
+    return or_(
+        Message.__table__.c.created_at < created_at_param,
+        and_(Message.__table__.c.created_at == created_at_param, Message.__table__.c.id <= id_param)
+    )
+
+async def get_history(db: AsyncSession, user: User, peer: User, cursor: Optional[str] = None,
+                      limit: int = 50) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of a conversation, oldest first, and the cursor of the previous
+    (older) page.
+    """
+    conversation_id = await get_conversation_id(db, user.id, peer.id)
+    if conversation_id is None:
+        return [], None
+
+    query = (
+        select(Message)
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        query = query.where(before_message(cursor))
+    messages = (await db.execute(query)).scalars().all()
+
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = encode_cursor(messages[-1].created_at, messages[-1].id)
+
+    authors = {user.id: serialize_author(user), peer.id: serialize_author(peer)}
+    return [
+        {
+            **message_payload(message.id, authors[message.sender_id], message.recipient_id, message.content,
+                              message.message_type, message.media_url, message.created_at, bool(message.is_read),
+                              conversation_id),
+            "recipient": authors[message.recipient_id],
+            "is_own": message.sender_id == user.id,
+        }
+        for message in reversed(messages)
+    ], next_cursor
+
+class ReadReceiptBuffer:
+    """
+    Read receipts are acknowledged to the sender right away and written in
+    batches: per (reader, conversation) only the newest message read, as
+    (created_at, id), is kept.
+    """
+
+    def __init__(self, flush_ms: int = MESSAGE_READ_FLUSH_MS, session_factory=AsyncSessionLocal):
+        self.interval = flush_ms / 1000
+        self.session_factory = session_factory
+        self.pending: Dict[Tuple[int, int], Tuple[datetime, int]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def mark_read(self, reader_id: int, conversation_id: int, message_id: int, sender_id: int,
+                        created_at: datetime):
+        key = (reader_id, conversation_id)
+        newest = self.pending.get(key)
+        if newest is not None and (created_at, message_id) <= newest:
+            return
+        self.pending[key] = (created_at, message_id)
+        await manager.send_message_read(sender_id, {
+            "message_id": message_id,
+            "conversation_id": conversation_id,
+            "reader_id": reader_id,
+        })
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ Failed to flush read receipts: {e}")
+
+    async def flush(self):
+        """Two executemany UPDATEs for the whole batch, in one transaction"""
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        params = [{"b_reader": reader_id, "b_conversation": conversation_id, "b_at": created_at, "b_max": max_id}
+                  for (reader_id, conversation_id), (created_at, max_id) in batch.items()]
+
+        messages = Message.__table__
+        conversations = Conversation.__table__
+        unread = (
+            select(func.count())
+            .select_from(messages)
+            .where(
+                messages.c.conversation_id == bindparam("b_conversation"),
+                messages.c.recipient_id == bindparam("b_reader"),
+                messages.c.is_read == False
+            )
+            .scalar_subquery()
+        )
+        is_low = conversations.c.user_low_id == bindparam("b_reader")
+        try:
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(messages)
+                    .where(
+                        messages.c.conversation_id == bindparam("b_conversation"),
+                        messages.c.recipient_id == bindparam("b_reader"),
+                        messages.c.is_read == False,
+                        at_or_before_message(bindparam("b_at"), bindparam("b_max"))
+                    )
+                    .values(is_read=True, updated_at=datetime.utcnow()),
+                    params
+                )
+                await db.execute(
+                    update(conversations)
+                    .where(conversations.c.id == bindparam("b_conversation"))
+                    .values(
+                        unread_low=case((is_low, unread), else_=conversations.c.unread_low),
+                        unread_high=case((is_low, conversations.c.unread_high), else_=unread),
+                    ),
+                    params
+                )
+                await db.commit()
+        except Exception:
+            # Devolve o lote para a próxima tentativa, mantendo a leitura mais nova de cada conversa
+            for key, newest in batch.items():
+                if key not in self.pending or newest > self.pending[key]:
+                    self.pending[key] = newest
+            raise
+
+read_receipts = ReadReceiptBuffer()
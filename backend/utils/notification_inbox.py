@@ -0,0 +1,153 @@
+"""
+Caixa de notificações: contador de não lidas, paginação e retenção
+
+O total de não lidas fica desnormalizado em User.unread_notifications_count,
+atualizado na mesma transação que cria, lê ou remove notificações; o badge
+não precisa de COUNT(*). Um job periódico corrige divergências e move para
+notifications_archive, em lotes, as notificações lidas mais antigas que
+NOTIFICATION_RETENTION_DAYS.
+"""
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import and_, bindparam, case, delete, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.config import NOTIFICATION_RETENTION_DAYS, NOTIFICATION_ARCHIVE_BATCH_SIZE
+from core.database import SessionLocal
+from models import Notification, NotificationArchive, User
+from utils.feed import decode_cursor, serialize_author
+
+RECONCILE_BATCH_SIZE = 1000
+# Pausa entre lotes do arquivamento, para não disputar o banco com a API
+ARCHIVE_PAUSE_SECONDS = 0.05
+
+users = User.__table__
+
+def _bump_statement(delta_sign: int):
+    counter = users.c.unread_notifications_count
+    if delta_sign > 0:
+        value = counter + bindparam("b_delta")
+    else:
+        value = case((counter > bindparam("b_delta"), counter - bindparam("b_delta")), else_=0)
+    return update(users).where(users.c.id == bindparam("b_user")).values(unread_notifications_count=value)
+
+async def bump_unread_counts(db: AsyncSession, deltas: Dict[int, int]):
+    """
+    Add deltas (user_id -> change) to the unread counters in the caller's
+    transaction, one executemany per sign. Counters never go below zero.
+    """
+    for sign in (1, -1):
+        params = [{"b_user": user_id, "b_delta": abs(delta)} for user_id, delta in deltas.items() if delta * sign > 0]
+        if params:
+            await db.execute(_bump_statement(sign), params)
+
+def at_or_before_cursor(cursor: str):
+    """Keyset predicate for the notifications at or older than the cursor"""
+    created_at, notification_id = decode_cursor(cursor)
+    return or_(
+        Notification.created_at < created_at,
+        and_(Notification.created_at == created_at, Notification.id <= notification_id)
+    )
+
+def serialize_notification(notification: Notification) -> dict:
+    try:
+        data = json.loads(notification.data) if notification.data else None
+    except ValueError:
+        data = None
+    return {
+        "id": notification.id,
+        "type": notification.notification_type,
+        "notification_type": notification.notification_type,
+        "title": notification.title,
+        "message": notification.message,
+        "data": data,
+        "post_id": notification.post_id,
+        "actor_count": notification.actor_count or 1,
+        "is_read": bool(notification.is_read),
+        "created_at": notification.created_at,
+        "sender": serialize_author(notification.sender) if notification.sender is not None else None,
+    }
+
+def reconcile_unread_counts(db: Session, batch_size: int = RECONCILE_BATCH_SIZE) -> int:
+    """
+    Recount the unread notifications of every user in batches; returns the
+    users repaired. Each batch is one correlated UPDATE, so a concurrent
+    bump_unread_counts either lands before the recount or after it, never
+    in between.
+    """
+    recount = (
+        select(func.count())
+        .where(Notification.recipient_id == users.c.id, Notification.is_read == False)
+        .scalar_subquery()
+    )
+    repaired = 0
+    last_id = 0
+    while True:
+        ids = db.execute(
+            select(User.id).where(User.id > last_id).order_by(User.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        result = db.execute(
+            update(users)
+            .where(users.c.id.between(ids[0], ids[-1]), users.c.unread_notifications_count != recount)
+            .values(unread_notifications_count=recount)
+        )
+        repaired += result.rowcount
+        db.commit()
+        last_id = ids[-1]
+    return repaired
+
+def archive_read_notifications(db: Session, retention_days: int = NOTIFICATION_RETENTION_DAYS,
+                               batch_size: int = NOTIFICATION_ARCHIVE_BATCH_SIZE,
+                               max_batches: Optional[int] = None) -> int:
+    """
+    Move read notifications older than retention_days to notifications_archive,
+    batch_size rows per short transaction. Returns the number archived.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    columns = [column.name for column in NotificationArchive.__table__.columns if column.name != "archived_at"]
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = db.execute(
+            select(Notification.id)
+            .where(Notification.is_read == True, Notification.created_at < cutoff)
+            .order_by(Notification.created_at)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        source = select(*(getattr(Notification, name) for name in columns), func.now()).where(
+            Notification.id.in_(ids), Notification.is_read == True
+        )
+        db.execute(
+            insert(NotificationArchive)
+            .prefix_with("IGNORE", dialect="mysql")
+            .from_select([*columns, "archived_at"], source)
+        )
+        db.execute(delete(Notification).where(Notification.id.in_(ids), Notification.is_read == True))
+        db.commit()
+
+        archived += len(ids)
+        batches += 1
+        time.sleep(ARCHIVE_PAUSE_SECONDS)
+    return archived
+
+def run_notification_maintenance():
+    """Background job entry point"""
+    db = SessionLocal()
+    try:
+        archived = archive_read_notifications(db)
+        if archived:
+            print(f"🗄️ Archived {archived} read notifications")
+        repaired = reconcile_unread_counts(db)
+        if repaired:
+            print(f"🔧 Repaired unread notification counters of {repaired} users")
+    finally:
+        db.close()
@@ -1,227 +1,368 @@
-from sqlalchemy.orm import Session
-from models.notification import Notification
-from routes.notifications import create_notification
-from websocket_manager import manager
+"""
+Pipeline de notificações
+
+As rotas só registram eventos (emit): nada de INSERT nem de frame de
+WebSocket por curtida. Uma task consome a fila em lotes, a cada
+NOTIFICATION_BATCH_WINDOW_MS ou NOTIFICATION_BATCH_MAX eventos, e:
+
+- agrupa curtidas, comentários, compartilhamentos e seguidores por
+  (destinatário, post, tipo): "Ana e outras 37 pessoas curtiram seu post";
+- funde o grupo na notificação ainda não lida do mesmo post/tipo, se houver
+  (travada com SELECT ... FOR UPDATE até o commit: ninguém a marca como lida
+  no meio; todas as fusões num único executemany), ou cria uma nova: um
+  INSERT de várias linhas, com os ids lidos de volta pelo batch_token;
+- soma as notificações novas ao contador de não lidas de cada destinatário;
+- entrega tudo o que o lote gerou para cada destinatário num único frame.
+
+Post viral: milhares de eventos por segundo viram uma linha e um frame por
+janela para o autor.
+"""
 import asyncio
-from typing import Optional
+import json
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, insert, select, tuple_, update
+
+from core.config import NOTIFICATION_BATCH_WINDOW_MS, NOTIFICATION_BATCH_MAX, NOTIFICATION_QUEUE_SIZE
+from core.database import AsyncSessionLocal
+from core.websockets import ConnectionManager, manager
+from models import Notification, User
+from utils.notification_inbox import bump_unread_counts
+
+# type -> (título, mensagem com um autor, mensagem com vários)
+TEMPLATES = {
+    "like": ("Nova curtida!", "{name} curtiu seu post", "{name} e {others} curtiram seu post"),
+    "comment": ("Novo comentário!", "{name} comentou em seu post", "{name} e {others} comentaram em seu post"),
+    "share": ("Post compartilhado!", "{name} compartilhou seu post", "{name} e {others} compartilharam seu post"),
+    "follow": ("Novo seguidor!", "{name} começou a seguir você", "{name} e {others} começaram a seguir você"),
+    "friend_request": ("Nova solicitação de amizade!", "{name} enviou uma solicitação de amizade", None),
+    "friend_accept": ("Solicitação aceita!", "{name} aceitou sua solicitação de amizade", None),
+    "message": ("Nova mensagem!", "{name}: {preview}", None),
+}
+# Tipos agregados por (destinatário, post, tipo)
+AGGREGATED_TYPES = {"like", "comment", "share", "follow"}
+# Autores mais recentes guardados em data["actors"]
+RECENT_ACTORS = 3
+# Linhas por INSERT de várias linhas (o MySQL aceita até 65535 parâmetros)
+INSERT_CHUNK_SIZE = 1000
+# Colunas atualizadas ao fundir um grupo numa notificação não lida
+MERGED_COLUMNS = ("sender_id", "title", "message", "data", "actor_count", "created_at")
+
+notifications = Notification.__table__
+
+# Tabela, não a entidade: executemany e não o "bulk UPDATE" do ORM
+_merge_statement = (
+    update(notifications)
+    .where(notifications.c.id == bindparam("m_id"), notifications.c.is_read == False)
+    .values({column: bindparam(f"m_{column}") for column in MERGED_COLUMNS})
+)
+
+@dataclass
+class NotificationEvent:
+    recipient_id: int
+    sender_id: int
+    notification_type: str
+    post_id: Optional[int] = None
+    sender_name: Optional[str] = None  # carregado no lote quando ausente
+    data: dict = field(default_factory=dict)
+
+@dataclass
+class _Group:
+    recipient_id: int
+    notification_type: str
+    post_id: Optional[int]
+    events: List[NotificationEvent] = field(default_factory=list)
+
+def _others(count: int) -> str:
+    return "outra pessoa" if count == 1 else f"outras {count} pessoas"
+
+def render_message(notification_type: str, name: str, actor_count: int = 1, data: Optional[dict] = None) -> Tuple[str, str]:
+    """(title, message) of a notification"""
+    title, single, many = TEMPLATES[notification_type]
+    if actor_count > 1 and many:
+        return title, many.format(name=name, others=_others(actor_count - 1))
+    preview = (data or {}).get("preview", "")
+    return title, single.format(name=name, preview=preview)
+
+def aggregate(events: List[NotificationEvent]) -> List[_Group]:
+    """Group the events of a batch (self-notifications are dropped)"""
+    groups: Dict[tuple, _Group] = {}
+    for index, event in enumerate(events):
+        if event.recipient_id == event.sender_id:
+            continue
+        if event.notification_type in AGGREGATED_TYPES:
+            key = (event.recipient_id, event.notification_type, event.post_id)
+        else:
+            key = (event.recipient_id, event.notification_type, event.post_id, index)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = _Group(event.recipient_id, event.notification_type, event.post_id)
+        group.events.append(event)
+    return list(groups.values())
+
+def notification_row(group: _Group, name: str, actors: List[dict], actor_count: int, created_at: datetime) -> dict:
+    """Column values of the notification of a group, with the given (most recent first) actors"""
+    latest = group.events[-1]
+    data = {"action": group.notification_type, **latest.data}
+    if group.post_id is not None:
+        data["post_id"] = group.post_id
+    if group.notification_type in AGGREGATED_TYPES:
+        data["actors"] = actors[:RECENT_ACTORS]
+        data["actor_count"] = actor_count
+    title, message = render_message(group.notification_type, name, actor_count, latest.data)
+    return {
+        "recipient_id": group.recipient_id,
+        "sender_id": latest.sender_id,
+        "notification_type": group.notification_type,
+        "title": title,
+        "message": message,
+        "data": json.dumps(data),
+        "post_id": group.post_id,
+        "actor_count": actor_count,
+        "is_read": False,
+        "created_at": created_at,
+    }
+
+class NotificationPipeline:
+    """In-process queue of notification events, flushed in aggregated batches"""
+
+    def __init__(self, window_ms: int = NOTIFICATION_BATCH_WINDOW_MS, max_batch: int = NOTIFICATION_BATCH_MAX,
+                 max_pending: int = NOTIFICATION_QUEUE_SIZE, session_factory=AsyncSessionLocal,
+                 connections: ConnectionManager = manager):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.session_factory = session_factory
+        self.connections = connections
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self.flushed_events = 0
+        self.inserted = 0
+        self.merged = 0
+        self.frames = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def emit(self, event: NotificationEvent) -> bool:
+        """Queue an event; never blocks the request (drops it when the queue is full)"""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the consumer and flush what is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while not self.queue.empty():
+            await self._flush_safely(self._drain(self.max_batch))
+
+    def _drain(self, limit: int) -> List[NotificationEvent]:
+        events = []
+        while len(events) < limit and not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return events
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                batch.extend(self._drain(self.max_batch - len(batch)))
+                remaining = deadline - loop.time()
+                if len(batch) >= self.max_batch or remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush_safely(batch)
+
+    async def _flush_safely(self, events: List[NotificationEvent]):
+        try:
+            await self.flush(events)
+        except Exception as e:
+            print(f"⚠️ Failed to flush {len(events)} notification events: {e}")
+
+    async def flush(self, events: List[NotificationEvent]):
+        """Persist a batch of events and deliver it, one frame per recipient"""
+        self.flushed_events += len(events)
+        groups = aggregate(events)
+        if not groups:
+            return
+        now = datetime.utcnow().replace(microsecond=0)
+
+        async with self.session_factory() as db:
+            # Nomes dos autores que não vieram no evento
+            missing = {e.sender_id for g in groups for e in g.events if e.sender_name is None}
+            names = {}
+            if missing:
+                rows = await db.execute(select(User.id, User.first_name, User.last_name).where(User.id.in_(missing)))
+                names = {row.id: f"{row.first_name} {row.last_name}" for row in rows}
+
+            keys = [(g.recipient_id, g.notification_type, g.post_id) for g in groups
+                    if g.notification_type in AGGREGATED_TYPES and g.post_id is not None]
+            unread: Dict[tuple, Notification] = {}
+            if keys:
+                result = await db.execute(
+                    select(Notification)
+                    .where(
+                        tuple_(Notification.recipient_id, Notification.notification_type, Notification.post_id).in_(keys),
+                        Notification.is_read == False
+                    )
+                    .order_by(Notification.id)
+                    .with_for_update()
+                )
+                for notification in result.scalars():
+                    unread[(notification.recipient_id, notification.notification_type, notification.post_id)] = notification
+            # follow sem post: funde na notificação de seguidores não lida
+            follow_recipients = [g.recipient_id for g in groups if g.notification_type == "follow" and g.post_id is None]
+            if follow_recipients:
+                result = await db.execute(
+                    select(Notification)
+                    .where(
+                        Notification.recipient_id.in_(follow_recipients),
+                        Notification.notification_type == "follow",
+                        Notification.post_id.is_(None),
+                        Notification.is_read == False
+                    )
+                    .order_by(Notification.id)
+                    .with_for_update()
+                )
+                for notification in result.scalars():
+                    unread[(notification.recipient_id, "follow", None)] = notification
+
+            merges, inserts, delivered = [], [], []
+            for group in groups:
+                latest = group.events[-1]
+                name = latest.sender_name or names.get(latest.sender_id, "Alguém")
+                actors = []
+                for event in reversed(group.events):
+                    if event.sender_id not in (actor["id"] for actor in actors):
+                        actors.append({"id": event.sender_id, "name": event.sender_name or names.get(event.sender_id)})
+                existing = unread.get((group.recipient_id, group.notification_type, group.post_id))
+                if existing is None:
+                    row = notification_row(group, name, actors, len(actors), now)
+                    inserts.append(row)
+                    delivered.append((row, name))
+                    continue
+
+                # Só os autores recentes são conhecidos: quem curtiu, descurtiu
+                # e curtiu de novo há mais tempo pode ser contado duas vezes
+                previous = json.loads(existing.data or "{}").get("actors", [])
+                previous_ids = {actor["id"] for actor in previous}
+                batch_ids = {actor["id"] for actor in actors}
+                actor_count = (existing.actor_count or 1) + len(batch_ids - previous_ids)
+                merged_actors = actors + [actor for actor in previous if actor["id"] not in batch_ids]
+                merged = notification_row(group, name, merged_actors, actor_count, now)
+                merged["id"] = existing.id
+                merges.append(merged)
+                delivered.append((merged, name))
+
+            # As linhas fundidas estão travadas desde o SELECT: continuam não lidas
+            if merges:
+                await db.execute(_merge_statement, [
+                    {"m_id": row["id"], **{f"m_{column}": row[column] for column in MERGED_COLUMNS}}
+                    for row in merges
+                ])
+
+            if inserts:
+                batch = uuid.uuid4().hex
+                for position, row in enumerate(inserts):
+                    row["batch_token"] = f"{batch}:{position}"
+                ids = {}
+                for chunk_start in range(0, len(inserts), INSERT_CHUNK_SIZE):
+                    chunk = inserts[chunk_start:chunk_start + INSERT_CHUNK_SIZE]
+                    await db.execute(insert(Notification).values(chunk))
+                    result = await db.execute(
+                        select(Notification.batch_token, Notification.id)
+                        .where(Notification.batch_token.in_([row["batch_token"] for row in chunk]))
+                    )
+                    ids.update(result.all())
+                for row in inserts:
+                    row["id"] = ids[row["batch_token"]]
+                # Fundir numa não lida não muda o total; só as linhas novas contam
+                await bump_unread_counts(db, Counter(row["recipient_id"] for row in inserts))
+            await db.commit()
+
+        self.inserted += len(inserts)
+        self.merged += len(merges)
+
+        frames: Dict[int, list] = defaultdict(list)
+        for row, name in delivered:
+            frames[row["recipient_id"]].append({
+                "id": row["id"],
+                "type": row["notification_type"],
+                "title": row["title"],
+                "message": row["message"],
+                "sender": {"id": row["sender_id"], "name": name},
+                "data": json.loads(row["data"]),
+                "actor_count": row["actor_count"],
+                "created_at": now.isoformat(),
+            })
+        await self.connections.send_batch({
+            recipient_id: json.dumps(
+                {"type": "notification", **items[0]} if len(items) == 1
+                else {"type": "notifications", "notifications": items}
+            )
+            for recipient_id, items in frames.items()
+        })
+        self.frames += len(frames)
+
+notification_pipeline = NotificationPipeline()
 
 class NotificationService:
+    """Entry points used by the routes; each one only queues an event"""
+
     @staticmethod
-    async def send_like_notification(
-        db: Session,
-        post_author_id: int,
-        liker_id: int,
-        liker_name: str,
-        post_id: int
-    ):
+    def send_like_notification(post_author_id: int, liker_id: int, post_id: int, liker_name: Optional[str] = None):
         """Send notification when someone likes a post"""
-        if post_author_id == liker_id:
-            return  # Don't notify yourself
-            
-        notification = create_notification(
-            db=db,
-            recipient_id=post_author_id,
-            sender_id=liker_id,
-            notification_type="like",
-            title="Nova curtida!",
-            message=f"{liker_name} curtiu seu post",
-            data={"post_id": post_id, "action": "like"}
-        )
-        
-        # Send real-time notification
-        await manager.send_notification(post_author_id, {
-            "id": notification.id,
-            "type": "like",
-            "title": notification.title,
-            "message": notification.message,
-            "sender": {"name": liker_name},
-            "data": {"post_id": post_id},
-            "created_at": notification.created_at.isoformat()
-        })
-    
+        notification_pipeline.emit(NotificationEvent(post_author_id, liker_id, "like", post_id, liker_name))
+
     @staticmethod
-    async def send_comment_notification(
-        db: Session,
-        post_author_id: int,
-        commenter_id: int,
-        commenter_name: str,
-        post_id: int,
-        comment_id: int
-    ):
+    def send_comment_notification(post_author_id: int, commenter_id: int, post_id: int, comment_id: int,
+                                  commenter_name: Optional[str] = None):
         """Send notification when someone comments on a post"""
-        if post_author_id == commenter_id:
-            return  # Don't notify yourself
-            
-        notification = create_notification(
-            db=db,
-            recipient_id=post_author_id,
-            sender_id=commenter_id,
-            notification_type="comment",
-            title="Novo comentário!",
-            message=f"{commenter_name} comentou em seu post",
-            data={"post_id": post_id, "comment_id": comment_id, "action": "comment"}
-        )
-        
-        # Send real-time notification
-        await manager.send_notification(post_author_id, {
-            "id": notification.id,
-            "type": "comment",
-            "title": notification.title,
-            "message": notification.message,
-            "sender": {"name": commenter_name},
-            "data": {"post_id": post_id, "comment_id": comment_id},
-            "created_at": notification.created_at.isoformat()
-        })
-    
+        notification_pipeline.emit(NotificationEvent(
+            post_author_id, commenter_id, "comment", post_id, commenter_name, {"comment_id": comment_id}
+        ))
+
     @staticmethod
-    async def send_share_notification(
-        db: Session,
-        post_author_id: int,
-        sharer_id: int,
-        sharer_name: str,
-        post_id: int
-    ):
+    def send_share_notification(post_author_id: int, sharer_id: int, post_id: int, sharer_name: Optional[str] = None):
         """Send notification when someone shares a post"""
-        if post_author_id == sharer_id:
-            return  # Don't notify yourself
-            
-        notification = create_notification(
-            db=db,
-            recipient_id=post_author_id,
-            sender_id=sharer_id,
-            notification_type="share",
-            title="Post compartilhado!",
-            message=f"{sharer_name} compartilhou seu post",
-            data={"post_id": post_id, "action": "share"}
-        )
-        
-        # Send real-time notification
-        await manager.send_notification(post_author_id, {
-            "id": notification.id,
-            "type": "share",
-            "title": notification.title,
-            "message": notification.message,
-            "sender": {"name": sharer_name},
-            "data": {"post_id": post_id},
-            "created_at": notification.created_at.isoformat()
-        })
-    
+        notification_pipeline.emit(NotificationEvent(post_author_id, sharer_id, "share", post_id, sharer_name))
+
     @staticmethod
-    async def send_friend_request_notification(
-        db: Session,
-        recipient_id: int,
-        requester_id: int,
-        requester_name: str
-    ):
+    def send_friend_request_notification(recipient_id: int, requester_id: int, requester_name: Optional[str] = None):
         """Send notification for friend request"""
-        notification = create_notification(
-            db=db,
-            recipient_id=recipient_id,
-            sender_id=requester_id,
-            notification_type="friend_request",
-            title="Nova solicitação de amizade!",
-            message=f"{requester_name} enviou uma solicitação de amizade",
-            data={"action": "friend_request"}
-        )
-        
-        # Send real-time notification
-        await manager.send_notification(recipient_id, {
-            "id": notification.id,
-            "type": "friend_request",
-            "title": notification.title,
-            "message": notification.message,
-            "sender": {"name": requester_name},
-            "data": {"action": "friend_request"},
-            "created_at": notification.created_at.isoformat()
-        })
-    
+        notification_pipeline.emit(NotificationEvent(recipient_id, requester_id, "friend_request", None, requester_name))
+
     @staticmethod
-    async def send_friend_accept_notification(
-        db: Session,
-        recipient_id: int,
-        accepter_id: int,
-        accepter_name: str
-    ):
+    def send_friend_accept_notification(recipient_id: int, accepter_id: int, accepter_name: Optional[str] = None):
         """Send notification when friend request is accepted"""
-        notification = create_notification(
-            db=db,
-            recipient_id=recipient_id,
-            sender_id=accepter_id,
-            notification_type="friend_accept",
-            title="Solicitação aceita!",
-            message=f"{accepter_name} aceitou sua solicitação de amizade",
-            data={"action": "friend_accept"}
-        )
-        
-        # Send real-time notification
-        await manager.send_notification(recipient_id, {
-            "id": notification.id,
-            "type": "friend_accept",
-            "title": notification.title,
-            "message": notification.message,
-            "sender": {"name": accepter_name},
-            "data": {"action": "friend_accept"},
-            "created_at": notification.created_at.isoformat()
-        })
-    
+        notification_pipeline.emit(NotificationEvent(recipient_id, accepter_id, "friend_accept", None, accepter_name))
+
     @staticmethod
-    async def send_follow_notification(
-        db: Session,
-        recipient_id: int,
-        follower_id: int,
-        follower_name: str
-    ):
+    def send_follow_notification(recipient_id: int, follower_id: int, follower_name: Optional[str] = None):
         """Send notification when someone follows you"""
-        notification = create_notification(
-            db=db,
-            recipient_id=recipient_id,
-            sender_id=follower_id,
-            notification_type="follow",
-            title="Novo seguidor!",
-            message=f"{follower_name} começou a seguir você",
-            data={"action": "follow"}
-        )
-        
-        # Send real-time notification
-        await manager.send_notification(recipient_id, {
-            "id": notification.id,
-            "type": "follow",
-            "title": notification.title,
-            "message": notification.message,
-            "sender": {"name": follower_name},
-            "data": {"action": "follow"},
-            "created_at": notification.created_at.isoformat()
-        })
-    
+        notification_pipeline.emit(NotificationEvent(recipient_id, follower_id, "follow", None, follower_name))
+
     @staticmethod
-    async def send_message_notification(
-        db: Session,
-        recipient_id: int,
-        sender_id: int,
-        sender_name: str,
-        message_preview: str
-    ):
+    def send_message_notification(recipient_id: int, sender_id: int, message_preview: str, sender_name: Optional[str] = None):
         """Send notification for new message"""
-        notification = create_notification(
-            db=db,
-            recipient_id=recipient_id,
-            sender_id=sender_id,
-            notification_type="message",
-            title="Nova mensagem!",
-            message=f"{sender_name}: {message_preview[:50]}{'...' if len(message_preview) > 50 else ''}",
-            data={"action": "message"}
-        )
-        
-        # Send real-time notification
-        await manager.send_notification(recipient_id, {
-            "id": notification.id,
-            "type": "message",
-            "title": notification.title,
-            "message": notification.message,
-            "sender": {"name": sender_name},
-            "data": {"action": "message"},
-            "created_at": notification.created_at.isoformat()
-        })
+        preview = f"{message_preview[:50]}{'...' if len(message_preview) > 50 else ''}"
+        notification_pipeline.emit(NotificationEvent(recipient_id, sender_id, "message", None, sender_name, {"preview": preview}))
 
 # Create instance
-notification_service = NotificationService()
\ No newline at end of file
+notification_service = NotificationService()
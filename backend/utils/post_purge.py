@@ -0,0 +1,115 @@
+"""
+Limpeza dos posts excluídos
+
+DELETE /posts/{id} só grava posts.deleted_at, um UPDATE de uma linha: o post
+some na hora de todas as leituras (feed, perfil, comentários...), que filtram
+deleted_at IS NULL. Um post viral pode ter centenas de milhares de
+comentários, reações e notificações, e apagá-los na requisição seguraria
+locks por segundos. Este job apaga os dependentes de cada post excluído em
+lotes de POST_PURGE_CHUNK_SIZE linhas, cada lote na sua própria transação
+curta e com uma pausa entre eles, e por fim a mídia e a linha do post.
+
+Ordem (respeita as chaves estrangeiras): reações de comentários, respostas,
+comentários, reações, compartilhamentos, notificações (descontando as não
+lidas do badge), notificações arquivadas, as entradas do post nas timelines
+(utils/timeline.py) e, numa última transação, a mídia e o post. Cada passo
+é idempotente: se o job parar no meio, a próxima execução continua de onde
+parou.
+"""
+import asyncio
+from typing import Dict
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import POST_PURGE_CHUNK_SIZE
+from core.database import AsyncSessionLocal
+from models import Comment, CommentReaction, Notification, NotificationArchive, Post, Reaction, Share
+from utils.blob_store import release_post_media
+from utils.notification_inbox import bump_unread_counts
+from utils.timeline import remove_from_timelines
+
+# Pausa entre lotes, para não disputar o banco com a API
+PURGE_PAUSE_SECONDS = 0.05
+# Posts excluídos tratados por execução do job
+PURGE_POSTS_PER_RUN = 100
+
+async def _delete_in_chunks(db: AsyncSession, model, where, chunk_size: int) -> int:
+    """Delete the rows of model matching where, chunk_size rows per transaction"""
+    deleted = 0
+    while True:
+        ids = (await db.execute(select(model.id).where(*where).limit(chunk_size))).scalars().all()
+        if not ids:
+            return deleted
+        await db.execute(
+            delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        deleted += len(ids)
+        await asyncio.sleep(PURGE_PAUSE_SECONDS)
+
+async def _delete_notifications(db: AsyncSession, post_id: int, chunk_size: int) -> int:
+    """Delete the notifications of a post in chunks, taking the unread ones off the badge counters"""
+    deleted = 0
+    while True:
+        rows = (await db.execute(
+            select(Notification.id, Notification.recipient_id, Notification.is_read)
+            .where(Notification.post_id == post_id)
+            .limit(chunk_size)
+        )).all()
+        if not rows:
+            return deleted
+
+        # Uma lida entre o SELECT e o DELETE fica para reconcile_unread_counts
+        unread: Dict[int, int] = {}
+        for _, recipient_id, is_read in rows:
+            if not is_read:
+                unread[recipient_id] = unread.get(recipient_id, 0) - 1
+        await db.execute(
+            delete(Notification)
+            .where(Notification.id.in_([row.id for row in rows]))
+            .execution_options(synchronize_session=False)
+        )
+        await bump_unread_counts(db, unread)
+        await db.commit()
+        deleted += len(rows)
+        await asyncio.sleep(PURGE_PAUSE_SECONDS)
+
+async def purge_post(db: AsyncSession, post_id: int, chunk_size: int = POST_PURGE_CHUNK_SIZE) -> int:
+    """Delete everything that hangs off a deleted post, then the post itself; returns the rows removed"""
+    comments_of_post = select(Comment.id).where(Comment.post_id == post_id)
+    removed = await _delete_in_chunks(db, CommentReaction, [CommentReaction.comment_id.in_(comments_of_post)], chunk_size)
+    # Respostas antes dos comentários a que respondem (chave estrangeira parent_id)
+    removed += await _delete_in_chunks(db, Comment, [Comment.post_id == post_id, Comment.parent_id.isnot(None)], chunk_size)
+    removed += await _delete_in_chunks(db, Comment, [Comment.post_id == post_id], chunk_size)
+    removed += await _delete_in_chunks(db, Reaction, [Reaction.post_id == post_id], chunk_size)
+    removed += await _delete_in_chunks(db, Share, [Share.post_id == post_id], chunk_size)
+    removed += await _delete_notifications(db, post_id, chunk_size)
+    removed += await _delete_in_chunks(db, NotificationArchive, [NotificationArchive.post_id == post_id], chunk_size)
+
+    post = await db.get(Post, post_id)
+    if post is not None:
+        await asyncio.to_thread(remove_from_timelines, post_id, post.author_id)
+        await release_post_media(db, post)
+        await db.delete(post)
+        await db.commit()
+        removed += 1
+    return removed
+
+async def purge_deleted_posts(db: AsyncSession, max_posts: int = PURGE_POSTS_PER_RUN,
+                              chunk_size: int = POST_PURGE_CHUNK_SIZE) -> int:
+    """Purge up to max_posts deleted posts, oldest deletion first; returns the posts purged"""
+    post_ids = (await db.execute(
+        select(Post.id).where(Post.deleted_at.isnot(None)).order_by(Post.deleted_at).limit(max_posts)
+    )).scalars().all()
+    await db.commit()
+    for post_id in post_ids:
+        await purge_post(db, post_id, chunk_size)
+    return len(post_ids)
+
+async def run_post_purge(session_factory=AsyncSessionLocal):
+    """Background job entry point"""
+    async with session_factory() as db:
+        purged = await purge_deleted_posts(db)
+        if purged:
+            print(f"🧹 Purged {purged} deleted posts")
@@ -0,0 +1,269 @@
+"""
+Índice de busca de usuários em memória (prefixo, sem acentos)
+
+Substitui o `ILIKE '%termo%'`, que não usa índice e varre a tabela users a
+cada tecla digitada. Cada processo mantém:
+
+- os tokens normalizados de cada usuário ativo (nome, sobrenome, username),
+  em minúsculas e sem acentos ("João" -> "joao");
+- um dicionário token -> ids e a lista ordenada dos tokens, onde a busca por
+  prefixo é um intervalo encontrado com bisect.
+
+O índice é reconstruído em segundo plano periodicamente e atualizado pelos
+eventos do ORM quando este processo grava em User, só depois do commit (um
+rollback não deixa nomes no índice). Buscas com "@" vão direto ao índice
+único de email com LIKE 'termo%'.
+"""
+import bisect
+import heapq
+import itertools
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from core.database import SessionLocal
+from models.user import User
+
+# Candidates read from the prefix index per query; friends and friends of
+# friends are always considered in full, whatever this limit
+MAX_CANDIDATES = 2000
+
+# Alterações em User ainda não confirmadas, em session.info
+PENDING_KEY = "search_index_pending"
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase and strip accents: 'Conceição' -> 'conceicao'"""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+def tokenize(*fields: Optional[str]) -> Tuple[str, ...]:
+    tokens = []
+    for field in fields:
+        for token in normalize(field).replace(".", " ").replace("_", " ").replace("-", " ").split():
+            if token not in tokens:
+                tokens.append(token)
+    return tuple(tokens)
+
+def user_tokens(user) -> Tuple[str, ...]:
+    tokens = tokenize(user.first_name, user.last_name)
+    username = normalize(user.username)
+    if username and username not in tokens:
+        tokens += (username,)
+    return tokens
+
+def _document(tokens: Tuple[str, ...]) -> str:
+    # " joao silva joaosilva ": a term is a token prefix iff " term" occurs in
+    # it, and a whole token iff " term " does, both plain substring searches
+    return f" {' '.join(tokens)} "
+
+class UserSearchIndex:
+    """Prefix index over the names of the active users"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # user id -> normalized tokens as a _document (one str per user)
+        self._docs: Dict[int, str] = {}
+        # token -> user id, or set of ids when shared (most tokens are unique)
+        self._postings: Dict[str, Union[int, Set[int]]] = {}
+        # sorted distinct tokens; stale ones are dropped on the next rebuild
+        self._tokens: List[str] = []
+        self.ready = False
+
+    def __len__(self):
+        return len(self._docs)
+
+    # --- Escrita -----------------------------------------------------------
+
+    def build(self, rows: Iterable[Tuple[int, Tuple[str, ...]]]):
+        """Replace the whole index with (user id, tokens) rows"""
+        docs: Dict[int, str] = {}
+        postings: Dict[str, Union[int, Set[int]]] = {}
+        for user_id, tokens in rows:
+            docs[user_id] = _document(tokens)
+            for token in tokens:
+                _add_posting(postings, token, user_id)
+        tokens = sorted(postings)
+
+        with self._lock:
+            self._docs, self._postings, self._tokens = docs, postings, tokens
+            self.ready = True
+
+    def upsert(self, user_id: int, tokens: Tuple[str, ...]):
+        doc = _document(tokens)
+        with self._lock:
+            if self._docs.get(user_id) == doc:
+                return
+            self._remove_locked(user_id)
+            self._docs[user_id] = doc
+            for token in tokens:
+                if token not in self._postings:
+                    bisect.insort(self._tokens, token)
+                _add_posting(self._postings, token, user_id)
+
+    def remove(self, user_id: int):
+        with self._lock:
+            self._remove_locked(user_id)
+
+    def _remove_locked(self, user_id: int):
+        doc = self._docs.pop(user_id, None)
+        if doc is None:
+            return
+        for token in doc.split():
+            posting = self._postings.get(token)
+            if isinstance(posting, set):
+                posting.discard(user_id)
+                if len(posting) == 1:
+                    self._postings[token] = next(iter(posting))
+            elif posting == user_id:
+                del self._postings[token]
+
+    # --- Leitura -----------------------------------------------------------
+
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """Positions [start, end) of the tokens starting with prefix"""
+        start = bisect.bisect_left(self._tokens, prefix)
+        # First string after every one starting with prefix: "joa" -> "job"
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return start, bisect.bisect_left(self._tokens, upper, start)
+
+    def _prefix_ids(self, start: int, end: int, limit: int) -> List[int]:
+        """Up to limit ids of the tokens at positions [start, end)"""
+        ids: List[int] = []
+        for position in range(start, end):
+            if len(ids) >= limit:
+                break
+            posting = self._postings.get(self._tokens[position])
+            if isinstance(posting, set):
+                ids.extend(itertools.islice(posting, limit - len(ids)))
+            elif posting is not None:
+                ids.append(posting)
+        return ids
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        exclude_id: Optional[int] = None,
+        exclude_ids: Iterable[int] = (),
+        friend_ids: Iterable[int] = (),
+        second_degree: Optional[Dict[int, int]] = None,
+    ) -> List[int]:
+        """
+        Return up to limit user ids matching every term of query as a prefix.
+
+        Ranking: friends, then friends of friends (by mutual friends), then
+        everyone else; ties favour exact token matches, then shorter names.
+        Friends and friends of friends are all checked; everyone else comes
+        from at most MAX_CANDIDATES ids of the most selective term, so the
+        work per query is bounded (call it off the event loop: it is CPU
+        bound and holds the index lock).
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        prefixes = [f" {term}" for term in terms]
+        whole = [f" {term} " for term in terms]
+        second_degree = second_degree or {}
+        friends = set(friend_ids)
+        excluded = set(exclude_ids)
+        excluded.add(exclude_id)
+
+        with self._lock:
+            candidates: Set[int] = set(friends)
+            candidates.update(second_degree)
+            # The term with the narrowest token range is the most selective one
+            ranges = [self._prefix_range(term) for term in terms]
+            candidates.update(self._prefix_ids(*min(ranges, key=lambda r: r[1] - r[0]), MAX_CANDIDATES))
+            candidates.difference_update(excluded)
+
+            docs = self._docs
+            ranked = []
+            for user_id in candidates:
+                doc = docs.get(user_id)
+                if doc is None or not all(prefix in doc for prefix in prefixes):
+                    continue
+                if user_id in friends:
+                    proximity = (0, 0)
+                elif user_id in second_degree:
+                    proximity = (1, -second_degree[user_id])
+                else:
+                    proximity = (2, 0)
+                exact = sum(1 for term in whole if term in doc)
+                ranked.append((proximity, -exact, len(doc), user_id))
+
+        return [row[-1] for row in heapq.nsmallest(limit, ranked)]
+
+def _add_posting(postings: Dict[str, Union[int, Set[int]]], token: str, user_id: int):
+    posting = postings.get(token)
+    if posting is None:
+        postings[token] = user_id
+    elif isinstance(posting, set):
+        posting.add(user_id)
+    elif posting != user_id:
+        postings[token] = {posting, user_id}
+
+search_index = UserSearchIndex()
+
+def rebuild_search_index(batch_size: int = 10000):
+    """Rebuild the index from the users table (runs in a worker thread)"""
+    def rows(db: Session):
+        last_id = 0
+        while True:
+            batch = db.execute(
+                select(User.id, User.first_name, User.last_name, User.username)
+                .where(User.is_active == True, User.id > last_id)
+                .order_by(User.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                return
+            last_id = batch[-1].id
+            for row in batch:
+                yield row.id, user_tokens(row)
+
+    db = SessionLocal()
+    try:
+        search_index.build(rows(db))
+        print(f"🔎 Índice de busca pronto: {len(search_index)} usuários")
+    except Exception as e:
+        print(f"⚠️ Erro ao construir índice de busca: {e}")
+    finally:
+        db.close()
+
+def _pending(target) -> Optional[Dict[int, Optional[Tuple[str, ...]]]]:
+    session = object_session(target)
+    if session is None:
+        return None
+    return session.info.setdefault(PENDING_KEY, {})
+
+# Na hora do flush só anota (user id -> tokens, ou None para remover): os
+# tokens são lidos agora, antes que o commit expire os atributos
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+def _index_user(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending[target.id] = None if target.is_active is False else user_tokens(target)
+
+@event.listens_for(User, "after_delete")
+def _unindex_user(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending[target.id] = None
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    for user_id, tokens in session.info.pop(PENDING_KEY, {}).items():
+        if tokens is None:
+            search_index.remove(user_id)
+        else:
+            search_index.upsert(user_id, tokens)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session, previous_transaction):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,162 @@
+"""
+Stories: bandeja de stories ativos, ETag e arquivamento
+
+- A bandeja (stories ativos dos amigos e do próprio usuário) sai de uma única
+  consulta pelo índice (author_id, expires_at), já ordenada por autor; amigos
+  com story_visibility "private" ficam de fora, como em GET /stories/user/{id}.
+- A bandeja de cada usuário fica em cache por STORY_TRAY_CACHE_SECONDS (ou até
+  o primeiro story dela expirar) junto com sua ETag: o polling de 60 s do
+  frontend costuma receber 304 sem nenhum acesso ao banco.
+- Um job periódico marca como arquivados, em lotes, os stories expirados,
+  pelo índice (archived, expires_at), sem varrer a tabela.
+"""
+import hashlib
+import time
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+
+from core.cache import TTLCache
+from core.config import STORY_TRAY_CACHE_SECONDS, STORY_ARCHIVE_BATCH_SIZE
+from core.database import SessionLocal
+from models import Story, User
+from utils.blocks import block_list
+from utils.feed import serialize_author
+from utils.friend_graph import friend_graph
+
+# viewer_id -> (etag, stories, valid until)
+tray_cache = TTLCache(maxsize=50_000, ttl_seconds=STORY_TRAY_CACHE_SECONDS)
+# story_id -> (author_id, expires_at): registrar uma visualização não consulta o banco
+story_meta_cache = TTLCache(maxsize=100_000, ttl_seconds=600)
+
+def active_stories_query(author_ids: Iterable[int], now: Optional[datetime] = None, viewer_id: Optional[int] = None):
+    """
+    Active stories of author_ids, grouped by author and oldest first within
+    each. With viewer_id, authors other than the viewer whose stories are
+    private are left out (author_ids must then be the viewer's friends).
+    """
+    query = (
+        select(Story)
+        .options(joinedload(Story.author))
+        .where(
+            Story.author_id.in_(list(author_ids)),
+            Story.expires_at > (now or datetime.utcnow()),
+            Story.archived == False
+        )
+        .order_by(Story.author_id, Story.created_at)
+    )
+    if viewer_id is not None:
+        query = query.join(User, User.id == Story.author_id).where(or_(
+            Story.author_id == viewer_id,
+            func.coalesce(User.story_visibility, "public") != "private"
+        ))
+    return query
+
+def serialize_story(story: Story) -> dict:
+    return {
+        "id": story.id,
+        "author": serialize_author(story.author),
+        "content": story.content,
+        "media_type": story.media_type,
+        "media_url": story.media_url,
+        "background_color": story.background_color,
+        "max_duration_seconds": story.max_duration_seconds,
+        "created_at": story.created_at,
+        "expires_at": story.expires_at,
+        "views_count": story.views_count or 0,
+    }
+
+def stories_etag(stories: List[dict]) -> str:
+    """Strong ETag of a list of serialized stories (ids, expiry and view counts)"""
+    digest = hashlib.sha1()
+    for story in stories:
+        digest.update(f"{story['id']}:{story['expires_at'].isoformat()}:{story['views_count']};".encode())
+    return f'"{digest.hexdigest()}"'
+
+async def load_stories(db: AsyncSession, author_ids: Iterable[int],
+                       viewer_id: Optional[int] = None) -> Tuple[str, List[dict], float]:
+    """Active stories of author_ids as (etag, stories, epoch second the list stops being valid)"""
+    now = datetime.utcnow()
+    query = active_stories_query(author_ids, now, viewer_id)
+    stories = [serialize_story(story) for story in (await db.execute(query)).scalars()]
+    valid_until = time.time() + STORY_TRAY_CACHE_SECONDS
+    if stories:
+        first_expiry = min(story["expires_at"] for story in stories)
+        valid_until = min(valid_until, time.time() + (first_expiry - now).total_seconds())
+    return stories_etag(stories), stories, valid_until
+
+def cached_tray(viewer_id: int) -> Optional[Tuple[str, List[dict]]]:
+    entry = tray_cache.get(viewer_id)
+    if entry is None or entry[2] <= time.time():
+        return None
+    return entry[0], entry[1]
+
+async def load_tray(db: AsyncSession, viewer_id: int) -> Tuple[str, List[dict]]:
+    """(etag, stories) of the tray of viewer_id: its own stories and those its (not blocked) friends let it see"""
+    cached = cached_tray(viewer_id)
+    if cached is not None:
+        return cached
+
+    author_ids = set(await friend_graph.friend_ids(db, viewer_id))
+    author_ids.difference_update(await block_list.hidden_ids(db, viewer_id))
+    author_ids.add(viewer_id)
+    etag, stories, valid_until = await load_stories(db, author_ids, viewer_id)
+    tray_cache.set(viewer_id, (etag, stories, valid_until))
+    return etag, stories
+
+async def get_story_meta(db: AsyncSession, story_id: int) -> Optional[Tuple[int, datetime]]:
+    """(author_id, expires_at) of a story, or None when it does not exist"""
+    meta = story_meta_cache.get(story_id)
+    if meta is None:
+        row = (await db.execute(select(Story.author_id, Story.expires_at).where(Story.id == story_id))).first()
+        if row is None:
+            return None
+        meta = (row.author_id, row.expires_at)
+        story_meta_cache.set(story_id, meta)
+    return meta
+
+def invalidate_tray(user_id: int):
+    """Drop the cached tray of user_id (friends' trays refresh within the cache TTL)"""
+    tray_cache.invalidate(user_id)
+
+async def invalidate_author_trays(db: AsyncSession, author_id: int):
+    """Drop the cached trays that may show the stories of author_id: their own and their friends'"""
+    tray_cache.invalidate(author_id)
+    for friend_id in await friend_graph.friend_ids(db, author_id):
+        tray_cache.invalidate(friend_id)
+
+def archive_expired_stories(db: Session, batch_size: int = STORY_ARCHIVE_BATCH_SIZE) -> int:
+    """Mark expired stories as archived, batch_size per short transaction; returns the number archived"""
+    archived = 0
+    while True:
+        now = datetime.utcnow()
+        ids = db.execute(
+            select(Story.id)
+            .where(Story.archived == False, Story.expires_at <= now)
+            .order_by(Story.expires_at)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        db.execute(
+            update(Story)
+            .where(Story.id.in_(ids), Story.archived == False)
+            .values(archived=True, archived_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        archived += len(ids)
+    return archived
+
+def run_story_archival():
+    """Background job entry point"""
+    db = SessionLocal()
+    try:
+        archived = archive_expired_stories(db)
+        if archived:
+            print(f"🗄️ Archived {archived} expired stories")
+    finally:
+        db.close()
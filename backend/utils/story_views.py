@@ -0,0 +1,167 @@
+"""
+Visualizações de stories com gravação atrasada (write-behind)
+
+Um story popular recebe milhares de visualizações por minuto; um INSERT em
+story_views e um UPDATE em stories.views_count por visualização fariam da
+linha do story um ponto de contenção. O StoryViewRecorder:
+- descarta repetições de (story, viewer) num conjunto LRU limitado em memória
+  (o índice único uq_story_views_story_viewer continua sendo a garantia);
+- a cada STORY_VIEW_FLUSH_MS grava as visualizações pendentes com INSERT
+  IGNORE em lote, um por story, e soma em views_count só as linhas que
+  entraram de fato, num único executemany;
+- completa a lista de quem viu (para o autor) com as visualizações ainda
+  pendentes, então ela não fica atrás do banco.
+"""
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, insert, select, update
+
+from core.config import STORY_VIEW_FLUSH_MS, STORY_VIEW_DEDUPE_SIZE, STORY_VIEW_MAX_PENDING
+from core.database import AsyncSessionLocal
+from models import Story, StoryView
+
+class BoundedSet:
+    """Set that forgets its least recently added members beyond maxsize"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[tuple, None]" = OrderedDict()
+
+    def add(self, key: tuple) -> bool:
+        """Add key; False when it was already present"""
+        if key in self._data:
+            self._data.move_to_end(key)
+            return False
+        self._data[key] = None
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return True
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+# Linhas por INSERT IGNORE (stories muito vistos geram vários)
+INSERT_CHUNK_SIZE = 1000
+
+class StoryViewRecorder:
+    """Deduplicates story views in memory and writes them in periodic batches"""
+
+    def __init__(self, flush_ms: int = STORY_VIEW_FLUSH_MS, dedupe_size: int = STORY_VIEW_DEDUPE_SIZE,
+                 max_pending: int = STORY_VIEW_MAX_PENDING, session_factory=AsyncSessionLocal):
+        self.interval = flush_ms / 1000
+        self.max_pending = max_pending
+        self.session_factory = session_factory
+        self.seen = BoundedSet(dedupe_size)
+        # story_id -> {viewer_id: viewed_at}
+        self.pending: Dict[int, Dict[int, datetime]] = {}
+        self.pending_count = 0
+        self.recorded = 0
+        self.duplicates = 0
+        self._task: Optional[asyncio.Task] = None
+        self._flush_now = asyncio.Event()
+
+    def record(self, story_id: int, viewer_id: int) -> bool:
+        """Register a view without touching the database; False for a repeated view"""
+        if not self.seen.add((story_id, viewer_id)):
+            self.duplicates += 1
+            return False
+        self.pending.setdefault(story_id, {})[viewer_id] = datetime.utcnow()
+        self.pending_count += 1
+        if self.pending_count >= self.max_pending:
+            self._flush_now.set()
+        return True
+
+    def pending_viewers(self, story_id: int) -> Dict[int, datetime]:
+        return dict(self.pending.get(story_id, {}))
+
+    def discard(self, story_id: int):
+        """Forget the pending views of a deleted story"""
+        self.pending_count -= len(self.pending.pop(story_id, {}))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ Failed to flush story views: {e}")
+
+    async def flush(self) -> int:
+        """Write the pending views; returns the number of new rows"""
+        if not self.pending:
+            return 0
+        batch, self.pending, self.pending_count = self.pending, {}, 0
+
+        deltas: List[dict] = []
+        try:
+            async with self.session_factory() as db:
+                for story_id, viewers in batch.items():
+                    rows = [{"story_id": story_id, "viewer_id": viewer_id, "viewed_at": viewed_at}
+                            for viewer_id, viewed_at in viewers.items()]
+                    added = 0
+                    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+                        result = await db.execute(
+                            insert(StoryView)
+                            .prefix_with("IGNORE", dialect="mysql")
+                            .prefix_with("OR IGNORE", dialect="sqlite")
+                            .values(rows[start:start + INSERT_CHUNK_SIZE])
+                        )
+                        added += result.rowcount
+                    if added:
+                        deltas.append({"b_story": story_id, "b_delta": added})
+                if deltas:
+                    stories = Story.__table__
+                    await db.execute(
+                        update(stories)
+                        .where(stories.c.id == bindparam("b_story"))
+                        .values(views_count=stories.c.views_count + bindparam("b_delta")),
+                        deltas
+                    )
+                await db.commit()
+        except Exception:
+            # Devolve o lote: o INSERT IGNORE torna a nova tentativa segura
+            for story_id, viewers in batch.items():
+                for viewer_id, viewed_at in viewers.items():
+                    self.pending.setdefault(story_id, {}).setdefault(viewer_id, viewed_at)
+            self.pending_count = sum(len(viewers) for viewers in self.pending.values())
+            raise
+
+        inserted = sum(delta["b_delta"] for delta in deltas)
+        self.recorded += inserted
+        return inserted
+
+async def list_viewers(db, recorder: StoryViewRecorder, story_id: int, limit: int = 500) -> List[Tuple[int, datetime]]:
+    """(viewer_id, viewed_at) of a story, newest first, including views not yet written"""
+    rows = (await db.execute(
+        select(StoryView.viewer_id, StoryView.viewed_at)
+        .where(StoryView.story_id == story_id)
+        .order_by(StoryView.viewed_at.desc())
+        .limit(limit)
+    )).all()
+    viewers = {viewer_id: viewed_at for viewer_id, viewed_at in rows}
+    for viewer_id, viewed_at in recorder.pending_viewers(story_id).items():
+        viewers.setdefault(viewer_id, viewed_at)
+    return sorted(viewers.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+story_views = StoryViewRecorder()
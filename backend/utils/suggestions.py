@@ -0,0 +1,292 @@
+"""
+Sugestões de amizade ("pessoas que você talvez conheça")
+
+Candidatos de um usuário são os amigos dos seus amigos e as pessoas que seus
+amigos seguem. A pontuação de cada candidato é
+
+    amigos em comum
+    + SUGGESTION_RECENCY_WEIGHT * soma de 0.5 ** (idade da amizade / meia-vida)
+    + SUGGESTION_FOLLOW_WEIGHT * amigos que o seguem
+
+então amizades recentes dos amigos pesam mais que as antigas. As
+SUGGESTIONS_TOP_N melhores ficam em friend_suggestions e a rota só lê essa
+tabela.
+
+O cálculo é feito em lotes de usuários sobre a vizinhança de dois saltos do
+lote (carregada em poucas consultas pelos índices do par normalizado): com
+NumPy/SciPy instalados, as contagens de um lote inteiro saem de produtos de
+matrizes esparsas CSR (lote x amigos) @ (amigos x candidatos); sem eles, o
+mesmo resultado é somado em Python.
+
+Recálculo incremental: quando uma amizade (ou bloqueio) muda, os dois
+usuários entram em friend_suggestion_queue. O job periódico recalcula só
+eles e os amigos deles, os únicos cujos candidatos podem ter mudado.
+A carga inicial (ou uma reconstrução completa) é feita com:
+    python -m utils.suggestions
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, insert, select, union_all
+from sqlalchemy.orm import Session
+
+from core.config import (
+    SUGGESTIONS_TOP_N, SUGGESTION_BATCH_SIZE, SUGGESTION_RECENCY_HALF_LIFE_DAYS,
+    SUGGESTION_RECENCY_WEIGHT, SUGGESTION_FOLLOW_WEIGHT
+)
+from core.database import SessionLocal
+from models import Block, Follow, Friendship, FriendSuggestion, FriendSuggestionQueue, User
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # NumPy/SciPy ausentes: a pontuação é feita em Python puro
+    np = None
+    sparse = None
+
+# Ids por cláusula IN
+IN_CHUNK_SIZE = 1000
+
+# (suggested_id, score, mutual_friends)
+Suggestion = Tuple[int, float, int]
+
+@dataclass
+class Neighborhood:
+    """Two-hop graph around a batch of users"""
+    users: List[int]
+    # user -> {friend: recency weight}, for the batch and their friends
+    friends: Dict[int, Dict[int, float]] = field(default_factory=dict)
+    # friend of the batch -> ids it follows
+    follows: Dict[int, Set[int]] = field(default_factory=dict)
+    # user of the batch -> ids never suggested (self, any friendship row, blocks)
+    excluded: Dict[int, Set[int]] = field(default_factory=dict)
+
+def recency_weight(when: Optional[datetime], now: datetime, half_life_days: float = SUGGESTION_RECENCY_HALF_LIFE_DAYS) -> float:
+    if when is None:
+        return 0.0
+    age_days = max(0.0, (now - when).total_seconds() / 86400)
+    return 0.5 ** (age_days / half_life_days)
+
+def _chunks(ids: Iterable[int]):
+    ids = list(ids)
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        yield ids[start:start + IN_CHUNK_SIZE]
+
+def _friendship_rows(db: Session, user_ids: List[int], accepted_only: bool):
+    """(user_id, other_id, status, accepted_at) of the friendships of user_ids, one index range per side"""
+    columns = (Friendship.status, func.coalesce(Friendship.updated_at, Friendship.created_at))
+    low_side = select(Friendship.user_low_id, Friendship.user_high_id, *columns).where(Friendship.user_low_id.in_(user_ids))
+    high_side = select(Friendship.user_high_id, Friendship.user_low_id, *columns).where(Friendship.user_high_id.in_(user_ids))
+    if accepted_only:
+        low_side = low_side.where(Friendship.status == "accepted")
+        high_side = high_side.where(Friendship.status == "accepted")
+    return db.execute(union_all(low_side, high_side)).all()
+
+def load_neighborhood(db: Session, user_ids: Iterable[int], now: Optional[datetime] = None) -> Neighborhood:
+    """Friendships of the batch and of their friends, what those friends follow and the batch's blocks"""
+    now = now or datetime.utcnow()
+    graph = Neighborhood(users=list(dict.fromkeys(user_ids)))
+    for user_id in graph.users:
+        graph.friends[user_id] = {}
+        graph.excluded[user_id] = {user_id}
+
+    for user_id, other_id, status, accepted_at in _friendship_rows(db, graph.users, accepted_only=False):
+        # Amigos, pedidos pendentes e recusados não viram sugestão
+        graph.excluded[user_id].add(other_id)
+        if status == "accepted":
+            graph.friends[user_id][other_id] = recency_weight(accepted_at, now)
+
+    second_hop = {friend_id for user_id in graph.users for friend_id in graph.friends[user_id]}
+    missing = sorted(second_hop.difference(graph.friends))
+    for chunk in _chunks(missing):
+        for friend_id in chunk:
+            graph.friends[friend_id] = {}
+        for friend_id, other_id, _, accepted_at in _friendship_rows(db, chunk, accepted_only=True):
+            graph.friends[friend_id][other_id] = recency_weight(accepted_at, now)
+
+    for chunk in _chunks(sorted(second_hop)):
+        for follower_id, followed_id in db.execute(
+            select(Follow.follower_id, Follow.followed_id).where(Follow.follower_id.in_(chunk))
+        ):
+            graph.follows.setdefault(follower_id, set()).add(followed_id)
+
+    for user_id, other_id in db.execute(union_all(
+        select(Block.blocker_id, Block.blocked_id).where(Block.blocker_id.in_(graph.users)),
+        select(Block.blocked_id, Block.blocker_id).where(Block.blocked_id.in_(graph.users)),
+    )):
+        graph.excluded[user_id].add(other_id)
+
+    return graph
+
+def _top(candidates: Iterable[Tuple[int, float, int]], top_n: int) -> List[Suggestion]:
+    return sorted(candidates, key=lambda item: (-item[1], item[0]))[:top_n]
+
+def score_python(graph: Neighborhood, top_n: int = SUGGESTIONS_TOP_N,
+                 recency_w: float = SUGGESTION_RECENCY_WEIGHT, follow_w: float = SUGGESTION_FOLLOW_WEIGHT) -> Dict[int, List[Suggestion]]:
+    """Suggestions of each user of the batch, summed in plain Python"""
+    results = {}
+    for user_id in graph.users:
+        # candidate -> [amigos em comum, peso de recência, amigos que seguem]
+        totals: Dict[int, list] = {}
+        for friend_id in graph.friends[user_id]:
+            for candidate, weight in graph.friends.get(friend_id, {}).items():
+                entry = totals.setdefault(candidate, [0, 0.0, 0])
+                entry[0] += 1
+                entry[1] += weight
+            for candidate in graph.follows.get(friend_id, ()):
+                totals.setdefault(candidate, [0, 0.0, 0])[2] += 1
+
+        excluded = graph.excluded[user_id]
+        results[user_id] = _top(
+            ((candidate, mutual + recency_w * recency + follow_w * followed, mutual)
+             for candidate, (mutual, recency, followed) in totals.items() if candidate not in excluded),
+            top_n
+        )
+    return results
+
+def score_sparse(graph: Neighborhood, top_n: int = SUGGESTIONS_TOP_N,
+                 recency_w: float = SUGGESTION_RECENCY_WEIGHT, follow_w: float = SUGGESTION_FOLLOW_WEIGHT) -> Dict[int, List[Suggestion]]:
+    """Same as score_python with CSR matrices: the whole batch in three sparse products"""
+    middle = sorted({friend_id for user_id in graph.users for friend_id in graph.friends[user_id]})
+    if not middle:
+        return {user_id: [] for user_id in graph.users}
+    middle_index = {friend_id: i for i, friend_id in enumerate(middle)}
+
+    def edges(neighbors):
+        """Rows and ids of (friend, neighbor) pairs, concatenated per friend"""
+        keys = [np.fromiter(neighbors(friend_id), dtype=np.int64) for friend_id in middle]
+        rows = np.repeat(np.arange(len(middle)), [len(ids) for ids in keys])
+        return rows, np.concatenate(keys)
+
+    friend_rows, friend_ids = edges(lambda friend_id: graph.friends.get(friend_id, {}).keys())
+    weights = np.concatenate([np.fromiter(graph.friends.get(friend_id, {}).values(), dtype=np.float64) for friend_id in middle])
+    follow_rows, follow_ids = edges(lambda friend_id: graph.follows.get(friend_id, ()))
+    candidates, columns = np.unique(np.concatenate([friend_ids, follow_ids]), return_inverse=True)
+    friend_cols, follow_cols = columns[:len(friend_ids)], columns[len(friend_ids):]
+
+    # lote x amigos
+    rows, cols = [], []
+    for row, user_id in enumerate(graph.users):
+        for friend_id in graph.friends[user_id]:
+            rows.append(row)
+            cols.append(middle_index[friend_id])
+    batch = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(graph.users), len(middle)))
+
+    # amigos x candidatos: amizades (contagem e recência) e quem seguem
+    shape = (len(middle), len(candidates))
+    adjacency = sparse.csr_matrix((np.ones(len(friend_cols)), (friend_rows, friend_cols)), shape=shape)
+    recency = sparse.csr_matrix((weights, (friend_rows, friend_cols)), shape=shape)
+    following = sparse.csr_matrix((np.ones(len(follow_cols)), (follow_rows, follow_cols)), shape=shape)
+
+    mutual = (batch @ adjacency).tocsr()
+    score = (mutual + recency_w * (batch @ recency) + follow_w * (batch @ following)).tocsr()
+
+    results = {}
+    for row, user_id in enumerate(graph.users):
+        start, end = score.indptr[row], score.indptr[row + 1]
+        ids = candidates[score.indices[start:end]]
+        values = score.data[start:end]
+        keep = ~np.isin(ids, np.fromiter(graph.excluded[user_id], dtype=np.int64))
+        ids, values, columns = ids[keep], values[keep], score.indices[start:end][keep]
+        order = np.lexsort((ids, -values))[:top_n]
+        mutual_counts = mutual[row, columns[order]].toarray().ravel() if len(order) else ()
+        results[user_id] = [
+            (int(ids[i]), float(values[i]), int(count)) for i, count in zip(order, mutual_counts)
+        ]
+    return results
+
+def score_neighborhood(graph: Neighborhood, top_n: int = SUGGESTIONS_TOP_N) -> Dict[int, List[Suggestion]]:
+    if sparse is not None:
+        return score_sparse(graph, top_n)
+    return score_python(graph, top_n)
+
+def store_suggestions(db: Session, results: Dict[int, List[Suggestion]], computed_at: Optional[datetime] = None):
+    """Replace the stored suggestions of the users in results"""
+    computed_at = computed_at or datetime.utcnow()
+    for chunk in _chunks(results):
+        db.execute(delete(FriendSuggestion).where(FriendSuggestion.user_id.in_(chunk)))
+    rows = [
+        {"user_id": user_id, "suggested_id": suggested_id, "score": score,
+         "mutual_friends": mutual, "computed_at": computed_at}
+        for user_id, suggestions in results.items()
+        for suggested_id, score, mutual in suggestions
+    ]
+    if rows:
+        db.execute(insert(FriendSuggestion), rows)
+
+def compute_suggestions(db: Session, user_ids: Iterable[int], batch_size: int = SUGGESTION_BATCH_SIZE,
+                        top_n: int = SUGGESTIONS_TOP_N) -> int:
+    """Recompute and store the suggestions of user_ids, batch_size users per transaction"""
+    user_ids = list(user_ids)
+    stored = 0
+    for start in range(0, len(user_ids), batch_size):
+        results = score_neighborhood(load_neighborhood(db, user_ids[start:start + batch_size]), top_n)
+        store_suggestions(db, results)
+        db.commit()
+        stored += sum(len(suggestions) for suggestions in results.values())
+    return stored
+
+def process_suggestion_queue(db: Session, batch_size: int = SUGGESTION_BATCH_SIZE) -> int:
+    """Recompute the queued users and their friends; returns the number of users recomputed"""
+    recomputed = 0
+    while True:
+        queued = db.execute(
+            select(FriendSuggestionQueue.id, FriendSuggestionQueue.user_id)
+            .order_by(FriendSuggestionQueue.id)
+            .limit(batch_size)
+        ).all()
+        if not queued:
+            return recomputed
+
+        changed = sorted({row.user_id for row in queued})
+        affected = set(changed)
+        for chunk in _chunks(changed):
+            affected.update(other_id for _, other_id, _, _ in _friendship_rows(db, chunk, accepted_only=True))
+        compute_suggestions(db, sorted(affected), batch_size)
+
+        # Entradas que chegarem durante o cálculo ficam para a próxima volta
+        db.execute(delete(FriendSuggestionQueue).where(FriendSuggestionQueue.id <= queued[-1].id))
+        db.commit()
+        recomputed += len(affected)
+
+def rebuild_all_suggestions(db: Session, batch_size: int = SUGGESTION_BATCH_SIZE) -> int:
+    """Full rebuild for every active user, walking users by id"""
+    last_id, users = 0, 0
+    while True:
+        ids = db.execute(
+            select(User.id).where(User.id > last_id, User.is_active == True).order_by(User.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return users
+        compute_suggestions(db, ids, batch_size)
+        last_id = ids[-1]
+        users += len(ids)
+
+async def enqueue_suggestion_refresh(db, *user_ids: int):
+    """Queue users whose friendships changed, in the caller's transaction (which commits it)"""
+    now = datetime.utcnow()
+    await db.execute(insert(FriendSuggestionQueue), [{"user_id": user_id, "queued_at": now} for user_id in user_ids])
+
+def run_suggestion_refresh():
+    """Background job entry point"""
+    db = SessionLocal()
+    try:
+        recomputed = process_suggestion_queue(db)
+        if recomputed:
+            print(f"🤝 Recomputed friend suggestions of {recomputed} users")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    import time
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        engine = "SciPy CSR" if sparse is not None else "Python"
+        print(f"🤝 Recalculando as sugestões de todos os usuários ({engine})...")
+        users = rebuild_all_suggestions(db)
+        print(f"✅ Sugestões de {users} usuários recalculadas em {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
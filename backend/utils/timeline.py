@@ -0,0 +1,437 @@
+"""
+Timeline por fan-out-on-write
+
+Quando um post é criado o seu id é empurrado para a timeline de cada amigo e
+seguidor do autor, de modo que a leitura do feed de amigos custa O(tamanho da
+página). Autores com audiência muito grande não fazem fan-out: os seus posts
+são mesclados no momento da leitura (fan-out-on-read). Posts excluídos saem
+das timelines quando utils/post_purge.py os apaga; até lá a página já os
+esconde (visible_to).
+
+Os backends "memory" e "redis" sem TIMELINE_REDIS_URL guardam as timelines
+no processo: com mais de um worker cada um teria as suas e o fan-out de um
+não apareceria nos outros, então create_timeline_store recusa essa
+configuração.
+"""
+import asyncio
+import bisect
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+
+from core.config import (
+    TIMELINE_BACKEND, TIMELINE_REDIS_URL, TIMELINE_MAX_LENGTH, TIMELINE_FANOUT_LIMIT, WEB_CONCURRENCY
+)
+from core.database import SessionLocal
+from models import Post, Follow
+from utils.feed import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor,
+    friend_ids_select, visible_to
+)
+
+class TimelineStore(ABC):
+    """
+    Interface of a timeline backend.
+
+    A timeline is a bounded set of post ids ordered by id (ids grow with
+    created_at, so id order is feed order).
+    """
+
+    @abstractmethod
+    def push(self, user_ids: Iterable[int], post_id: int) -> None:
+        ...
+
+    @abstractmethod
+    def remove(self, user_ids: Iterable[int], post_id: int) -> None:
+        ...
+
+    @abstractmethod
+    def page(self, user_id: int, before_id: Optional[int], limit: int) -> List[int]:
+        """Newest post ids of a timeline strictly older than before_id"""
+
+    @abstractmethod
+    def exists(self, user_id: int) -> bool:
+        ...
+
+    @abstractmethod
+    def mark_high_fanout(self, author_id: int) -> None:
+        ...
+
+    @abstractmethod
+    def high_fanout_authors(self) -> Set[int]:
+        ...
+
+class InMemoryTimelineStore(TimelineStore):
+    """Per-process backend: a single worker only (development)"""
+
+    def __init__(self, max_length: int = TIMELINE_MAX_LENGTH):
+        self.max_length = max_length
+        self._timelines: Dict[int, List[int]] = {}
+        self._high_fanout: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def push(self, user_ids: Iterable[int], post_id: int) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                ids = self._timelines.setdefault(user_id, [])
+                if ids and ids[-1] < post_id:
+                    ids.append(post_id)
+                else:
+                    index = bisect.bisect_left(ids, post_id)
+                    if index < len(ids) and ids[index] == post_id:
+                        continue
+                    ids.insert(index, post_id)
+                if len(ids) > self.max_length:
+                    del ids[:len(ids) - self.max_length]
+
+    def remove(self, user_ids: Iterable[int], post_id: int) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                ids = self._timelines.get(user_id)
+                if not ids:
+                    continue
+                index = bisect.bisect_left(ids, post_id)
+                if index < len(ids) and ids[index] == post_id:
+                    del ids[index]
+
+    def page(self, user_id: int, before_id: Optional[int], limit: int) -> List[int]:
+        with self._lock:
+            ids = self._timelines.get(user_id, [])
+            end = len(ids) if before_id is None else bisect.bisect_left(ids, before_id)
+            return ids[max(0, end - limit):end][::-1]
+
+    def exists(self, user_id: int) -> bool:
+        return user_id in self._timelines
+
+    def mark_high_fanout(self, author_id: int) -> None:
+        with self._lock:
+            self._high_fanout.add(author_id)
+
+    def high_fanout_authors(self) -> Set[int]:
+        return set(self._high_fanout)
+
+class LocalRedis:
+    """
+    Minimal in-process stand-in for the subset of the redis-py client used by
+    RedisTimelineStore (sorted sets and sets), for running the Redis backend
+    locally without a server. Like InMemoryTimelineStore, its data lives in
+    one process: a single worker only.
+    """
+
+    def __init__(self):
+        self._zsets: Dict[str, Dict[bytes, float]] = {}
+        self._sets: Dict[str, Set[bytes]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    @staticmethod
+    def _bound(value, default: float) -> Tuple[float, bool]:
+        """Parse a redis score bound, returning (score, exclusive)"""
+        if isinstance(value, str):
+            if value in ("+inf", "-inf"):
+                return float(value), False
+            if value.startswith("("):
+                return float(value[1:]), True
+        return (float(value), False) if value is not None else (default, False)
+
+    def _sorted(self, name: str) -> List[Tuple[float, bytes]]:
+        return sorted((score, member) for member, score in self._zsets.get(name, {}).items())
+
+    def zadd(self, name: str, mapping: dict) -> int:
+        with self._lock:
+            zset = self._zsets.setdefault(name, {})
+            added = 0
+            for member, score in mapping.items():
+                key = self._encode(member)
+                added += key not in zset
+                zset[key] = float(score)
+            return added
+
+    def zrem(self, name: str, *values) -> int:
+        with self._lock:
+            zset = self._zsets.get(name, {})
+            return sum(zset.pop(self._encode(value), None) is not None for value in values)
+
+    def zremrangebyrank(self, name: str, start: int, end: int) -> int:
+        with self._lock:
+            items = self._sorted(name)
+            size = len(items)
+            start = start + size if start < 0 else start
+            end = min(end + size if end < 0 else end, size - 1)
+            removed = items[max(0, start):end + 1] if end >= 0 else []
+            for _, member in removed:
+                del self._zsets[name][member]
+            return len(removed)
+
+    def zrevrangebyscore(self, name: str, max, min, start: Optional[int] = None, num: Optional[int] = None) -> List[bytes]:
+        high, high_exclusive = self._bound(max, float("inf"))
+        low, low_exclusive = self._bound(min, float("-inf"))
+        with self._lock:
+            members = [
+                member for score, member in reversed(self._sorted(name))
+                if (score < high if high_exclusive else score <= high)
+                and (score > low if low_exclusive else score >= low)
+            ]
+        if start is not None:
+            members = members[start:start + num if num is not None else None]
+        return members
+
+    def exists(self, *names: str) -> int:
+        return sum(1 for name in names if self._zsets.get(name) or self._sets.get(name))
+
+    def sadd(self, name: str, *values) -> int:
+        with self._lock:
+            members = self._sets.setdefault(name, set())
+            before = len(members)
+            members.update(self._encode(value) for value in values)
+            return len(members) - before
+
+    def smembers(self, name: str) -> Set[bytes]:
+        return set(self._sets.get(name, set()))
+
+    def pipeline(self, transaction: bool = True):
+        return _LocalPipeline(self)
+
+class _LocalPipeline:
+    """Buffers calls and runs them on execute(), like a redis-py pipeline"""
+
+    def __init__(self, client: LocalRedis):
+        self._client = client
+        self._calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        def buffered(*args, **kwargs):
+            self._calls.append((method, args, kwargs))
+            return self
+        return buffered
+
+    def execute(self):
+        calls, self._calls = self._calls, []
+        return [method(*args, **kwargs) for method, args, kwargs in calls]
+
+class RedisTimelineStore(TimelineStore):
+    """Backend on a Redis-compatible client, shared by every worker"""
+
+    HIGH_FANOUT_KEY = "timeline:high_fanout"
+
+    def __init__(self, client, max_length: int = TIMELINE_MAX_LENGTH):
+        self.client = client
+        self.max_length = max_length
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"timeline:{user_id}"
+
+    def push(self, user_ids: Iterable[int], post_id: int) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for user_id in user_ids:
+            key = self._key(user_id)
+            pipe.zadd(key, {post_id: post_id})
+            pipe.zremrangebyrank(key, 0, -(self.max_length + 1))
+        pipe.execute()
+
+    def remove(self, user_ids: Iterable[int], post_id: int) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.zrem(self._key(user_id), post_id)
+        pipe.execute()
+
+    def page(self, user_id: int, before_id: Optional[int], limit: int) -> List[int]:
+        high = "+inf" if before_id is None else f"({before_id}"
+        members = self.client.zrevrangebyscore(self._key(user_id), high, "-inf", start=0, num=limit)
+        return [int(member) for member in members]
+
+    def exists(self, user_id: int) -> bool:
+        return bool(self.client.exists(self._key(user_id)))
+
+    def mark_high_fanout(self, author_id: int) -> None:
+        self.client.sadd(self.HIGH_FANOUT_KEY, author_id)
+
+    def high_fanout_authors(self) -> Set[int]:
+        return {int(member) for member in self.client.smembers(self.HIGH_FANOUT_KEY)}
+
+def create_timeline_store(backend: str = TIMELINE_BACKEND, redis_url: str = TIMELINE_REDIS_URL,
+                          workers: int = WEB_CONCURRENCY) -> Optional[TimelineStore]:
+    """
+    Build the store configured by TIMELINE_BACKEND (None when disabled).
+    Process-local stores refuse to start with more than one worker.
+    """
+    if not backend:
+        return None
+    if backend not in ("memory", "redis"):
+        raise ValueError(f"Unknown timeline backend: {backend}")
+    if backend == "redis" and redis_url:
+        import redis
+        return RedisTimelineStore(redis.Redis.from_url(redis_url))
+    if workers > 1:
+        raise RuntimeError(
+            f"TIMELINE_BACKEND={backend} without TIMELINE_REDIS_URL keeps timelines per process "
+            f"and does not work with WEB_CONCURRENCY={workers}; set TIMELINE_REDIS_URL"
+        )
+    return InMemoryTimelineStore() if backend == "memory" else RedisTimelineStore(LocalRedis())
+
+timeline_store = create_timeline_store()
+
+def fan_out_recipients(db: Session, author_id: int, privacy: str) -> Set[int]:
+    """Users whose timeline should receive a post of author_id"""
+    if privacy == "private":
+        return set()
+    recipients = set(db.execute(friend_ids_select(author_id)).scalars().all())
+    if privacy != "friends":
+        recipients.update(db.execute(
+            select(Follow.follower_id).where(Follow.followed_id == author_id)
+        ).scalars().all())
+    return recipients
+
+def fan_out_post(post_id: int, author_id: int, privacy: str, store: Optional[TimelineStore] = None):
+    """Push a freshly committed post into its audience's timelines"""
+    store = store or timeline_store
+    if store is None:
+        return
+
+    db = SessionLocal()
+    try:
+        recipients = fan_out_recipients(db, author_id, privacy)
+    finally:
+        db.close()
+
+    if len(recipients) > TIMELINE_FANOUT_LIMIT:
+        # Too many recipients: readers pull this author's posts instead
+        store.mark_high_fanout(author_id)
+        recipients = set()
+
+    recipients.add(author_id)
+    store.push(recipients, post_id)
+
+def remove_from_timelines(post_id: int, author_id: int, store: Optional[TimelineStore] = None):
+    """
+    Take a deleted post out of the timelines it may have been pushed to (the
+    author's friends and followers, whatever the post's privacy was)
+    """
+    store = store or timeline_store
+    if store is None:
+        return
+
+    db = SessionLocal()
+    try:
+        recipients = fan_out_recipients(db, author_id, "public")
+    finally:
+        db.close()
+    recipients.add(author_id)
+    store.remove(recipients, post_id)
+
+def followed_ids_select(user_id: int):
+    """Select returning the ids of the users followed by user_id"""
+    return select(Follow.followed_id).where(Follow.follower_id == user_id)
+
+async def get_friends_feed_page(
+    db: AsyncSession,
+    viewer_id: int,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    store: Optional[TimelineStore] = None,
+    hidden_ids: Iterable[int] = ()
+) -> Tuple[List[Post], Optional[str]]:
+    """
+    Page of posts from the viewer, their friends and the users they follow.
+
+    Served from the timeline store when one is configured; otherwise (or while
+    the viewer's timeline is still empty) the page is computed with SQL.
+    Posts of hidden_ids (blocked users) are dropped from the page.
+    """
+    store = store or timeline_store
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    before_id = decode_cursor(cursor)[1] if cursor else None
+
+    # The store is synchronous (redis-py): its calls run in a worker thread
+    stored = None
+    if store is not None:
+        stored = await asyncio.to_thread(_stored_page, store, viewer_id, before_id, limit + 1)
+
+    if stored is None:
+        post_ids = await _friends_feed_ids(db, viewer_id, before_id, limit + 1)
+    else:
+        post_ids = stored
+        if len(post_ids) <= limit:
+            # Timelines are bounded, pages older than their tail come from SQL
+            oldest = post_ids[-1] if post_ids else before_id
+            post_ids += await _friends_feed_ids(db, viewer_id, oldest, limit + 1 - len(post_ids))
+        pulled = await _high_fanout_ids(db, store, viewer_id, before_id, limit + 1)
+        if pulled:
+            post_ids = sorted(set(post_ids) | set(pulled), reverse=True)[:limit + 1]
+
+    if not post_ids:
+        return [], None
+
+    page_ids = post_ids[:limit]
+    rows = (await db.execute(
+        select(Post, visible_to(viewer_id).label("visible"))
+        .options(joinedload(Post.author))
+        .where(Post.id.in_(page_ids))
+        .order_by(Post.id.desc())
+    )).all()
+    posts = [post for post, visible in rows if visible and post.author_id not in hidden_ids]
+
+    next_cursor = None
+    if len(post_ids) > limit:
+        # The boundary may be a post the viewer can no longer see, so look it
+        # up among every row of the page, not only the visible ones
+        created_at = {post.id: post.created_at for post, _ in rows}
+        boundary = min(created_at)
+        next_cursor = encode_cursor(created_at[boundary], boundary)
+
+    return posts, next_cursor
+
+def _stored_page(store: TimelineStore, viewer_id: int, before_id: Optional[int], limit: int) -> Optional[List[int]]:
+    """Page of the viewer's stored timeline, or None while it was not built yet"""
+    if not store.exists(viewer_id):
+        return None
+    return store.page(viewer_id, before_id, limit)
+
+async def _friends_feed_ids(db: AsyncSession, viewer_id: int, before_id: Optional[int], limit: int) -> List[int]:
+    """Fan-out-on-read fallback: newest post ids of the viewer's circle"""
+    query = (
+        select(Post.id)
+        .where(
+            (Post.author_id == viewer_id)
+            | Post.author_id.in_(friend_ids_select(viewer_id))
+            | Post.author_id.in_(followed_ids_select(viewer_id)),
+            Post.deleted_at.is_(None)
+        )
+        .order_by(Post.id.desc())
+        .limit(limit)
+    )
+    if before_id is not None:
+        query = query.where(Post.id < before_id)
+    return list((await db.execute(query)).scalars().all())
+
+async def _high_fanout_ids(db: AsyncSession, store: TimelineStore, viewer_id: int, before_id: Optional[int], limit: int) -> List[int]:
+    """Newest post ids of the high-fanout authors the viewer is connected to"""
+    celebrities = await asyncio.to_thread(store.high_fanout_authors)
+    if not celebrities:
+        return []
+
+    connected = set((await db.execute(friend_ids_select(viewer_id))).scalars().all())
+    connected.update((await db.execute(followed_ids_select(viewer_id))).scalars().all())
+    authors = celebrities & connected
+    if not authors:
+        return []
+
+    query = (
+        select(Post.id)
+        .where(Post.author_id.in_(authors), Post.deleted_at.is_(None))
+        .order_by(Post.id.desc())
+        .limit(limit)
+    )
+    if before_id is not None:
+        query = query.where(Post.id < before_id)
+    return list((await db.execute(query)).scalars().all())
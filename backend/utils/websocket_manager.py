@@ -1,57 +1,8 @@
-from fastapi import WebSocket
-from typing import Dict, List
-import jwt
-from main import SECRET_KEY, ALGORITHM, SessionLocal, User
-
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
-
-    async def connect(self, websocket: WebSocket, user_id: int):
-        await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
-
-    def disconnect(self, websocket: WebSocket, user_id: int):
-        if user_id in self.active_connections:
-            if websocket in self.active_connections[user_id]:
-                self.active_connections[user_id].remove(websocket)
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
-
-    async def send_personal_message(self, message: str, user_id: int):
-        if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_text(message)
-                except:
-                    # Remove broken connections
-                    self.active_connections[user_id].remove(connection)
-
-    async def broadcast(self, message: str):
-        for user_connections in self.active_connections.values():
-            for connection in user_connections:
-                try:
-                    await connection.send_text(message)
-                except:
-                    # Remove broken connections
-                    pass
-
-manager = ConnectionManager()
-
-def verify_websocket_token(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        
-        db = SessionLocal()
-        try:
-            user = db.query(User).filter(User.email == email).first()
-            return user
-        finally:
-            db.close()
-    except jwt.PyJWTError:
-        return None
\ No newline at end of file
+"""
+Compatibilidade: o gerenciador de WebSockets vive em core.websockets (com o
+backplane entre workers) e a validação do token em core.security.
+"""
+from core.security import verify_websocket_token
+from core.websockets import ConnectionManager, manager
+
+__all__ = ["ConnectionManager", "manager", "verify_websocket_token"]